@@ -5,8 +5,10 @@ Page d'accueil
 
 import streamlit as st
 import os
-from database import init_database, DB_NAME
+from database import init_database, DB_NAME, get_connection
 from backup_db import backup_database
+from purge import lancer_purge
+from planificateur import demarrer_planificateur
 from auth import require_authentication, show_logout_button
 
 # Configuration de la page
@@ -114,10 +116,19 @@ show_logout_button()
 # Initialiser la base de données
 init_database()
 
+# Génération automatique des cotisations en début de mois (un seul thread par processus)
+@st.cache_resource
+def planificateur_cotisations():
+    return demarrer_planificateur()
+
+planificateur_cotisations()
+
 # Backup automatique au démarrage (une fois par session)
 if 'backup_done' not in st.session_state:
     if os.path.exists(DB_NAME):
         backup_database()
+        # Terminer une éventuelle purge interrompue des participants supprimés
+        lancer_purge()
     st.session_state.backup_done = True
 
 # ================================================================================
@@ -176,19 +187,18 @@ with st.sidebar:
     st.markdown("### 📊 Statistiques rapides")
     
     # Ajouter quelques statistiques si la base existe
-    import sqlite3
     if os.path.exists(DB_NAME):
         try:
-            conn = sqlite3.connect(DB_NAME)
+            conn = get_connection()
             cursor = conn.cursor()
             
             # Nombre de participants
-            cursor.execute("SELECT COUNT(*) FROM participants")
+            cursor.execute("SELECT COUNT(*) FROM participants WHERE supprime = 0")
             nb_participants = cursor.fetchone()[0]
             st.metric("👥 Participants", nb_participants)
             
             # Nombre de cotisations impayées
-            cursor.execute("SELECT COUNT(*) FROM cotisations WHERE paye = 0")
+            cursor.execute("SELECT COUNT(*) FROM cotisations c JOIN participants p ON p.id = c.participant_id WHERE c.paye = 0 AND p.supprime = 0")
             nb_impayees = cursor.fetchone()[0]
             st.metric("⚠️ Cotisations impayées", nb_impayees)
             
@@ -0,0 +1,180 @@
+"""
+Répartition des paiements groupés
+Un participant qui verse une somme pour plusieurs mois voit ses cotisations
+impayées soldées de la plus ancienne à la plus récente (premier dû, premier
+payé), tous terrains confondus. Une cotisation n'est soldée que si la somme
+restante la couvre entièrement : ce qui reste ensuite (le reliquat) est
+enregistré comme avance dans le journal des paiements et s'ajoute au
+prochain paiement groupé du participant.
+"""
+
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from database import get_connection
+from formatage import format_fcfa, libelles_periodes, libelles_terrain
+from historique import ajouter_historique_batch
+from paiements import enregistrer_paiement, get_solde, SOURCE_AVANCE
+
+# Cotisations impayées d'un participant, de la plus ancienne à la plus récente
+SELECT_IMPAYEES_PARTICIPANT = """
+    SELECT id, annee, mois, numero_terrain, montant
+    FROM cotisations
+    WHERE participant_id = ? AND paye = 0
+    ORDER BY annee, mois, numero_terrain, id
+"""
+
+
+def libelles_cotisations(cotisations):
+    """
+    Libellés de cotisations (mois, année et terrain), pour toutes les lignes à la fois
+
+    Args:
+        cotisations: DataFrame (ou dictionnaire de colonnes) avec mois, annee et numero_terrain
+
+    Returns:
+        Tableau de libellés (ex : 'Mar 2025 - Terrain n°2', 'Mar 2025' sans terrain)
+    """
+    periodes = np.asarray(libelles_periodes(cotisations['mois'], cotisations['annee']), dtype=object)
+    terrains = np.asarray(libelles_terrain(cotisations['numero_terrain'], tous=""), dtype=object)
+    return np.where(terrains == "", periodes, periodes + " - Terrain " + terrains)
+
+
+def libelle_cotisation(cotisation):
+    """Libellé d'une cotisation (mois, année et terrain)"""
+    return libelles_cotisations({colonne: [cotisation[colonne]] for colonne in ('mois', 'annee', 'numero_terrain')})[0]
+
+
+def calculer_allocation(impayees, montant):
+    """
+    Répartit un montant sur des cotisations impayées déjà triées
+
+    Args:
+        impayees: DataFrame (id, annee, mois, numero_terrain, montant), plus ancienne en premier
+        montant: Somme versée
+
+    Returns:
+        Tuple (cotisations soldées, reliquat, prochaine cotisation impayée ou None)
+    """
+    # Les sommes cumulées croissent : les cotisations couvertes forment un préfixe
+    cumul = np.cumsum(impayees['montant'].to_numpy(dtype=float))
+    nb_soldees = int(np.searchsorted(cumul, float(montant), side='right'))
+    soldees = impayees.iloc[:nb_soldees]
+    reliquat = float(montant) - (float(cumul[nb_soldees - 1]) if nb_soldees else 0.0)
+    prochaine = impayees.iloc[nb_soldees] if nb_soldees < len(impayees) else None
+    return soldees, reliquat, prochaine
+
+
+def apercu_allocation(participant_id, montant, conn=None):
+    """
+    Calcule, sans rien écrire, la répartition d'un paiement
+
+    L'avance du participant (reliquats des paiements précédents) s'ajoute au montant versé.
+
+    Returns:
+        Tuple (cotisations soldées, reliquat, prochaine cotisation impayée ou None, avance disponible)
+    """
+    connexion = conn or get_connection()
+    impayees = pd.read_sql_query(SELECT_IMPAYEES_PARTICIPANT, connexion, params=(int(participant_id),))
+    avance = max(get_solde(participant_id, connexion)['avance'], 0.0)
+    if conn is None:
+        connexion.close()
+    return (*calculer_allocation(impayees, float(montant) + avance), avance)
+
+
+def _appliquer_allocation(conn, participant_id, montant, date_paiement):
+    """
+    Solde les cotisations couvertes par un paiement, dans la transaction de l'appelant
+
+    Chaque cotisation soldée est inscrite au journal pour son montant (trigger) ;
+    l'écart avec la somme réellement versée est inscrit comme avance (reliquat
+    mis de côté, ou avance utilisée si l'écart est négatif).
+
+    Returns:
+        Tuple (résultat, entrée d'historique) ; le résultat contient
+        participant_id, montant, alloue, avance_utilisee, reliquat et cotisation_ids
+    """
+    soldees, reliquat, prochaine, avance = apercu_allocation(participant_id, montant, conn)
+    cotisation_ids = [int(cid) for cid in soldees['id']]
+    conn.executemany(
+        "UPDATE cotisations SET paye = 1, date_paiement = ? WHERE id = ? AND paye = 0",
+        [(date_paiement, cid) for cid in cotisation_ids]
+    )
+    alloue = float(soldees['montant'].sum())
+    if alloue != float(montant):
+        enregistrer_paiement(conn, int(participant_id), float(montant) - alloue, SOURCE_AVANCE,
+                             date_paiement=date_paiement)
+    resultat = {
+        'participant_id': int(participant_id),
+        'montant': float(montant),
+        'alloue': alloue,
+        'avance_utilisee': min(max(alloue - float(montant), 0.0), avance),
+        'reliquat': reliquat,
+        'cotisation_ids': cotisation_ids,
+    }
+    entree = {
+        'type_action': 'UPDATE',
+        'table_concernee': 'cotisations',
+        'id_enregistrement': int(participant_id),
+        'details': f"Paiement groupé de {format_fcfa(montant)} - {len(cotisation_ids)} cotisation(s) "
+                   f"soldée(s), avance restante {format_fcfa(reliquat)}",
+        'ancienne_valeur': {'paye': False},
+        'nouvelle_valeur': {
+            'paye': True,
+            'date_paiement': date_paiement,
+            'cotisations': list(libelles_cotisations(soldees)),
+            'reliquat': reliquat,
+            'prochaine': libelle_cotisation(prochaine) if prochaine is not None else None,
+        }
+    }
+    return resultat, entree
+
+
+def allouer_paiements(paiements):
+    """
+    Répartit plusieurs paiements en une seule transaction (imports)
+
+    Args:
+        paiements: Liste de (participant_id, montant) ou (participant_id, montant, date_paiement),
+                   appliqués dans l'ordre ; plusieurs paiements d'un même participant se cumulent
+
+    Returns:
+        Tuple (succès, message, liste des résultats de chaque paiement)
+    """
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        resultats, entrees = [], []
+        aujourd_hui = datetime.now().strftime("%Y-%m-%d")
+        for participant_id, montant, *date in paiements:
+            if montant <= 0:
+                raise ValueError(f"Montant invalide pour le participant {participant_id}: {montant}")
+            resultat, entree = _appliquer_allocation(conn, participant_id, montant, date[0] if date else aujourd_hui)
+            resultats.append(resultat)
+            entrees.append(entree)
+        ajouter_historique_batch(entrees, conn)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        return False, f"Erreur: {str(e)}", []
+    finally:
+        conn.close()
+
+    nb_soldees = sum(len(resultat['cotisation_ids']) for resultat in resultats)
+    reliquat = sum(resultat['reliquat'] for resultat in resultats)
+    message = f"{len(resultats)} paiement(s) réparti(s) : {nb_soldees} cotisation(s) soldée(s)"
+    if reliquat:
+        message += f", avance restante {format_fcfa(reliquat)}"
+    return True, message, resultats
+
+
+def allouer_paiement(participant_id, montant, date_paiement=None):
+    """
+    Répartit un paiement sur les cotisations impayées les plus anciennes d'un participant
+
+    Returns:
+        Tuple (succès, message, résultat du paiement ou None)
+    """
+    paiement = (participant_id, montant, date_paiement) if date_paiement else (participant_id, montant)
+    success, message, resultats = allouer_paiements([paiement])
+    return success, message, resultats[0] if resultats else None
@@ -17,6 +17,9 @@ COTISATION_PAR_TERRAIN = 1_000
 # Montant minimal d'une cotisation en FCFA
 COTISATION_MIN = 500
 
+# Nombre de mois impayés d'affilée à partir duquel un participant est en retard
+MOIS_RETARD_ALERTE = 3
+
 # Limites de validation
 ANNEE_MIN = 2025
 ANNEE_MAX = 2100
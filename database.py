@@ -1,20 +1,41 @@
 """
 Gestion de la base de données SQLite
-Ce module contient uniquement l'initialisation de la base de données.
-Chaque page contient ses propres requêtes spécifiques.
+Ce module contient l'initialisation de la base de données et la version
+des données utilisée comme clé de cache. Chaque page contient ses propres requêtes spécifiques.
 """
 
 import sqlite3
 
 DB_NAME = "database.db"
 
+# Triggers d'insertion par ligne des cotisations : ignorés pendant une insertion
+# groupée, qui met à jour version, masques et soldes en une requête chacun
+# (voir inserer_cotisations_groupees)
+HORS_INSERTION_GROUPEE = "(SELECT insertion_groupee FROM version_donnees WHERE id = 1) = 0"
+TRIGGERS_INSERTION_GROUPEE = ('trg_version_cotisations_insert', 'trg_masques_insert',
+                              'trg_soldes_cotisations_insert')
+
+# ============================================================================
+# CONNEXION
+# ============================================================================
+
+def get_connection():
+    """
+    Ouvre une connexion à la base de données
+    Les clés étrangères (ON DELETE CASCADE) ne sont appliquées par SQLite que si
+    elles sont activées sur chaque connexion : toutes les connexions passent donc ici.
+    """
+    conn = sqlite3.connect(DB_NAME)
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
 # ============================================================================
 # INITIALISATION
 # ============================================================================
 
 def init_database():
     """Initialise la base de données SQLite avec les tables nécessaires"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Table participants
@@ -26,10 +47,25 @@ def init_database():
             nombre_terrains INTEGER DEFAULT 0,
             telephone TEXT,
             email TEXT,
-            UNIQUE(nom, prenom)
+            supprime INTEGER NOT NULL DEFAULT 0
         )
     ''')
     
+    # Suppression logique : un participant supprimé est masqué immédiatement,
+    # ses données sont effacées ensuite par la purge en arrière-plan (purge.py)
+    cursor.execute("PRAGMA table_info(participants)")
+    colonnes_participants = [col[1] for col in cursor.fetchall()]
+    if 'supprime' not in colonnes_participants:
+        cursor.execute("ALTER TABLE participants ADD COLUMN supprime INTEGER NOT NULL DEFAULT 0")
+    _migrer_unicite_participants(conn)
+
+    # Un nom ne doit être unique que parmi les participants actifs : un participant
+    # supprimé en attente de purge ne bloque pas la création d'un homonyme
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_participants_nom_prenom_actifs
+        ON participants(nom, prenom) WHERE supprime = 0
+    ''')
+
     # Table cotisations
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS cotisations (
@@ -47,19 +83,42 @@ def init_database():
     ''')
     
     # Créer des index pour améliorer les performances
+    # (chaque index ralentit les insertions en masse : les index préfixes d'un
+    # index composé, participant_id seul et annee seule, sont remplacés par
+    # idx_cotisations_participant_periode et idx_cotisations_annee_paye ; paye seul,
+    # peu sélectif, est couvert par les index partiels des impayés ci-dessous)
+    cursor.execute("DROP INDEX IF EXISTS idx_cotisations_participant")
+    cursor.execute("DROP INDEX IF EXISTS idx_cotisations_annee")
+    cursor.execute("DROP INDEX IF EXISTS idx_cotisations_paye")
+    # Requêtes limitées à une année : impayés de l'année, participants ayant des cotisations
     cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_cotisations_participant 
-        ON cotisations(participant_id)
+        CREATE INDEX IF NOT EXISTS idx_cotisations_annee_paye 
+        ON cotisations(annee, paye)
     ''')
+    # Cotisations d'un participant, dans l'ordre du tri « Participant » de la liste détaillée
+    cursor.execute("DROP INDEX IF EXISTS idx_cotisations_participant_annee")
     cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_cotisations_annee 
-        ON cotisations(annee)
+        CREATE INDEX IF NOT EXISTS idx_cotisations_participant_periode
+        ON cotisations(participant_id, annee DESC, mois DESC, numero_terrain)
     ''')
+    # Liste détaillée : tri par période, page par page
     cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_cotisations_paye 
-        ON cotisations(paye)
+        CREATE INDEX IF NOT EXISTS idx_cotisations_annee_mois
+        ON cotisations(annee, mois)
     ''')
-    
+    # Liste détaillée : tris par montant et par date de paiement, toutes années ou une seule
+    for nom, colonnes in [('montant', 'montant'), ('annee_montant', 'annee, montant'),
+                          ('date_paiement', 'date_paiement'),
+                          ('annee_date_paiement', 'annee, date_paiement')]:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_cotisations_{nom} ON cotisations({colonnes})")
+    # File des impayées (page de gestion) : parcours par mois, page par page
+    # (le parcours par montant suit idx_cotisations_annee_montant)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_impayees_annee_mois
+        ON cotisations(annee, mois, id) WHERE paye = 0
+    ''')
+    cursor.execute("DROP INDEX IF EXISTS idx_impayees_annee_montant")
+
     # Table historique pour tracer toutes les modifications
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS historique (
@@ -84,5 +143,508 @@ def init_database():
         ON historique(type_action)
     ''')
     
+    # Index de recherche plein texte des participants, insensible à la casse
+    # et aux accents, synchronisé par triggers
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'participants_fts'")
+    fts_existe = cursor.fetchone() is not None
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS participants_fts USING fts5(
+                nom, prenom, telephone, email,
+                content='participants', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_participants_fts_insert
+            AFTER INSERT ON participants
+            BEGIN
+                INSERT INTO participants_fts (rowid, nom, prenom, telephone, email)
+                VALUES (new.id, new.nom, new.prenom, new.telephone, new.email);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_participants_fts_delete
+            AFTER DELETE ON participants
+            BEGIN
+                INSERT INTO participants_fts (participants_fts, rowid, nom, prenom, telephone, email)
+                VALUES ('delete', old.id, old.nom, old.prenom, old.telephone, old.email);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_participants_fts_update
+            AFTER UPDATE OF nom, prenom, telephone, email ON participants
+            BEGIN
+                INSERT INTO participants_fts (participants_fts, rowid, nom, prenom, telephone, email)
+                VALUES ('delete', old.id, old.nom, old.prenom, old.telephone, old.email);
+                INSERT INTO participants_fts (rowid, nom, prenom, telephone, email)
+                VALUES (new.id, new.nom, new.prenom, new.telephone, new.email);
+            END
+        ''')
+        if not fts_existe:
+            # Indexer les participants déjà présents
+            cursor.execute("INSERT INTO participants_fts (participants_fts) VALUES ('rebuild')")
+    except sqlite3.OperationalError as e:
+        # SQLite compilé sans FTS5 : la recherche se rabat sur LIKE
+        print(f"Index de recherche FTS5 indisponible: {e}")
+    
+    # Version des données : incrémentée à chaque écriture sur les participants
+    # ou les cotisations, elle sert de clé de cache aux pages
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS version_donnees (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO version_donnees (id, version) VALUES (1, 0)")
+    
+    # Indicateur d'insertion groupée en cours (levé et baissé dans la même transaction)
+    cursor.execute("PRAGMA table_info(version_donnees)")
+    if 'insertion_groupee' not in [col[1] for col in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE version_donnees ADD COLUMN insertion_groupee INTEGER NOT NULL DEFAULT 0")
+        # Les triggers existants sont recréés plus bas avec leur condition
+        for trigger in TRIGGERS_INSERTION_GROUPEE:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    
+    for table in ('participants', 'cotisations'):
+        for evenement in ('INSERT', 'UPDATE', 'DELETE'):
+            nom = f"trg_version_{table}_{evenement.lower()}"
+            condition = f"WHEN {HORS_INSERTION_GROUPEE}" if nom in TRIGGERS_INSERTION_GROUPEE else ""
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {nom}
+                AFTER {evenement} ON {table}
+                {condition}
+                BEGIN
+                    UPDATE version_donnees SET version = version + 1 WHERE id = 1;
+                END
+            ''')
+    
+    # Tâches planifiées : une ligne par tâche et par période (voir planificateur.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS taches_planifiees (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nom TEXT NOT NULL,
+            periode TEXT NOT NULL,
+            statut TEXT NOT NULL,
+            date_debut TEXT NOT NULL,
+            date_fin TEXT,
+            resultat TEXT,
+            UNIQUE(nom, periode)
+        )
+    ''')
+
+    # Vues enregistrées : filtres nommés d'une page, en JSON (voir vues.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vues_enregistrees (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            page TEXT NOT NULL,
+            nom TEXT NOT NULL,
+            filtres TEXT NOT NULL,
+            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            date_modification TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(page, nom)
+        )
+    ''')
+
+    # Masques de paiement : pour chaque (participant, terrain, année), les mois
+    # existants et les mois payés sur 12 bits (bit 0 = janvier). Terrain 0 pour
+    # les cotisations de l'ancien format. Maintenus par triggers (voir masques.py)
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'masques_paiement'")
+    masques_existent = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS masques_paiement (
+            participant_id INTEGER NOT NULL,
+            terrain INTEGER NOT NULL,
+            annee INTEGER NOT NULL,
+            existe INTEGER NOT NULL DEFAULT 0,
+            paye INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (participant_id, terrain, annee)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_masques_paiement_annee 
+        ON masques_paiement(annee)
+    ''')
+    
+    # Une insertion ne fait qu'ajouter des bits
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_masques_insert
+        AFTER INSERT ON cotisations
+        WHEN {HORS_INSERTION_GROUPEE}
+        BEGIN
+            INSERT INTO masques_paiement (participant_id, terrain, annee, existe, paye)
+            VALUES (new.participant_id, COALESCE(new.numero_terrain, 0), new.annee,
+                    1 << (new.mois - 1), CASE WHEN new.paye = 1 THEN 1 << (new.mois - 1) ELSE 0 END)
+            ON CONFLICT (participant_id, terrain, annee) DO UPDATE
+            SET existe = existe | excluded.existe, paye = paye | excluded.paye;
+        END
+    ''')
+    # Une modification ou une suppression recalcule le masque de la clé concernée (12 lignes au plus)
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_masques_update
+        AFTER UPDATE OF participant_id, mois, annee, paye, numero_terrain ON cotisations
+        BEGIN
+            {_sql_recalcul_masque('old')}
+            {_sql_recalcul_masque('new')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_masques_delete
+        AFTER DELETE ON cotisations
+        BEGIN
+            {_sql_recalcul_masque('old')}
+        END
+    ''')
+    if not masques_existent:
+        cursor.execute('''
+            INSERT INTO masques_paiement (participant_id, terrain, annee, existe, paye)
+            SELECT participant_id, terrain, annee, SUM(bit), SUM(bit * paye)
+            FROM (
+                SELECT participant_id, COALESCE(numero_terrain, 0) AS terrain, annee,
+                       1 << (mois - 1) AS bit, MAX(paye) AS paye
+                FROM cotisations
+                GROUP BY participant_id, terrain, annee, mois
+            )
+            GROUP BY participant_id, terrain, annee
+        ''')
+
+    _init_journal_paiements(cursor)
+
+    conn.commit()
+    conn.close()
+
+
+def _migrer_unicite_participants(conn):
+    """
+    Retire la contrainte UNIQUE(nom, prenom) des bases créées avant la suppression logique
+
+    SQLite ne sait pas retirer une contrainte de table : la table est recréée
+    sans elle (mêmes identifiants), l'unicité passant à un index partiel sur
+    les participants actifs. Les triggers et index de la table sont recréés
+    ensuite par init_database.
+    """
+    index_uniques = [
+        index[1] for index in conn.execute("PRAGMA index_list(participants)").fetchall()
+        if index[3] == 'u'
+    ]
+    if not index_uniques:
+        return
+
+    # Sans clés étrangères, supprimer l'ancienne table ne supprime pas les cotisations en cascade
     conn.commit()
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute("PRAGMA legacy_alter_table = ON")
+    try:
+        conn.execute("BEGIN")
+        conn.execute('''
+            CREATE TABLE participants_migration (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nom TEXT NOT NULL,
+                prenom TEXT NOT NULL,
+                nombre_terrains INTEGER DEFAULT 0,
+                telephone TEXT,
+                email TEXT,
+                supprime INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        conn.execute('''
+            INSERT INTO participants_migration (id, nom, prenom, nombre_terrains, telephone, email, supprime)
+            SELECT id, nom, prenom, nombre_terrains, telephone, email, supprime FROM participants
+        ''')
+        conn.execute("DROP TABLE participants")
+        conn.execute("ALTER TABLE participants_migration RENAME TO participants")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("PRAGMA legacy_alter_table = OFF")
+        conn.execute("PRAGMA foreign_keys = ON")
+
+
+def _init_journal_paiements(cursor):
+    """
+    Crée le journal des paiements et les soldes des participants (voir paiements.py)
+
+    Le journal est en ajout seul : une erreur se corrige par une écriture
+    inverse. Toute cotisation marquée payée, démarquée, supprimée ou dont le
+    montant payé change y est reportée par triggers, quelle que soit la page
+    qui écrit. Les soldes (dû, payé, avance) sont tenus à jour à chaque écriture.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'paiements'")
+    journal_existe = cursor.fetchone() is not None
+
+    # cotisation_id n'est pas une clé étrangère : une écriture garde la
+    # référence de sa cotisation même après la suppression de celle-ci
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS paiements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            participant_id INTEGER NOT NULL,
+            cotisation_id INTEGER,
+            montant REAL NOT NULL,
+            date_paiement TEXT NOT NULL,
+            source TEXT NOT NULL,
+            date_creation TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+            FOREIGN KEY (participant_id) REFERENCES participants(id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_paiements_participant_date
+        ON paiements(participant_id, date_paiement)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_paiements_date
+        ON paiements(date_paiement)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_paiements_cotisation
+        ON paiements(cotisation_id)
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS soldes_participants (
+            participant_id INTEGER PRIMARY KEY,
+            total_du REAL NOT NULL DEFAULT 0,
+            total_paye REAL NOT NULL DEFAULT 0,
+            avance REAL NOT NULL DEFAULT 0,
+            nb_paiements INTEGER NOT NULL DEFAULT 0,
+            dernier_paiement TEXT,
+            FOREIGN KEY (participant_id) REFERENCES participants(id) ON DELETE CASCADE
+        )
+    ''')
+
+    # Ajout seul (les écritures d'un participant purgé partent avec lui)
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_paiements_ajout_seul_update
+        BEFORE UPDATE ON paiements
+        BEGIN
+            SELECT RAISE(ABORT, 'Le journal des paiements est en ajout seul');
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_paiements_ajout_seul_delete
+        BEFORE DELETE ON paiements
+        WHEN EXISTS (SELECT 1 FROM participants WHERE id = old.participant_id AND supprime = 0)
+        BEGIN
+            SELECT RAISE(ABORT, 'Le journal des paiements est en ajout seul');
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_version_paiements_insert
+        AFTER INSERT ON paiements
+        BEGIN
+            UPDATE version_donnees SET version = version + 1 WHERE id = 1;
+        END
+    ''')
+
+    # Soldes : chaque écriture du journal s'ajoute au total payé (et à l'avance)
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_soldes_paiements_insert
+        AFTER INSERT ON paiements
+        BEGIN
+            INSERT INTO soldes_participants (participant_id, total_paye, avance, nb_paiements, dernier_paiement)
+            VALUES (new.participant_id, new.montant, CASE WHEN new.source = 'avance' THEN new.montant ELSE 0 END,
+                    1, new.date_paiement)
+            ON CONFLICT (participant_id) DO UPDATE
+            SET total_paye = total_paye + excluded.total_paye,
+                avance = avance + excluded.avance,
+                nb_paiements = nb_paiements + 1,
+                dernier_paiement = MAX(COALESCE(dernier_paiement, excluded.dernier_paiement),
+                                       excluded.dernier_paiement);
+        END
+    ''')
+    # Soldes : le dû suit les montants des cotisations
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_soldes_cotisations_insert
+        AFTER INSERT ON cotisations
+        WHEN {HORS_INSERTION_GROUPEE}
+        BEGIN
+            {_sql_ajout_du('new.participant_id', 'new.montant')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_soldes_cotisations_update
+        AFTER UPDATE OF participant_id, montant ON cotisations
+        BEGIN
+            {_sql_ajout_du('old.participant_id', '-old.montant')}
+            {_sql_ajout_du('new.participant_id', 'new.montant')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_soldes_cotisations_delete
+        AFTER DELETE ON cotisations
+        BEGIN
+            {_sql_ajout_du('old.participant_id', '-old.montant')}
+        END
+    ''')
+
+    # Journal : cotisation créée payée, puis marquée payée
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_paiements_cotisation_insert
+        AFTER INSERT ON cotisations
+        WHEN new.paye = 1
+        BEGIN
+            INSERT INTO paiements (participant_id, cotisation_id, montant, date_paiement, source)
+            VALUES (new.participant_id, new.id, new.montant,
+                    COALESCE(new.date_paiement, date('now', 'localtime')), 'cotisation');
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_paiements_cotisation_payee
+        AFTER UPDATE OF paye ON cotisations
+        WHEN old.paye = 0 AND new.paye = 1
+        BEGIN
+            INSERT INTO paiements (participant_id, cotisation_id, montant, date_paiement, source)
+            VALUES (new.participant_id, new.id, new.montant,
+                    COALESCE(new.date_paiement, date('now', 'localtime')), 'cotisation');
+        END
+    ''')
+    # Journal : montant d'une cotisation payée modifié (ancien écran de paiement, import)
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_paiements_cotisation_montant
+        AFTER UPDATE OF montant ON cotisations
+        WHEN old.paye = 1 AND new.paye = 1 AND new.montant <> old.montant
+        BEGIN
+            INSERT INTO paiements (participant_id, cotisation_id, montant, date_paiement, source)
+            VALUES (new.participant_id, new.id, new.montant - old.montant,
+                    date('now', 'localtime'), 'ajustement');
+        END
+    ''')
+    # Journal : paiement annulé (cotisation démarquée ou supprimée), pour le total déjà versé
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_paiements_cotisation_annulee
+        AFTER UPDATE OF paye ON cotisations
+        WHEN old.paye = 1 AND new.paye = 0
+        BEGIN
+            {_sql_annulation_paiement('new')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_paiements_cotisation_delete
+        AFTER DELETE ON cotisations
+        WHEN old.paye = 1
+         AND EXISTS (SELECT 1 FROM participants WHERE id = old.participant_id AND supprime = 0)
+        BEGIN
+            {_sql_annulation_paiement('old')}
+        END
+    ''')
+
+    if not journal_existe:
+        # Reprise : le dû de chaque participant, puis une écriture par cotisation déjà payée
+        cursor.execute('''
+            INSERT INTO soldes_participants (participant_id, total_du)
+            SELECT c.participant_id, SUM(c.montant)
+            FROM cotisations c
+            JOIN participants p ON p.id = c.participant_id
+            GROUP BY c.participant_id
+        ''')
+        cursor.execute('''
+            INSERT INTO paiements (participant_id, cotisation_id, montant, date_paiement, source)
+            SELECT c.participant_id, c.id, c.montant,
+                   COALESCE(c.date_paiement, date('now', 'localtime')), 'reprise'
+            FROM cotisations c
+            JOIN participants p ON p.id = c.participant_id
+            WHERE c.paye = 1
+            ORDER BY c.date_paiement, c.id
+        ''')
+
+
+def inserer_cotisations_groupees(cursor, requete, params=()):
+    """
+    Exécute une insertion de cotisations en masse (INSERT … SELECT) dans la
+    transaction de l'appelant, sans les triggers par ligne
+
+    Les triggers d'insertion de version, de masques et de soldes sont ignorés
+    pendant la requête ; version, masques et soldes sont ensuite mis à jour
+    en une requête groupée chacun sur les lignes créées. Les cotisations
+    insérées payées restent reportées au journal par leur trigger.
+
+    Returns:
+        Nombre de cotisations créées (changes() de l'insertion)
+    """
+    cursor.execute("UPDATE version_donnees SET insertion_groupee = 1 WHERE id = 1")
+    # Les identifiants (AUTOINCREMENT) des lignes créées suivent tous celui-ci
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM cotisations")
+    dernier_id = cursor.fetchone()[0]
+
+    cursor.execute(requete, params)
+    cursor.execute("SELECT changes()")
+    nb_ajoutes = cursor.fetchone()[0]
+
+    if nb_ajoutes:
+        cursor.execute("""
+            INSERT INTO masques_paiement (participant_id, terrain, annee, existe, paye)
+            SELECT participant_id, COALESCE(numero_terrain, 0), annee,
+                   SUM(1 << (mois - 1)), SUM(CASE WHEN paye = 1 THEN 1 << (mois - 1) ELSE 0 END)
+            FROM cotisations
+            WHERE id > ?
+            GROUP BY participant_id, COALESCE(numero_terrain, 0), annee
+            ON CONFLICT (participant_id, terrain, annee) DO UPDATE
+            SET existe = existe | excluded.existe, paye = paye | excluded.paye
+        """, (dernier_id,))
+        cursor.execute("""
+            INSERT INTO soldes_participants (participant_id, total_du)
+            SELECT participant_id, SUM(montant)
+            FROM cotisations
+            WHERE id > ?
+            GROUP BY participant_id
+            ON CONFLICT (participant_id) DO UPDATE SET total_du = total_du + excluded.total_du
+        """, (dernier_id,))
+    cursor.execute("""
+        UPDATE version_donnees
+        SET version = version + (? > 0), insertion_groupee = 0
+        WHERE id = 1
+    """, (nb_ajoutes,))
+    return nb_ajoutes
+
+
+def _sql_ajout_du(participant_id, montant):
+    """Instruction de trigger ajoutant `montant` au dû d'un participant"""
+    return f"""
+            INSERT INTO soldes_participants (participant_id, total_du)
+            SELECT {participant_id}, {montant}
+            WHERE EXISTS (SELECT 1 FROM participants WHERE id = {participant_id})
+            ON CONFLICT (participant_id) DO UPDATE SET total_du = total_du + excluded.total_du;"""
+
+
+def _sql_annulation_paiement(ligne):
+    """Instruction de trigger annulant tout ce qui a été versé pour la cotisation de `ligne`"""
+    return f"""
+            INSERT INTO paiements (participant_id, cotisation_id, montant, date_paiement, source)
+            SELECT {ligne}.participant_id, {ligne}.id, -SUM(montant), date('now', 'localtime'), 'annulation'
+            FROM paiements
+            WHERE cotisation_id = {ligne}.id
+            HAVING SUM(montant) <> 0;"""
+
+
+def _sql_recalcul_masque(ligne):
+    """Instructions de trigger recalculant le masque de la clé de `ligne` ('old' ou 'new')"""
+    cle = f"""participant_id = {ligne}.participant_id AND annee = {ligne}.annee"""
+    return f"""
+            INSERT INTO masques_paiement (participant_id, terrain, annee, existe, paye)
+            SELECT {ligne}.participant_id, COALESCE({ligne}.numero_terrain, 0), {ligne}.annee,
+                   COALESCE(SUM(bit), 0), COALESCE(SUM(bit * paye), 0)
+            FROM (
+                SELECT 1 << (mois - 1) AS bit, MAX(paye) AS paye FROM cotisations
+                WHERE {cle} AND COALESCE(numero_terrain, 0) = COALESCE({ligne}.numero_terrain, 0)
+                GROUP BY mois
+            )
+            WHERE 1
+            ON CONFLICT (participant_id, terrain, annee) DO UPDATE
+            SET existe = excluded.existe, paye = excluded.paye;
+            DELETE FROM masques_paiement
+            WHERE {cle} AND terrain = COALESCE({ligne}.numero_terrain, 0) AND existe = 0;"""
+
+
+# ============================================================================
+# VERSION DES DONNÉES
+# ============================================================================
+
+def get_data_version():
+    """Retourne la version courante des données (change à chaque modification)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT version FROM version_donnees WHERE id = 1")
+    result = cursor.fetchone()
     conn.close()
+    return result[0] if result else 0
@@ -0,0 +1,20 @@
+"""
+File d'écriture asynchrone
+Les écritures soumises sont exécutées une par une, dans l'ordre de soumission,
+par un thread dédié : l'interface n'attend pas la base de données et les
+écritures d'un même processus ne se disputent jamais le verrou SQLite.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+_executeur = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ecritures")
+
+
+def soumettre(fonction, *args, **kwargs):
+    """
+    Ajoute une écriture à la file
+
+    Returns:
+        Future portant le résultat de la fonction, ou l'exception levée
+    """
+    return _executeur.submit(fonction, *args, **kwargs)
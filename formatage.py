@@ -0,0 +1,116 @@
+"""
+Formatage des valeurs affichées
+Montants en FCFA avec séparateur de milliers, noms des mois, statuts et
+terrains. Les fonctions acceptent une Series ou un tableau et formatent toute
+la colonne en opérations NumPy (pas de boucle Python par ligne) : une Series
+en entrée donne une Series de même index, un tableau donne un tableau.
+"""
+
+import numpy as np
+import pandas as pd
+from constants import MOIS_NOMS
+
+SEPARATEUR_MILLIERS = ' '
+DEVISE = " FCFA"
+
+LIBELLE_PAYEE = "✅ Payée"
+LIBELLE_IMPAYEE = "⏳ Impayée"
+
+# Noms des mois indexés par numéro de mois (l'indice 0 sert aux mois invalides)
+_NOMS_MOIS = np.array([''] + MOIS_NOMS, dtype=object)
+
+
+def _comme_entree(valeurs, resultat):
+    """Remet le résultat sous la forme de l'entrée (Series de même index ou tableau)"""
+    if isinstance(valeurs, pd.Series):
+        return pd.Series(resultat, index=valeurs.index, name=valeurs.name)
+    return resultat
+
+
+def format_montants(valeurs, devise=DEVISE, vide="-"):
+    """
+    Formate des montants arrondis à l'unité avec séparateur de milliers
+
+    Exemple : [1500, 2500000, NaN] -> ['1 500 FCFA', '2 500 000 FCFA', '-']
+
+    Chaque montant est découpé en chiffres dans une matrice (une ligne par
+    montant, une colonne par puissance de 10, alignée à droite) : les zéros
+    de tête deviennent des espaces, une colonne de séparateur est insérée
+    toutes les trois colonnes, puis chaque ligne est relue comme une chaîne
+    dont on retire les espaces de tête.
+
+    Args:
+        valeurs: Series ou tableau de montants
+        devise: Suffixe ajouté à chaque montant ('' pour aucun)
+        vide: Texte des valeurs manquantes
+    """
+    montants = np.asarray(valeurs, dtype=float).ravel()
+    manquants = np.isnan(montants)
+    entiers = np.rint(np.where(manquants, 0, montants)).astype(np.int64)
+    negatifs = entiers < 0
+    entiers = np.abs(entiers)
+
+    # Chiffres de chaque montant, des plus forts aux unités : 1500 -> [1, 5, 0, 0]
+    nb_chiffres = len(str(entiers.max(initial=0)))
+    puissances = 10 ** np.arange(nb_chiffres - 1, -1, -1, dtype=np.int64)
+    chiffres = entiers[:, None] // puissances % 10
+    significatifs = entiers[:, None] >= puissances
+    significatifs[:, -1] = True  # 0 s'écrit '0'
+    caracteres = np.where(significatifs, ord('0') + chiffres, ord(' ')).astype(np.uint32)
+
+    # Séparateur devant chaque groupe de trois chiffres (compté depuis les unités)
+    caracteres = np.insert(caracteres, np.arange(nb_chiffres - 3, 0, -3), ord(SEPARATEUR_MILLIERS), axis=1)
+
+    # Chaque ligne de points de code est lue comme une chaîne : '  1 500' -> '1 500'
+    texte = np.ascontiguousarray(caracteres).view(f'<U{caracteres.shape[1]}').ravel()
+    texte = np.char.lstrip(texte, ' ' + SEPARATEUR_MILLIERS)
+    texte = np.where(negatifs, np.char.add('-', texte), texte)
+    if devise:
+        texte = np.char.add(texte, devise)
+    resultat = np.where(manquants, vide, texte).astype(object)
+    return _comme_entree(valeurs, resultat)
+
+
+def format_fcfa(montant, devise=DEVISE):
+    """Formate un montant unique (ex : 15000 -> '15 000 FCFA')"""
+    return format_montants([montant], devise)[0]
+
+
+def libelles_mois(mois):
+    """
+    Noms des mois, par correspondance catégorielle (1 -> 'Jan')
+
+    Returns:
+        Series catégorielle (mois invalides manquants) ; tableau d'objets si l'entrée est un tableau
+    """
+    codes = np.asarray(mois, dtype=float).ravel()
+    valides = (codes >= 1) & (codes <= 12)
+    codes = np.where(valides, codes - 1, -1).astype(np.int8)
+    noms = pd.Categorical.from_codes(codes, categories=MOIS_NOMS)
+    if isinstance(mois, pd.Series):
+        return pd.Series(noms, index=mois.index, name=mois.name)
+    return np.asarray(noms, dtype=object)
+
+
+def libelles_periodes(mois, annees):
+    """Libellés 'Mois Année' (ex : 'Mar 2025')"""
+    numeros = np.asarray(mois, dtype=float).ravel()
+    numeros = np.where((numeros >= 1) & (numeros <= 12), numeros, 0).astype(np.int64)
+    annees_texte = np.asarray(annees, dtype=np.int64).ravel().astype(str)
+    resultat = np.char.add(np.char.add(_NOMS_MOIS[numeros].astype(str), ' '), annees_texte).astype(object)
+    return _comme_entree(mois, resultat)
+
+
+def libelles_statut(paye, payee=LIBELLE_PAYEE, impayee=LIBELLE_IMPAYEE):
+    """Libellés de statut de paiement (1 -> '✅ Payée', 0 -> '⏳ Impayée')"""
+    resultat = np.where(np.asarray(paye).ravel() == 1, payee, impayee).astype(object)
+    return _comme_entree(paye, resultat)
+
+
+def libelles_terrain(numeros, tous="Tous"):
+    """Libellés de terrain (2 -> 'n°2', manquant -> tous)"""
+    numeros_reels = np.asarray(numeros, dtype=float).ravel()
+    manquants = np.isnan(numeros_reels)
+    texte = np.char.add('n°', np.where(manquants, 0, numeros_reels).astype(np.int64).astype(str))
+    resultat = np.where(manquants, tous, texte).astype(object)
+    return _comme_entree(numeros, resultat)
@@ -11,24 +11,29 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from reportlab.pdfgen import canvas
 import io
 from datetime import datetime
-import sqlite3
-from database import DB_NAME
-from constants import MOIS_NOMS, PRIX_TERRAIN, COTISATION_PAR_TERRAIN
+from database import get_connection
+from paiements import get_solde
+from constants import PRIX_TERRAIN, COTISATION_PAR_TERRAIN
+from formatage import format_fcfa, format_montants, libelles_mois, libelles_statut, libelles_terrain
 import matplotlib
 matplotlib.use('Agg')  # Backend non-interactif pour génération de graphiques
 import matplotlib.pyplot as plt
 import numpy as np
 
-def generer_rapport_participant(participant_id):
+def generer_rapport_participant(participant_id, conn=None):
     """
     Génère un rapport PDF complet pour un participant
     
+    Args:
+        participant_id: ID du participant
+        conn: Connexion à utiliser (par défaut une nouvelle connexion)
+    
     Returns:
         BytesIO object contenant le PDF
     """
     # Récupérer les informations du participant
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    connexion = conn or get_connection()
+    cursor = connexion.cursor()
     
     cursor.execute("""
         SELECT nom, prenom, nombre_terrains, telephone, email 
@@ -37,7 +42,8 @@ def generer_rapport_participant(participant_id):
     
     participant = cursor.fetchone()
     if not participant:
-        conn.close()
+        if conn is None:
+            connexion.close()
         return None
     
     nom, prenom, nb_terrains, telephone, email = participant
@@ -51,7 +57,9 @@ def generer_rapport_participant(participant_id):
     """, (participant_id,))
     
     cotisations = cursor.fetchall()
-    conn.close()
+    solde = get_solde(participant_id, connexion)
+    if conn is None:
+        connexion.close()
     
     # Créer le PDF
     buffer = io.BytesIO()
@@ -99,7 +107,7 @@ def generer_rapport_participant(participant_id):
         ['Nombre de terrains:', str(nb_terrains)],
         ['Téléphone:', telephone or 'Non renseigné'],
         ['Email:', email or 'Non renseigné'],
-        ['Coût total terrains:', f"{nb_terrains * PRIX_TERRAIN:,.0f} FCFA".replace(',', ' ')]
+        ['Coût total terrains:', format_fcfa(nb_terrains * PRIX_TERRAIN)]
     ]
     
     info_table = Table(info_data, colWidths=[6*cm, 10*cm])
@@ -124,10 +132,10 @@ def generer_rapport_participant(participant_id):
     
     # Statistiques globales
     if cotisations:
-        # Le montant attendu est la somme de TOUS les montants de cotisations (payées ou non)
-        total_attendu = sum(c[2] for c in cotisations)
-        # Le montant payé est la somme des montants des cotisations marquées comme payées
-        total_paye = sum(c[2] for c in cotisations if c[3] == 1)
+        # Montants lus dans le solde du participant (journal des paiements) :
+        # les versements partiels, les surplus et les avances y sont comptés
+        total_attendu = solde['total_du']
+        total_paye = solde['total_paye']
         nb_payees = sum(1 for c in cotisations if c[3] == 1)
         taux_paiement = (nb_payees / len(cotisations) * 100) if cotisations else 0
         
@@ -137,10 +145,12 @@ def generer_rapport_participant(participant_id):
             ['Nombre total de cotisations:', str(len(cotisations))],
             ['Cotisations payées:', f"{nb_payees} ({taux_paiement:.1f}%)"],
             ['Cotisations impayées:', str(len(cotisations) - nb_payees)],
-            ['Montant attendu:', f"{total_attendu:,.0f} FCFA".replace(',', ' ')],
-            ['Montant encaissé:', f"{total_paye:,.0f} FCFA".replace(',', ' ')],
-            ['Reste à payer:', f"{total_attendu - total_paye:,.0f} FCFA".replace(',', ' ')]
+            ['Montant attendu:', format_fcfa(total_attendu)],
+            ['Montant encaissé:', format_fcfa(total_paye)],
+            ['Reste à payer:', format_fcfa(solde['reste'])]
         ]
+        if solde['avance'] > 0:
+            stats_data.append(['Avance disponible:', format_fcfa(solde['avance'])])
         
         stats_table = Table(stats_data, colWidths=[8*cm, 8*cm])
         stats_table.setStyle(TableStyle([
@@ -256,20 +266,16 @@ def generer_rapport_participant(participant_id):
             # En-tête du tableau
             cotis_data = [['Mois', 'Terrain', 'Montant', 'Statut', 'Date paiement']]
             
-            for cotis in sorted(cotis_par_annee[annee], key=lambda x: (x[1], x[5] or 0)):
-                annee_c, mois, montant, paye, date_paiement, numero_terrain = cotis
-                mois_nom = MOIS_NOMS[mois - 1]
-                terrain_str = f"n°{numero_terrain}" if numero_terrain else "Tous"
-                statut = "✓ Payée" if paye else "✗ Impayée"
-                date_str = date_paiement if date_paiement else "-"
-                
-                cotis_data.append([
-                    mois_nom,
-                    terrain_str,
-                    f"{montant:,.0f}".replace(',', ' '),
-                    statut,
-                    date_str
-                ])
+            # Colonnes formatées d'un bloc pour toutes les cotisations de l'année
+            lignes = sorted(cotis_par_annee[annee], key=lambda x: (x[1], x[5] or 0))
+            _, mois, montants, payes, dates, terrains = zip(*lignes)
+            cotis_data.extend(zip(
+                libelles_mois(mois),
+                libelles_terrain([terrain or None for terrain in terrains]),
+                format_montants(montants, devise=''),
+                libelles_statut(payes, "✓ Payée", "✗ Impayée"),
+                [date or "-" for date in dates]
+            ))
             
             cotis_table = Table(cotis_data, colWidths=[3*cm, 2*cm, 3*cm, 3*cm, 3*cm])
             cotis_table.setStyle(TableStyle([
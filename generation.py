@@ -0,0 +1,218 @@
+"""
+Génération des cotisations mensuelles
+Une cotisation impayée par terrain et par participant est créée pour chaque
+mois demandé, en une seule requête ensembliste : les mois de la période et les
+terrains de chaque participant sont énumérés par des CTE récursives et les
+cotisations déjà présentes sont ignorées par la contrainte d'unicité
+(ON CONFLICT DO NOTHING).
+"""
+
+import pandas as pd
+from database import get_connection, inserer_cotisations_groupees
+from constants import COTISATION_PAR_TERRAIN, MOIS_NOMS
+from historique import ajouter_historique_batch
+
+# Participants concernés par la génération
+CONDITION_PARTICIPANTS = "nombre_terrains > 0 AND supprime = 0"
+
+# Mois de la période (indice = année * 12 + mois - 1), à compléter par d'autres CTE
+# Paramètres : indice de début, indice de fin
+CTE_PERIODES = """
+    WITH RECURSIVE periodes(indice) AS (
+        SELECT ?
+        UNION ALL
+        SELECT indice + 1 FROM periodes WHERE indice < ?
+    )
+"""
+
+# Mois de la période x terrains des participants
+# Paramètres : indice de début, indice de fin
+CTE_PERIODE_TERRAINS = f"""
+    {CTE_PERIODES},
+    numeros(numero) AS (
+        SELECT 1
+        UNION ALL
+        SELECT numero + 1 FROM numeros
+        WHERE numero < (SELECT MAX(nombre_terrains) FROM participants WHERE {CONDITION_PARTICIPANTS})
+    ),
+    -- Jointure sur les numéros plutôt qu'une récursion par participant
+    terrains(participant_id, numero) AS (
+        SELECT participants.id, numeros.numero
+        FROM participants JOIN numeros ON numeros.numero <= participants.nombre_terrains
+        WHERE {CONDITION_PARTICIPANTS}
+    )
+"""
+
+INSERT_COTISATIONS_PERIODE = f"""
+    INSERT INTO cotisations (participant_id, mois, annee, montant, paye, numero_terrain)
+    {CTE_PERIODE_TERRAINS}
+    SELECT t.participant_id, periodes.indice % 12 + 1, periodes.indice / 12, ?, 0, t.numero
+    FROM periodes CROSS JOIN terrains t
+    WHERE 1
+    -- Dans l'ordre de la clé d'unicité : insertions groupées dans l'index
+    ORDER BY t.participant_id, periodes.indice, t.numero
+    ON CONFLICT DO NOTHING
+"""
+
+# Cotisations de la période déjà présentes sur un terrain des participants
+# concernés : les lignes que l'insertion va ignorer
+# Paramètres : indice de début, indice de fin
+COUNT_EXISTANTES_PERIODE = f"""
+    SELECT COUNT(*)
+    FROM cotisations c
+    JOIN participants p ON p.id = c.participant_id
+    WHERE c.annee BETWEEN ?1 / 12 AND ?2 / 12
+      AND c.annee * 12 + c.mois - 1 BETWEEN ?1 AND ?2
+      AND c.numero_terrain BETWEEN 1 AND p.nombre_terrains
+      AND {CONDITION_PARTICIPANTS}
+"""
+
+# Cotisations manquantes par mois et par participant (anti-jointure sur la clé d'unicité)
+SELECT_MANQUANTES_PERIODE = f"""
+    {CTE_PERIODE_TERRAINS}
+    SELECT
+        periodes.indice / 12 AS annee,
+        periodes.indice % 12 + 1 AS mois,
+        t.participant_id,
+        p.nom || ' ' || p.prenom AS participant,
+        COUNT(*) AS manquantes
+    FROM periodes
+    CROSS JOIN terrains t
+    JOIN participants p ON p.id = t.participant_id
+    LEFT JOIN cotisations c
+        ON c.participant_id = t.participant_id
+        AND c.annee = periodes.indice / 12
+        AND c.mois = periodes.indice % 12 + 1
+        AND c.numero_terrain = t.numero
+    WHERE c.id IS NULL
+    GROUP BY periodes.indice, t.participant_id
+    ORDER BY periodes.indice, p.nom, p.prenom
+"""
+
+
+def indice_mois(annee, mois):
+    """Numéro absolu d'un mois (année * 12 + mois - 1), pour parcourir une période"""
+    return int(annee) * 12 + int(mois) - 1
+
+
+def dernier_mois_genere(cursor):
+    """
+    Indice du dernier mois pour lequel des cotisations par terrain ont été générées
+
+    Returns:
+        Indice (voir indice_mois) ou None si aucune cotisation n'a encore été générée
+    """
+    cursor.execute("""
+        SELECT annee, mois FROM cotisations
+        WHERE numero_terrain IS NOT NULL
+        ORDER BY annee DESC, mois DESC
+        LIMIT 1
+    """)
+    dernier = cursor.fetchone()
+    return indice_mois(*dernier) if dernier else None
+
+
+def libelle_periode(debut, fin):
+    """Libellé d'une période donnée par deux tuples (annee, mois)"""
+    libelle_debut = f"{MOIS_NOMS[debut[1] - 1]} {debut[0]}"
+    if debut == fin:
+        return libelle_debut
+    return f"{libelle_debut} à {MOIS_NOMS[fin[1] - 1]} {fin[0]}"
+
+
+def inserer_cotisations_mois(cursor, mois, annee, montant=COTISATION_PAR_TERRAIN):
+    """
+    Insère les cotisations manquantes d'un mois dans la transaction de l'appelant
+
+    Les cotisations ignorées sont comptées sous le verrou d'écriture, juste
+    avant l'insertion : ce sont exactement les lignes écartées par la
+    contrainte d'unicité. Les créées sont celles comptées par changes().
+
+    Returns:
+        Tuple (nombre de cotisations créées, nombre de cotisations déjà existantes)
+    """
+    if not cursor.connection.in_transaction:
+        cursor.execute("BEGIN IMMEDIATE")
+    indice = indice_mois(annee, mois)
+    cursor.execute(COUNT_EXISTANTES_PERIODE, (indice, indice))
+    nb_existent = cursor.fetchone()[0]
+
+    nb_ajoutes = inserer_cotisations_groupees(cursor, INSERT_COTISATIONS_PERIODE, (indice, indice, montant))
+
+    return nb_ajoutes, nb_existent
+
+
+def generer_cotisations_mensuelles(mois, annee):
+    """Génère les cotisations impayées pour tous les participants pour un mois donné (une par terrain)"""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        nb_ajoutes, nb_existent = inserer_cotisations_mois(cursor, mois, annee)
+        conn.commit()
+        conn.close()
+
+        return True, f"✅ {nb_ajoutes} cotisation(s) créée(s). {nb_existent} existait(ent) déjà."
+    except Exception as e:
+        return False, f"Erreur: {str(e)}"
+
+
+def apercu_generation_periode(debut, fin, conn=None):
+    """
+    Calcule, sans rien écrire, les cotisations manquantes d'une période
+
+    Args:
+        debut: Tuple (annee, mois) du premier mois
+        fin: Tuple (annee, mois) du dernier mois
+        conn: Connexion à utiliser (par défaut une nouvelle connexion)
+
+    Returns:
+        DataFrame (annee, mois, participant_id, participant, manquantes)
+    """
+    connexion = conn or get_connection()
+    df = pd.read_sql_query(SELECT_MANQUANTES_PERIODE, connexion,
+                           params=(indice_mois(*debut), indice_mois(*fin)))
+    if conn is None:
+        connexion.close()
+    return df
+
+
+def generer_cotisations_periode(debut, fin, montant=COTISATION_PAR_TERRAIN):
+    """
+    Crée toutes les cotisations manquantes d'une période en une seule transaction
+
+    Une seule entrée d'historique résume la génération (nombre créé par mois).
+
+    Args:
+        debut: Tuple (annee, mois) du premier mois
+        fin: Tuple (annee, mois) du dernier mois
+        montant: Montant de chaque cotisation créée
+
+    Returns:
+        Tuple (succès, message)
+    """
+    if indice_mois(*debut) > indice_mois(*fin):
+        return False, "Le mois de début doit précéder le mois de fin"
+
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        manquantes = apercu_generation_periode(debut, fin, conn)
+        nb_ajoutes = inserer_cotisations_groupees(conn.cursor(), INSERT_COTISATIONS_PERIODE,
+                                                  (indice_mois(*debut), indice_mois(*fin), montant))
+
+        par_mois = manquantes.groupby(['annee', 'mois'])['manquantes'].sum()
+        periode = libelle_periode(debut, fin)
+        ajouter_historique_batch([{
+            'type_action': 'CREATE',
+            'table_concernee': 'cotisations',
+            'id_enregistrement': None,
+            'details': f"Génération des cotisations {periode} - {nb_ajoutes} cotisation(s) créée(s)",
+            'nouvelle_valeur': {f"{mois:02d}/{annee}": int(nb) for (annee, mois), nb in par_mois.items()}
+        }], conn)
+        conn.commit()
+        return True, f"✅ {nb_ajoutes} cotisation(s) créée(s) pour la période {periode}."
+    except Exception as e:
+        conn.rollback()
+        return False, f"Erreur: {str(e)}"
+    finally:
+        conn.close()
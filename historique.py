@@ -2,11 +2,31 @@
 Module pour gérer l'historique des modifications
 """
 
-import sqlite3
 from datetime import datetime
-from database import DB_NAME
+from database import get_connection
 import json
 
+def _preparer_entree(type_action, table_concernee, id_enregistrement, details,
+                     ancienne_valeur=None, nouvelle_valeur=None, utilisateur='admin', date_action=None):
+    """Prépare le tuple de valeurs d'une entrée d'historique"""
+    if date_action is None:
+        date_action = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    # Convertir les valeurs en JSON si ce sont des dictionnaires
+    if isinstance(ancienne_valeur, dict):
+        ancienne_valeur = json.dumps(ancienne_valeur, ensure_ascii=False)
+    if isinstance(nouvelle_valeur, dict):
+        nouvelle_valeur = json.dumps(nouvelle_valeur, ensure_ascii=False)
+    
+    return (date_action, utilisateur, type_action, table_concernee, id_enregistrement,
+            details, ancienne_valeur, nouvelle_valeur)
+
+INSERT_HISTORIQUE = """
+    INSERT INTO historique (date_action, utilisateur, type_action, table_concernee, 
+                           id_enregistrement, details, ancienne_valeur, nouvelle_valeur)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
 def ajouter_historique(type_action, table_concernee, id_enregistrement, details, ancienne_valeur=None, nouvelle_valeur=None, utilisateur='admin'):
     """
     Ajoute une entrée dans l'historique
@@ -21,23 +41,13 @@ def ajouter_historique(type_action, table_concernee, id_enregistrement, details,
         utilisateur: Nom de l'utilisateur (par défaut 'admin')
     """
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_connection()
         cursor = conn.cursor()
         
-        date_action = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Convertir les valeurs en JSON si ce sont des dictionnaires
-        if isinstance(ancienne_valeur, dict):
-            ancienne_valeur = json.dumps(ancienne_valeur, ensure_ascii=False)
-        if isinstance(nouvelle_valeur, dict):
-            nouvelle_valeur = json.dumps(nouvelle_valeur, ensure_ascii=False)
-        
-        cursor.execute("""
-            INSERT INTO historique (date_action, utilisateur, type_action, table_concernee, 
-                                   id_enregistrement, details, ancienne_valeur, nouvelle_valeur)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (date_action, utilisateur, type_action, table_concernee, id_enregistrement, 
-              details, ancienne_valeur, nouvelle_valeur))
+        cursor.execute(INSERT_HISTORIQUE, _preparer_entree(
+            type_action, table_concernee, id_enregistrement, details,
+            ancienne_valeur, nouvelle_valeur, utilisateur
+        ))
         
         conn.commit()
         conn.close()
@@ -46,6 +56,24 @@ def ajouter_historique(type_action, table_concernee, id_enregistrement, details,
         print(f"Erreur lors de l'ajout à l'historique: {e}")
         return False
 
+def ajouter_historique_batch(entrees, conn):
+    """
+    Ajoute plusieurs entrées dans l'historique en une seule requête
+    
+    Les entrées sont écrites dans la transaction de la connexion fournie :
+    c'est l'appelant qui valide (commit) ou annule l'ensemble.
+    
+    Args:
+        entrees: Liste de dictionnaires avec les clés de ajouter_historique
+                 (type_action, table_concernee, id_enregistrement, details,
+                 ancienne_valeur, nouvelle_valeur, utilisateur)
+        conn: Connexion SQLite ouverte
+    """
+    date_action = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn.executemany(INSERT_HISTORIQUE, [
+        _preparer_entree(date_action=date_action, **entree) for entree in entrees
+    ])
+
 def get_historique(limit=50, table_concernee=None, type_action=None):
     """
     Récupère l'historique des modifications
@@ -59,7 +87,7 @@ def get_historique(limit=50, table_concernee=None, type_action=None):
         Liste de tuples avec les données de l'historique
     """
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_connection()
         cursor = conn.cursor()
         
         query = "SELECT * FROM historique WHERE 1=1"
@@ -90,7 +118,7 @@ def get_historique_participant(participant_id, limit=20):
     Récupère l'historique d'un participant spécifique
     """
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
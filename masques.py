@@ -0,0 +1,138 @@
+"""
+Masques de paiement mensuels
+Pour chaque (participant, terrain, année), deux entiers de 12 bits (bit 0 =
+janvier) indiquent les mois existants et les mois payés. La table
+masques_paiement est tenue à jour par triggers à chaque écriture sur les
+cotisations : la charger revient à lire une ligne par terrain et par an au lieu
+de douze cotisations. Les questions du type « mois impayés d'affilée » ou
+« année soldée » deviennent des opérations bit à bit sur tous les participants
+à la fois.
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from datetime import datetime
+from database import get_connection
+from constants import MOIS_NOMS
+
+# Masque des 12 mois de l'année
+TOUS_LES_MOIS = np.uint16(0xFFF)
+
+# Nombre de bits à 1 pour chaque masque possible
+_NB_BITS = np.array([bin(masque).count('1') for masque in range(1 << 12)], dtype=np.uint8)
+
+
+def charger_masques(annee=None):
+    """
+    Charge les masques de paiement
+
+    Args:
+        annee: Année à charger (None = toutes les années)
+
+    Returns:
+        Dictionnaire de tableaux alignés : participant_ids, terrains, annees
+        (int64) et existe, paye (uint16)
+    """
+    conn = get_connection()
+    query = """
+        SELECT m.participant_id, m.terrain, m.annee, m.existe, m.paye
+        FROM masques_paiement m
+        JOIN participants p ON p.id = m.participant_id
+        WHERE p.supprime = 0
+    """
+    params = []
+    if annee is not None:
+        query += " AND m.annee = ?"
+        params.append(int(annee))
+    df = pd.read_sql_query(query, conn, params=params)
+    conn.close()
+
+    return {
+        'participant_ids': df['participant_id'].to_numpy(dtype=np.int64),
+        'terrains': df['terrain'].to_numpy(dtype=np.int64),
+        'annees': df['annee'].to_numpy(dtype=np.int64),
+        'existe': df['existe'].to_numpy(dtype=np.uint16),
+        'paye': df['paye'].to_numpy(dtype=np.uint16),
+    }
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def get_masques(annee, data_version):
+    """Masques de paiement d'une année, rechargés une fois par version des données"""
+    return charger_masques(annee)
+
+
+def mois_de_reference(annee):
+    """Dernier mois échu d'une année (12 pour une année passée, 0 pour une année future)"""
+    maintenant = datetime.now()
+    if annee < maintenant.year:
+        return 12
+    return maintenant.month if annee == maintenant.year else 0
+
+
+def mois_impayes(masques):
+    """Masque des mois existants et non payés"""
+    return masques['existe'] & ~masques['paye']
+
+
+def annee_soldee(masques):
+    """Indique, pour chaque ligne, si tous les mois existants sont payés"""
+    return (masques['existe'] != 0) & (mois_impayes(masques) == 0)
+
+
+def nb_mois(bits):
+    """Nombre de mois à 1 dans chaque masque"""
+    return _NB_BITS[np.asarray(bits) & TOUS_LES_MOIS]
+
+
+def serie_en_cours(bits, mois_fin=12):
+    """
+    Nombre de mois à 1 consécutifs se terminant au mois `mois_fin` inclus
+
+    Exemple : avec les impayés de mars, avril et mai, serie_en_cours(impayes, 5) = 3
+    """
+    bits = np.asarray(bits)
+    serie = np.zeros(len(bits), dtype=np.int64)
+    en_cours = np.ones(len(bits), dtype=bool)
+    for mois in range(mois_fin, 0, -1):
+        en_cours &= ((bits >> (mois - 1)) & 1).astype(bool)
+        serie += en_cours
+    return serie
+
+
+def plus_longue_serie(bits):
+    """Longueur de la plus longue suite de mois à 1 dans chaque masque"""
+    courant = np.asarray(bits).astype(np.uint16)
+    longueur = np.zeros(len(courant), dtype=np.int64)
+    # Chaque itération raccourcit toutes les suites d'un mois
+    while courant.any():
+        longueur += courant != 0
+        courant = courant & (courant >> 1)
+    return longueur
+
+
+def par_participant(masques, valeurs, operation=np.bitwise_or):
+    """
+    Combine par participant des valeurs calculées par terrain
+
+    Args:
+        masques: Masques chargés (pour les participant_ids)
+        valeurs: Tableau aligné sur les masques
+        operation: ufunc de combinaison (np.bitwise_or pour des masques,
+                   np.maximum pour des séries, np.logical_and pour des booléens)
+
+    Returns:
+        Series indexée par participant_id
+    """
+    ids, positions = np.unique(masques['participant_ids'], return_inverse=True)
+    valeurs = np.asarray(valeurs)
+    initial = operation.identity if operation.identity is not None else 0
+    resultat = np.full(len(ids), initial, dtype=valeurs.dtype)
+    operation.at(resultat, positions, valeurs)
+    return pd.Series(resultat, index=ids)
+
+
+def noms_mois(masque):
+    """Liste des noms des mois d'un masque"""
+    return [nom for i, nom in enumerate(MOIS_NOMS) if int(masque) >> i & 1]
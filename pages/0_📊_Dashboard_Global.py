@@ -3,10 +3,11 @@ Page Tableau de bord
 """
 
 import streamlit as st
-import sqlite3
 import pandas as pd
-from database import DB_NAME, init_database
-from constants import MOIS_NOMS, PRIX_TERRAIN
+from database import init_database, get_connection
+from paiements import get_soldes_totaux
+from constants import PRIX_TERRAIN
+from formatage import format_fcfa, format_montants, libelles_mois
 from auth import require_authentication, show_logout_button
 
 # Initialiser la base de données
@@ -24,29 +25,39 @@ show_logout_button()
 
 def get_dashboard_stats(annee=None):
     """Calcule les statistiques pour le tableau de bord"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Nombre total de participants
-    cursor.execute("SELECT COUNT(*) FROM participants")
+    cursor.execute("SELECT COUNT(*) FROM participants WHERE supprime = 0")
     nb_participants = cursor.fetchone()[0]
     
     # Nombre total de terrains
-    cursor.execute("SELECT SUM(nombre_terrains) FROM participants")
+    cursor.execute("SELECT SUM(nombre_terrains) FROM participants WHERE supprime = 0")
     total_terrains = cursor.fetchone()[0] or 0
     
-    # Total des cotisations encaissées
+    # Total encaissé : journal des paiements (versements partiels et avances compris)
     if annee:
-        cursor.execute("SELECT SUM(montant) FROM cotisations WHERE paye = 1 AND annee = ?", (annee,))
+        cursor.execute("""
+            SELECT SUM(pa.montant) FROM paiements pa
+            JOIN cotisations c ON c.id = pa.cotisation_id
+            JOIN participants p ON p.id = c.participant_id
+            WHERE c.annee = ? AND p.supprime = 0
+        """, (annee,))
+        total_encaisse = cursor.fetchone()[0] or 0
     else:
-        cursor.execute("SELECT SUM(montant) FROM cotisations WHERE paye = 1")
-    total_encaisse = cursor.fetchone()[0] or 0
+        total_encaisse = get_soldes_totaux(conn)['total_paye']
     
     # Cotisations impayées
+    requete_impayees = """
+        SELECT COUNT(*), SUM(c.montant) FROM cotisations c
+        JOIN participants p ON p.id = c.participant_id
+        WHERE c.paye = 0 AND p.supprime = 0
+    """
     if annee:
-        cursor.execute("SELECT COUNT(*), SUM(montant) FROM cotisations WHERE paye = 0 AND annee = ?", (annee,))
+        cursor.execute(requete_impayees + " AND c.annee = ?", (annee,))
     else:
-        cursor.execute("SELECT COUNT(*), SUM(montant) FROM cotisations WHERE paye = 0")
+        cursor.execute(requete_impayees)
     result = cursor.fetchone()
     nb_impayees = result[0] or 0
     montant_impaye = result[1] or 0
@@ -67,7 +78,7 @@ def get_dashboard_stats(annee=None):
 
 def get_available_years():
     """Récupère la liste des années disponibles dans les cotisations"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT DISTINCT annee FROM cotisations ORDER BY annee DESC")
     years = [row[0] for row in cursor.fetchall()]
@@ -111,12 +122,10 @@ with col2:
     st.metric("🏠 Terrains total", stats['total_terrains'])
 
 with col3:
-    st.metric("💰 Montant total attendu", 
-              f"{stats['montant_total_attendu']:,.0f}".replace(',', ' ') + " FCFA")
+    st.metric("💰 Montant total attendu", format_fcfa(stats['montant_total_attendu']))
 
 with col4:
-    st.metric("✅ Total encaissé", 
-              f"{stats['total_encaisse']:,.0f}".replace(',', ' ') + " FCFA")
+    st.metric("✅ Total encaissé", format_fcfa(stats['total_encaisse']))
 
 # Deuxième ligne : Progression et reste
 st.divider()
@@ -129,12 +138,12 @@ with col_prog:
         st.metric("📈 Progression globale", f"{progression:.1f}%")
         st.progress(min(progression / 100, 1.0))
         reste_total = stats['montant_total_attendu'] - stats['total_encaisse']
-        st.caption(f"Reste à encaisser : {reste_total:,.0f}".replace(',', ' ') + " FCFA")
+        st.caption(f"Reste à encaisser : {format_fcfa(reste_total)}")
 
 with col_reste:
     st.metric("⏳ Cotisations impayées", stats['nb_impayees'])
     if stats['montant_impaye'] > 0:
-        st.caption(f"{stats['montant_impaye']:,.0f}".replace(',', ' ') + " FCFA")
+        st.caption(format_fcfa(stats['montant_impaye']))
 
 
 st.divider()
@@ -143,21 +152,22 @@ st.divider()
 if annee:
     st.subheader(f"📅 Évolution des cotisations pour {annee}")
     
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     query = """
-        SELECT mois, 
-               SUM(CASE WHEN paye = 1 THEN montant ELSE 0 END) as paye,
-               SUM(CASE WHEN paye = 0 THEN montant ELSE 0 END) as impaye
-        FROM cotisations
-        WHERE annee = ?
-        GROUP BY mois
-        ORDER BY mois
+        SELECT c.mois, 
+               SUM(CASE WHEN c.paye = 1 THEN c.montant ELSE 0 END) as paye,
+               SUM(CASE WHEN c.paye = 0 THEN c.montant ELSE 0 END) as impaye
+        FROM cotisations c
+        JOIN participants p ON p.id = c.participant_id
+        WHERE c.annee = ? AND p.supprime = 0
+        GROUP BY c.mois
+        ORDER BY c.mois
     """
     df = pd.read_sql_query(query, conn, params=(annee,))
     conn.close()
     
     if not df.empty:
-        df['mois_nom'] = df['mois'].apply(lambda x: MOIS_NOMS[x-1] if 1 <= x <= 12 else str(x))
+        df['mois_nom'] = libelles_mois(df['mois'])
         
         chart_data = df.set_index('mois_nom')[['paye', 'impaye']]
         chart_data.columns = ['Payées', 'Impayées']
@@ -167,9 +177,8 @@ if annee:
         with st.expander("📋 Détails par mois"):
             df_display = df.copy()
             df_display['Total'] = df_display['paye'] + df_display['impaye']
-            df_display['paye'] = df_display['paye'].apply(lambda x: f"{x:,.0f}".replace(',', ' ') + " FCFA")
-            df_display['impaye'] = df_display['impaye'].apply(lambda x: f"{x:,.0f}".replace(',', ' ') + " FCFA")
-            df_display['Total'] = df_display['Total'].apply(lambda x: f"{x:,.0f}".replace(',', ' ') + " FCFA")
+            for colonne in ['paye', 'impaye', 'Total']:
+                df_display[colonne] = format_montants(df_display[colonne])
             df_display = df_display[['mois_nom', 'paye', 'impaye', 'Total']]
             df_display.columns = ['Mois', 'Payées', 'Impayées', 'Total']
             st.dataframe(df_display, hide_index=True, use_container_width=True)
@@ -3,11 +3,12 @@ Page Dashboard - Vue d'ensemble et indicateurs clés
 """
 
 import streamlit as st
-import sqlite3
 import pandas as pd
 from datetime import datetime, timedelta
-from database import DB_NAME, init_database
-from constants import PRIX_TERRAIN, COTISATION_PAR_TERRAIN, MOIS_NOMS
+from database import init_database, get_connection
+from paiements import get_soldes_totaux
+from constants import PRIX_TERRAIN, COTISATION_PAR_TERRAIN
+from formatage import format_fcfa, libelles_periodes
 from auth import require_authentication, show_logout_button
 import plotly.graph_objects as go
 import plotly.express as px
@@ -35,40 +36,35 @@ show_logout_button()
 @st.cache_data(ttl=60)  # Cache de 60 secondes
 def get_kpi_data():
     """Récupère les indicateurs clés de performance"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     
     # Total participants
     total_participants = pd.read_sql_query(
-        "SELECT COUNT(*) as count FROM participants", 
+        "SELECT COUNT(*) as count FROM participants WHERE supprime = 0", 
         conn
     ).iloc[0]['count']
     
     # Total terrains
     total_terrains = pd.read_sql_query(
-        "SELECT SUM(nombre_terrains) as count FROM participants", 
+        "SELECT SUM(nombre_terrains) as count FROM participants WHERE supprime = 0", 
         conn
     ).iloc[0]['count'] or 0
     
-    # Cotisations
-    cotisations_df = pd.read_sql_query("""
-        SELECT 
-            montant,
-            paye,
-            annee,
-            mois,
-            date_paiement
-        FROM cotisations
-    """, conn)
+    # Montants : soldes des participants (une ligne par participant)
+    soldes = get_soldes_totaux(conn)
+    
+    # Nombre de cotisations
+    nb_cotisations_total, nb_cotisations_payees = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(c.paye), 0) FROM cotisations c "
+        "JOIN participants p ON p.id = c.participant_id WHERE p.supprime = 0"
+    ).fetchone()
     
     conn.close()
     
     # Calculs
-    total_attendu = cotisations_df['montant'].sum()
-    total_encaisse = cotisations_df[cotisations_df['paye'] == 1]['montant'].sum()
-    reste_a_payer = total_attendu - total_encaisse
-    
-    nb_cotisations_total = len(cotisations_df)
-    nb_cotisations_payees = len(cotisations_df[cotisations_df['paye'] == 1])
+    total_attendu = soldes['total_du']
+    total_encaisse = soldes['total_paye']
+    reste_a_payer = soldes['reste']
     nb_cotisations_impayees = nb_cotisations_total - nb_cotisations_payees
     
     taux_recouvrement = (total_encaisse / total_attendu * 100) if total_attendu > 0 else 0
@@ -82,24 +78,25 @@ def get_kpi_data():
         'taux_recouvrement': taux_recouvrement,
         'nb_cotisations_total': nb_cotisations_total,
         'nb_cotisations_payees': nb_cotisations_payees,
-        'nb_cotisations_impayees': nb_cotisations_impayees,
-        'cotisations_df': cotisations_df
+        'nb_cotisations_impayees': nb_cotisations_impayees
     }
 
 @st.cache_data(ttl=60)
 def get_evolution_paiements():
     """Récupère l'évolution des paiements par mois"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     
     df = pd.read_sql_query("""
         SELECT 
-            annee,
-            mois,
-            SUM(montant) as montant_total,
-            SUM(CASE WHEN paye = 1 THEN montant ELSE 0 END) as montant_paye
-        FROM cotisations
-        GROUP BY annee, mois
-        ORDER BY annee, mois
+            c.annee,
+            c.mois,
+            SUM(c.montant) as montant_total,
+            SUM(CASE WHEN c.paye = 1 THEN c.montant ELSE 0 END) as montant_paye
+        FROM cotisations c
+        JOIN participants p ON p.id = c.participant_id
+        WHERE p.supprime = 0
+        GROUP BY c.annee, c.mois
+        ORDER BY c.annee, c.mois
     """, conn)
     
     conn.close()
@@ -138,7 +135,7 @@ with col1:
 with col2:
     st.metric(
         "💰 Total attendu", 
-        f"{data['total_attendu']:,.0f}".replace(',', ' ') + " FCFA",
+        format_fcfa(data['total_attendu']),
         help="Montant total de toutes les cotisations"
     )
     st.metric(
@@ -150,7 +147,7 @@ with col2:
 with col3:
     st.metric(
         "✅ Total encaissé", 
-        f"{data['total_encaisse']:,.0f}".replace(',', ' ') + " FCFA",
+        format_fcfa(data['total_encaisse']),
         delta=f"{data['taux_recouvrement']:.1f}%",
         delta_color="normal",
         help="Montant total des cotisations payées"
@@ -165,7 +162,7 @@ with col3:
 with col4:
     st.metric(
         "⏳ Reste à payer", 
-        f"{data['reste_a_payer']:,.0f}".replace(',', ' ') + " FCFA",
+        format_fcfa(data['reste_a_payer']),
         delta=f"-{100-data['taux_recouvrement']:.1f}%",
         delta_color="inverse",
         help="Montant restant à encaisser"
@@ -219,7 +216,7 @@ with col_right:
         x=['Montants'],
         y=[data['total_encaisse']],
         marker_color='#28a745',
-        text=[f"{data['total_encaisse']:,.0f}".replace(',', ' ') + " FCFA"],
+        text=[format_fcfa(data['total_encaisse'])],
         textposition='inside'
     ))
     
@@ -228,7 +225,7 @@ with col_right:
         x=['Montants'],
         y=[data['reste_a_payer']],
         marker_color='#dc3545',
-        text=[f"{data['reste_a_payer']:,.0f}".replace(',', ' ') + " FCFA"],
+        text=[format_fcfa(data['reste_a_payer'])],
         textposition='inside'
     ))
     
@@ -255,10 +252,7 @@ evolution_df = get_evolution_paiements()
 
 if not evolution_df.empty:
     # Créer une colonne période pour l'affichage
-    evolution_df['periode'] = evolution_df.apply(
-        lambda row: f"{MOIS_NOMS[int(row['mois'])-1][:3]} {int(row['annee'])}", 
-        axis=1
-    )
+    evolution_df['periode'] = libelles_periodes(evolution_df['mois'], evolution_df['annee'])
     
     fig_evolution = go.Figure()
     
@@ -5,11 +5,16 @@ Page Gestion des participants
 import streamlit as st
 import sqlite3
 import pandas as pd
-from database import DB_NAME, init_database
+from database import init_database, get_data_version, get_connection
 from constants import PRIX_TERRAIN
+from formatage import format_montants
 from auth import require_authentication, show_logout_button
 from generate_report_pdf import generer_rapport_participant
-from historique import ajouter_historique
+from historique import ajouter_historique, ajouter_historique_batch
+from pagination import choisir_taille_page, choisir_page, reinitialiser_page
+from recherche import compter_participants, rechercher_participants
+from terrains import reconcilier_terrains, message_reconciliation
+from purge import lancer_purge
 
 # Configuration de la page
 st.set_page_config(
@@ -31,38 +36,59 @@ show_logout_button()
 # REQUÊTES PARTICIPANTS
 # ============================================================================
 
-def get_all_participants():
-    """Récupère tous les participants"""
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT * FROM participants ORDER BY nom, prenom", conn)
-    conn.close()
-    return df
+# Synthèse financière de tous les participants : le total payé est lu dans les
+# soldes (journal des paiements), les nombres de mensualités en une requête groupée
+JOINTURE_SYNTHESE = """
+    LEFT JOIN (
+        SELECT participant_id,
+               SUM(CASE WHEN paye = 1 THEN 1 ELSE 0 END) AS nb_mensualites,
+               SUM(CASE WHEN paye = 0 THEN 1 ELSE 0 END) AS nb_impayees
+        FROM cotisations
+        GROUP BY participant_id
+    ) s ON s.participant_id = p.id
+    LEFT JOIN soldes_participants sp ON sp.participant_id = p.id
+"""
 
-def get_participant_stats(participant_id):
-    """Récupère les statistiques d'un participant"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # Somme totale des cotisations payées
-    cursor.execute("""
-        SELECT SUM(montant), COUNT(*) 
-        FROM cotisations 
-        WHERE participant_id = ? AND paye = 1
-    """, (participant_id,))
-    result = cursor.fetchone()
-    total_paye = result[0] or 0
-    nb_mensualites = result[1] or 0
-    
-    conn.close()
-    return {
-        'total_paye': total_paye,
-        'nb_mensualites': nb_mensualites
-    }
+COLONNES_SYNTHESE = f"""
+    p.*,
+    COALESCE(sp.total_paye, 0) AS total_paye,
+    COALESCE(s.nb_mensualites, 0) AS nb_mensualites,
+    COALESCE(s.nb_impayees, 0) AS nb_impayees,
+    p.nombre_terrains * {PRIX_TERRAIN} AS cout_total,
+    p.nombre_terrains * {PRIX_TERRAIN} - COALESCE(sp.total_paye, 0) AS reste_a_payer,
+    CASE WHEN p.nombre_terrains > 0
+         THEN COALESCE(sp.total_paye, 0) * 100.0 / (p.nombre_terrains * {PRIX_TERRAIN})
+         ELSE 0 END AS progression
+"""
+
+# Ordres de tri proposés pour la liste
+TRIS_PARTICIPANTS = {
+    "Nom": "p.nom, p.prenom",
+    "Reste à payer (plus élevé d'abord)": "reste_a_payer DESC, p.nom, p.prenom",
+    "Reste à payer (plus faible d'abord)": "reste_a_payer ASC, p.nom, p.prenom",
+    "Progression (plus faible d'abord)": "progression ASC, p.nom, p.prenom",
+    "Progression (plus élevée d'abord)": "progression DESC, p.nom, p.prenom",
+    "Cotisations impayées (plus nombreuses d'abord)": "nb_impayees DESC, p.nom, p.prenom",
+}
+
+def get_participants_synthese(search_term="", tri="Nom", limit=25, offset=0):
+    """Récupère une page de participants avec leur synthèse financière"""
+    return rechercher_participants(
+        search_term, limit=limit, offset=offset,
+        colonnes=COLONNES_SYNTHESE, jointures=JOINTURE_SYNTHESE,
+        tri=TRIS_PARTICIPANTS[tri]
+    )
+
+@st.cache_data(max_entries=50, show_spinner="Génération du rapport PDF...")
+def get_rapport_pdf(participant_id, data_version):
+    """Génère le rapport PDF d'un participant, mis en cache par version des données"""
+    pdf_buffer = generer_rapport_participant(participant_id)
+    return pdf_buffer.getvalue() if pdf_buffer else None
 
 def add_participant(nom, prenom, nombre_terrains=0, telephone="", email=""):
     """Ajoute un nouveau participant"""
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_connection()
         cursor = conn.cursor()
         cursor.execute(
             "INSERT INTO participants (nom, prenom, nombre_terrains, telephone, email) VALUES (?, ?, ?, ?, ?)",
@@ -91,7 +117,7 @@ def add_participant(nom, prenom, nombre_terrains=0, telephone="", email=""):
 def update_participant(participant_id, nom, prenom, nombre_terrains, telephone="", email=""):
     """Met à jour les informations d'un participant"""
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Récupérer les anciennes valeurs
@@ -102,39 +128,48 @@ def update_participant(participant_id, nom, prenom, nombre_terrains, telephone="
             "UPDATE participants SET nom = ?, prenom = ?, nombre_terrains = ?, telephone = ?, email = ? WHERE id = ?",
             (nom, prenom, nombre_terrains, telephone, email, participant_id)
         )
+        
+        # Aligner les cotisations par terrain dans la même transaction
+        reconciliation = reconcilier_terrains(cursor, participant_id, old_values[2], nombre_terrains)
+        
         conn.commit()
         conn.close()
         
         # Enregistrer dans l'historique
+        details_terrains = message_reconciliation(reconciliation)
         ajouter_historique(
             'UPDATE',
             'participants',
             participant_id,
-            f"Modification du participant {nom} {prenom}",
+            f"Modification du participant {nom} {prenom}" + (f" ({details_terrains})" if details_terrains else ""),
             {'nom': old_values[0], 'prenom': old_values[1], 'nombre_terrains': old_values[2], 
              'telephone': old_values[3], 'email': old_values[4]},
             {'nom': nom, 'prenom': prenom, 'nombre_terrains': nombre_terrains, 
              'telephone': telephone, 'email': email}
         )
         
-        return True, "Participant mis à jour avec succès"
+        message = "Participant mis à jour avec succès"
+        if details_terrains:
+            message += f" : {details_terrains}"
+        return True, message
     except Exception as e:
         return False, f"Erreur: {str(e)}"
 
 def delete_participant(participant_id):
     """Supprime un participant et ses cotisations"""
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Récupérer les infos avant suppression
         cursor.execute("SELECT nom, prenom, nombre_terrains FROM participants WHERE id = ?", (participant_id,))
         participant_info = cursor.fetchone()
         
-        cursor.execute("DELETE FROM cotisations WHERE participant_id = ?", (participant_id,))
-        cursor.execute("DELETE FROM participants WHERE id = ?", (participant_id,))
+        # Suppression logique immédiate ; les cotisations sont purgées en arrière-plan
+        cursor.execute("UPDATE participants SET supprime = 1 WHERE id = ?", (participant_id,))
         conn.commit()
         conn.close()
+        lancer_purge()
         
         # Enregistrer dans l'historique
         if participant_info:
@@ -152,6 +187,125 @@ def delete_participant(participant_id):
         return False, f"Erreur: {str(e)}"
 
 
+# ============================================================================
+# ÉDITION EN MASSE
+# ============================================================================
+
+COLONNES_EDITABLES = ['nom', 'prenom', 'nombre_terrains', 'telephone', 'email']
+
+def _normaliser(df):
+    """Normalise les colonnes éditables pour comparer deux versions du tableau"""
+    df = df[COLONNES_EDITABLES].copy()
+    for col in ['nom', 'prenom', 'telephone', 'email']:
+        df[col] = df[col].fillna('').astype(str).str.strip()
+    df['nombre_terrains'] = pd.to_numeric(df['nombre_terrains'], errors='coerce').fillna(0).astype(int)
+    return df
+
+def calculer_diff_participants(original, modifie):
+    """
+    Calcule les différences entre le tableau d'origine et le tableau édité
+    
+    Returns:
+        Tuple (ajouts, modifications, suppressions) :
+        - ajouts : DataFrame des nouvelles lignes
+        - modifications : liste de (id, anciennes valeurs, nouvelles valeurs)
+        - suppressions : liste de (id, anciennes valeurs)
+    """
+    avant = _normaliser(original.set_index('id'))
+    
+    ajouts = _normaliser(modifie[modifie['id'].isna()])
+    ajouts = ajouts[(ajouts['nom'] != '') | (ajouts['prenom'] != '')]  # Ignorer les lignes vides
+    
+    existants = modifie.dropna(subset=['id']).astype({'id': int}).set_index('id')
+    apres = _normaliser(existants)
+    
+    ids_communs = avant.index.intersection(apres.index)
+    differents = (avant.loc[ids_communs] != apres.loc[ids_communs]).any(axis=1)
+    ids_modifies = ids_communs[differents.to_numpy()]
+    modifications = [(int(pid), avant.loc[pid].to_dict(), apres.loc[pid].to_dict()) for pid in ids_modifies]
+    
+    ids_supprimes = avant.index.difference(apres.index)
+    suppressions = [(int(pid), avant.loc[pid].to_dict()) for pid in ids_supprimes]
+    
+    return ajouts, modifications, suppressions
+
+def editions_en_attente(cle_editeur):
+    """Indique si l'éditeur du tableur contient des modifications non enregistrées"""
+    etat = st.session_state.get(cle_editeur) or {}
+    return any(etat.get(champ) for champ in ("edited_rows", "added_rows", "deleted_rows"))
+
+def appliquer_modifications_participants(ajouts, modifications, suppressions):
+    """Applique toutes les modifications du tableur en une seule transaction"""
+    # Validation avant toute écriture
+    lignes = [row for _, row in ajouts.iterrows()] + [nouveau for _, _, nouveau in modifications]
+    for row in lignes:
+        if not row['nom'] or not row['prenom']:
+            return False, "Le nom et le prénom sont obligatoires sur chaque ligne"
+        if row['nombre_terrains'] < 0:
+            return False, f"Nombre de terrains invalide pour {row['nom']} {row['prenom']}"
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        historique = []
+        
+        for _, row in ajouts.iterrows():
+            valeurs = {col: row[col] for col in COLONNES_EDITABLES}
+            valeurs['nombre_terrains'] = int(valeurs['nombre_terrains'])
+            cursor.execute(
+                "INSERT INTO participants (nom, prenom, nombre_terrains, telephone, email) VALUES (?, ?, ?, ?, ?)",
+                tuple(valeurs.values())
+            )
+            historique.append({
+                'type_action': 'CREATE', 'table_concernee': 'participants',
+                'id_enregistrement': cursor.lastrowid,
+                'details': f"Création du participant {valeurs['nom']} {valeurs['prenom']} (édition en masse)",
+                'nouvelle_valeur': valeurs
+            })
+        
+        cursor.executemany(
+            "UPDATE participants SET nom = ?, prenom = ?, nombre_terrains = ?, telephone = ?, email = ? WHERE id = ?",
+            [(n['nom'], n['prenom'], int(n['nombre_terrains']), n['telephone'], n['email'], pid)
+             for pid, _, n in modifications]
+        )
+        reconciliations = {
+            pid: reconcilier_terrains(cursor, pid, a['nombre_terrains'], n['nombre_terrains'])
+            for pid, a, n in modifications
+            if a['nombre_terrains'] != n['nombre_terrains']
+        }
+        historique.extend({
+            'type_action': 'UPDATE', 'table_concernee': 'participants', 'id_enregistrement': pid,
+            'details': f"Modification du participant {n['nom']} {n['prenom']} (édition en masse)"
+                       + (f" ({message_reconciliation(reconciliations[pid])})"
+                          if pid in reconciliations and message_reconciliation(reconciliations[pid]) else ""),
+            'ancienne_valeur': {k: (int(v) if k == 'nombre_terrains' else v) for k, v in a.items()},
+            'nouvelle_valeur': {k: (int(v) if k == 'nombre_terrains' else v) for k, v in n.items()}
+        } for pid, a, n in modifications)
+        
+        cursor.executemany("UPDATE participants SET supprime = 1 WHERE id = ?",
+                           [(pid,) for pid, _ in suppressions])
+        historique.extend({
+            'type_action': 'DELETE', 'table_concernee': 'participants', 'id_enregistrement': pid,
+            'details': f"Suppression du participant {a['nom']} {a['prenom']} (édition en masse)",
+            'ancienne_valeur': {'nom': a['nom'], 'prenom': a['prenom'], 'nombre_terrains': int(a['nombre_terrains'])}
+        } for pid, a in suppressions)
+        
+        ajouter_historique_batch(historique, conn)
+        conn.commit()
+        if suppressions:
+            lancer_purge()
+        return True, (f"{len(ajouts)} ajout(s), {len(modifications)} modification(s), "
+                      f"{len(suppressions)} suppression(s) enregistré(s)")
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        return False, "Un participant avec ce nom et ce prénom existe déjà : aucune modification enregistrée"
+    except Exception as e:
+        conn.rollback()
+        return False, f"Erreur: {str(e)}"
+    finally:
+        conn.close()
+
+
 # ============================================================================
 # PAGE PARTICIPANTS
 # ============================================================================
@@ -165,6 +319,10 @@ if 'delete_participant_id' not in st.session_state:
     st.session_state.delete_participant_id = None
 if 'view_details_participant_id' not in st.session_state:
     st.session_state.view_details_participant_id = None
+if 'pdf_participant_id' not in st.session_state:
+    st.session_state.pdf_participant_id = None
+if 'version_editeur' not in st.session_state:
+    st.session_state.version_editeur = 0
 
 # Formulaire d'ajout
 with st.expander("➕ Ajouter un participant", expanded=False):
@@ -193,32 +351,95 @@ with st.expander("➕ Ajouter un participant", expanded=False):
 
 # Liste des participants
 st.subheader("Liste des participants")
-participants = get_all_participants()
 
-if participants.empty:
+if compter_participants() == 0:
     st.info("Aucun participant enregistré")
 else:
-    # Barre de recherche
-    col_search, col_total = st.columns([3, 1])
+    # Barre de recherche, tri et taille de page
+    col_search, col_tri, col_taille, col_total = st.columns([3, 2, 1, 1])
     with col_search:
-        search_term = st.text_input("🔍 Rechercher un participant (nom, prénom)", 
+        search_term = st.text_input("🔍 Rechercher un participant (nom, prénom, téléphone, email)", 
                                    placeholder="Tapez pour rechercher...",
-                                   key="search_participant")
+                                   key="search_participant",
+                                   on_change=reinitialiser_page, args=("page_participants",))
+    with col_tri:
+        tri = st.selectbox("Trier par", list(TRIS_PARTICIPANTS.keys()), key="tri_participants",
+                           on_change=reinitialiser_page, args=("page_participants",))
+    with col_taille:
+        taille_page = choisir_taille_page("taille_page_participants", "page_participants")
     
-    # Filtrer les participants selon la recherche
-    if search_term:
-        mask = (
-            participants['nom'].str.contains(search_term, case=False, na=False) |
-            participants['prenom'].str.contains(search_term, case=False, na=False)
+    mode_tableur = st.toggle("📝 Mode tableur (édition en masse)", key="mode_tableur",
+                             help="Modifier plusieurs participants puis tout enregistrer en une seule fois")
+    
+    if mode_tableur:
+        st.caption("Modifiez les cellules, ajoutez des lignes en bas du tableau ou supprimez-en, "
+                   "puis enregistrez : toutes les modifications sont appliquées en une seule transaction.")
+        # Une page à la fois : le changement de page est bloqué tant que des
+        # modifications sont en attente, l'éditeur ne gardant que celles de la page affichée
+        cle_editeur = f"editeur_participants_{st.session_state.version_editeur}"
+        offset = choisir_page(compter_participants(search_term), taille_page, "page_participants",
+                              disabled=editions_en_attente(cle_editeur))
+        original = rechercher_participants(
+            search_term, limit=taille_page, offset=offset,
+            colonnes="p.id, p.nom, p.prenom, p.nombre_terrains, p.telephone, p.email"
+        )
+        modifie = st.data_editor(
+            original,
+            key=cle_editeur,
+            num_rows="dynamic",
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "id": st.column_config.NumberColumn("ID", disabled=True),
+                "nom": st.column_config.TextColumn("Nom *", required=True),
+                "prenom": st.column_config.TextColumn("Prénom *", required=True),
+                "nombre_terrains": st.column_config.NumberColumn("Terrains", min_value=0, step=1, default=0),
+                "telephone": st.column_config.TextColumn("Téléphone"),
+                "email": st.column_config.TextColumn("Email"),
+            }
         )
-        participants = participants[mask]
+        
+        ajouts, modifications, suppressions = calculer_diff_participants(original, modifie)
+        nb_changements = len(ajouts) + len(modifications) + len(suppressions)
+        st.write(f"**{len(ajouts)} ajout(s), {len(modifications)} modification(s), "
+                 f"{len(suppressions)} suppression(s) en attente**")
+        if suppressions:
+            noms = ", ".join(f"{a['nom']} {a['prenom']}" for _, a in suppressions)
+            st.warning(f"⚠️ Seront supprimés avec toutes leurs cotisations : {noms}")
+        
+        col_save, col_reset = st.columns(2)
+        with col_save:
+            if st.button("💾 Enregistrer les modifications", type="primary",
+                         disabled=nb_changements == 0, use_container_width=True):
+                success, msg = appliquer_modifications_participants(ajouts, modifications, suppressions)
+                if success:
+                    st.success(msg)
+                    st.session_state.version_editeur += 1
+                    st.rerun()
+                else:
+                    st.error(msg)
+        with col_reset:
+            if st.button("↩️ Annuler les modifications", disabled=nb_changements == 0, use_container_width=True):
+                st.session_state.version_editeur += 1
+                st.rerun()
+        st.stop()
+    
+    # La recherche et la pagination sont faites en SQL : seule la page visible est chargée
+    nb_resultats = compter_participants(search_term)
     
     with col_total:
-        st.write(f"**{len(participants)} participant(s)**")
+        st.write(f"**{nb_resultats} participant(s)**")
     
-    if participants.empty:
+    if nb_resultats == 0:
         st.warning("Aucun participant ne correspond à votre recherche")
     else:
+        offset = choisir_page(nb_resultats, taille_page, "page_participants")
+        participants = get_participants_synthese(search_term, tri, taille_page, offset)
+        # Montants mis en forme pour toute la page en une fois
+        participants['cout_affiche'] = format_montants(participants['cout_total'])
+        participants['paye_affiche'] = format_montants(participants['total_paye'])
+        participants['reste_affiche'] = format_montants(participants['reste_a_payer'])
+        
         # Affichage avec possibilité de modification et suppression
         for idx, row in participants.iterrows():
             # Mode édition pour ce participant
@@ -278,6 +499,9 @@ else:
                             st.write(f"✉️ {row['email']}")
                     with col4:
                         st.write(f"🏠 {nb_terrains} terrain(s)")
+                        if nb_terrains > 0:
+                            st.progress(min(row['progression'] / 100, 1.0),
+                                        text=f"Reste : {row['reste_affiche']}")
                     with col5:
                         if nb_terrains > 0:
                             if st.button("💰", key=f"view_part_{row['id']}", help="Voir détails financiers"):
@@ -288,17 +512,23 @@ else:
                                 st.rerun()
                     with col6 if nb_terrains > 0 else col5:
                         if nb_terrains > 0:
-                            # Bouton pour télécharger le rapport PDF
-                            pdf_buffer = generer_rapport_participant(row['id'])
-                            if pdf_buffer:
-                                st.download_button(
-                                    label="📄",
-                                    data=pdf_buffer,
-                                    file_name=f"rapport_{row['nom']}_{row['prenom']}.pdf",
-                                    mime="application/pdf",
-                                    key=f"pdf_{row['id']}",
-                                    help="Télécharger le rapport PDF"
-                                )
+                            # Le rapport PDF n'est généré qu'à la demande
+                            if st.session_state.pdf_participant_id == row['id']:
+                                pdf_bytes = get_rapport_pdf(row['id'], get_data_version())
+                                if pdf_bytes:
+                                    st.download_button(
+                                        label="📥",
+                                        data=pdf_bytes,
+                                        file_name=f"rapport_{row['nom']}_{row['prenom']}.pdf",
+                                        mime="application/pdf",
+                                        key=f"pdf_{row['id']}",
+                                        help="Télécharger le rapport PDF"
+                                    )
+                                else:
+                                    st.error("❌")
+                            elif st.button("📄", key=f"gen_pdf_{row['id']}", help="Générer le rapport PDF"):
+                                st.session_state.pdf_participant_id = row['id']
+                                st.rerun()
                     with col7 if nb_terrains > 0 else col5:
                         if st.button("✏️", key=f"edit_part_{row['id']}", help="Modifier"):
                             st.session_state.edit_participant_id = row['id']
@@ -331,26 +561,21 @@ else:
                     # Afficher les détails financiers si le bouton a été cliqué
                     if nb_terrains > 0 and st.session_state.view_details_participant_id == row['id']:
                         st.info(f"💰 **Détails financiers de {row['nom']} {row['prenom']}**")
-                        stats = get_participant_stats(row['id'])
-                        cout_total = nb_terrains * PRIX_TERRAIN
-                        reste_a_payer = cout_total - stats['total_paye']
+                        cout_total = row['cout_total']
                         
                         col_a, col_b, col_c, col_d = st.columns(4)
                         with col_a:
-                            st.metric("Coût total", 
-                                     f"{cout_total:,.0f}".replace(',', ' ') + " FCFA")
+                            st.metric("Coût total", row['cout_affiche'])
                         with col_b:
-                            st.metric("Total payé", 
-                                     f"{stats['total_paye']:,.0f}".replace(',', ' ') + " FCFA")
+                            st.metric("Total payé", row['paye_affiche'])
                         with col_c:
-                            st.metric("Reste à payer", 
-                                     f"{reste_a_payer:,.0f}".replace(',', ' ') + " FCFA")
+                            st.metric("Reste à payer", row['reste_affiche'])
                         with col_d:
-                            st.metric("Mensualités payées", stats['nb_mensualites'])
+                            st.metric("Mensualités payées", row['nb_mensualites'])
                         
                         # Barre de progression
                         if cout_total > 0:
-                            progression = (stats['total_paye'] / cout_total) * 100
+                            progression = row['progression']
                             st.progress(min(progression / 100, 1.0))
                             st.caption(f"Progression: {progression:.1f}%")
                     
@@ -3,14 +3,17 @@ Page Cotisations
 """
 
 import streamlit as st
-import sqlite3
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from database import DB_NAME
-from constants import MOIS_NOMS, COTISATION_MIN, COTISATION_PAR_TERRAIN
+from database import get_connection, get_data_version
+from constants import MOIS_NOMS, MOIS_RETARD_ALERTE
 from auth import require_authentication, show_logout_button
-from generate_report_pdf import generer_rapport_participant
-from historique import ajouter_historique
+from historique import ajouter_historique_batch
+from pagination import choisir_taille_page, choisir_page, reinitialiser_page
+from recherche import compter_participants, rechercher_participants
+from ecritures import soumettre
+from masques import get_masques, mois_impayes, annee_soldee, serie_en_cours, par_participant, mois_de_reference, nb_mois
 
 # Vérifier l'authentification
 require_authentication()
@@ -22,198 +25,272 @@ show_logout_button()
 # REQUÊTES COTISATIONS
 # ============================================================================
 
-def get_all_participants():
-    """Récupère tous les participants"""
-    conn = sqlite3.connect(DB_NAME)
-    query = "SELECT id, nom, prenom, nombre_terrains FROM participants ORDER BY nom, prenom"
-    df = pd.read_sql_query(query, conn)
+def get_available_years():
+    """Récupère la liste des années disponibles dans les cotisations"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT annee FROM cotisations ORDER BY annee DESC")
+    years = [row[0] for row in cursor.fetchall()]
     conn.close()
-    return df
-
-def get_all_cotisations():
-    """Récupère toutes les cotisations avec les informations des participants"""
-    conn = sqlite3.connect(DB_NAME)
-    query = """
-        SELECT 
-            c.id, 
-            c.participant_id,
-            p.nom || ' ' || p.prenom as participant,
-            p.nom,
-            p.prenom,
-            p.nombre_terrains,
-            c.mois,
-            c.annee,
-            c.montant,
-            c.paye,
-            c.date_paiement,
-            c.numero_terrain
-        FROM cotisations c
-        JOIN participants p ON c.participant_id = p.id
-        ORDER BY c.annee DESC, c.mois DESC, p.nom, p.prenom, c.numero_terrain
+    return years
+
+# Participants ayant au moins une cotisation pour l'année donnée
+FILTRE_ANNEE = "EXISTS (SELECT 1 FROM cotisations c WHERE c.participant_id = p.id AND c.annee = ?)"
+
+def count_participants_annee(annee, search=""):
+    """Compte les participants ayant des cotisations pour l'année"""
+    return compter_participants(search, [FILTRE_ANNEE], [int(annee)])
+
+def get_participants_annee(annee, search="", limit=25, offset=0):
+    """Récupère une page de participants ayant des cotisations pour l'année"""
+    return rechercher_participants(
+        search, [FILTRE_ANNEE], [int(annee)], limit=limit, offset=offset,
+        colonnes="p.id, p.nom || ' ' || p.prenom as participant, p.nombre_terrains"
+    )
+
+
+# ============================================================================
+# TABLEAU ANNUEL (PARTICIPANTS/TERRAINS x MOIS)
+# ============================================================================
+
+COLONNES_TOTAUX = ['Payées', 'Payé (FCFA)', 'Reste (FCFA)']
+
+# Numéro de terrain utilisé pour les cotisations de l'ancien format (sans terrain)
+TERRAIN_ANCIEN_FORMAT = 0
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def get_index_annee(annee, data_version):
     """
-    df = pd.read_sql_query(query, conn)
+    Construit l'index des cotisations de l'année (une fois par version des données)
+    
+    Chaque couple (participant, terrain) ayant des cotisations occupe une ligne de
+    tableaux denses de 12 colonnes (une par mois). Les lignes d'un même participant
+    sont contiguës : l'affichage d'une page se fait par simple indexation.
+    
+    Args:
+        annee: Année des cotisations
+        data_version: Version des données (clé d'invalidation du cache)
+    
+    Returns:
+        Dictionnaire :
+        - participant_ids, terrains : tableaux (lignes,) des clés de chaque ligne
+        - ids, paye, montants : tableaux (lignes, 12), ids à NaN si pas de cotisation
+        - lignes : {participant_id: (début, fin)} des lignes de chaque participant
+    """
+    conn = get_connection()
+    cotis = pd.read_sql_query(
+        "SELECT id, participant_id, mois, montant, paye, numero_terrain FROM cotisations WHERE annee = ?",
+        conn, params=(int(annee),)
+    )
     conn.close()
-    return df
+    
+    cotis['terrain'] = cotis['numero_terrain'].fillna(TERRAIN_ANCIEN_FORMAT).astype(int)
+    cotis = cotis.drop_duplicates(['participant_id', 'terrain', 'mois'])
+    # L'ancien format est affiché après les terrains numérotés
+    ordre_terrain = cotis['terrain'].where(cotis['terrain'] != TERRAIN_ANCIEN_FORMAT, np.iinfo(np.int32).max)
+    cotis = cotis.assign(ordre_terrain=ordre_terrain).sort_values(['participant_id', 'ordre_terrain'])
+    
+    codes, cles = pd.factorize(pd.MultiIndex.from_frame(cotis[['participant_id', 'terrain']]))
+    # Types explicites : une année sans cotisation donne des colonnes vides de type objet,
+    # inutilisables comme indices
+    nb_lignes, colonnes = len(cles), cotis['mois'].to_numpy(dtype=np.int64) - 1
+    
+    ids = np.full((nb_lignes, 12), np.nan)
+    paye = np.zeros((nb_lignes, 12), dtype=bool)
+    montants = np.zeros((nb_lignes, 12))
+    ids[codes, colonnes] = cotis['id'].to_numpy(dtype=float)
+    paye[codes, colonnes] = cotis['paye'].to_numpy(dtype=np.int64) == 1
+    montants[codes, colonnes] = cotis['montant'].to_numpy(dtype=float)
+    
+    participant_ids = cles.get_level_values(0).to_numpy()
+    uniques, debuts = np.unique(participant_ids, return_index=True)
+    fins = np.append(debuts[1:], nb_lignes)
+    
+    return {
+        'participant_ids': participant_ids,
+        'terrains': cles.get_level_values(1).to_numpy(),
+        'ids': ids,
+        'paye': paye,
+        'montants': montants,
+        'lignes': {int(pid): (int(d), int(f)) for pid, d, f in zip(uniques, debuts, fins)},
+    }
+
+def construire_grille(participants, index):
+    """
+    Construit le tableau croisé des participants affichés : une ligne par
+    participant et par terrain ayant des cotisations, une colonne par mois
+    
+    Args:
+        participants: DataFrame des participants de la page (id, participant)
+        index: Index de l'année (voir get_index_annee)
+    
+    Returns:
+        Tuple (grille, ids, montants) :
+        - grille : DataFrame affiché (payé / non payé par mois, vide si pas de cotisation)
+        - ids : DataFrame des IDs de cotisation, aligné sur la grille
+        - montants : DataFrame des montants, aligné sur la grille
+    """
+    plages = [index['lignes'][pid] for pid in participants['id'].astype(int) if pid in index['lignes']]
+    lignes = np.concatenate([np.arange(debut, fin) for debut, fin in plages]) if plages else np.array([], dtype=int)
+    
+    ids = index['ids'][lignes]
+    terrains = index['terrains'][lignes]
+    
+    noms = participants.set_index(participants['id'].astype(int))['participant']
+    grille = pd.DataFrame({
+        'Participant': noms.loc[index['participant_ids'][lignes]].to_numpy(),
+        'Terrain': np.where(terrains == TERRAIN_ANCIEN_FORMAT, "Ancien format",
+                            pd.Series(terrains, dtype=object).map("n°{}".format).to_numpy()),
+    })
+    mois = pd.DataFrame(index['paye'][lignes], columns=MOIS_NOMS).astype(object).where(~np.isnan(ids), None)
+    grille = pd.concat([grille, mois], axis=1)
+    
+    return grille, pd.DataFrame(ids, columns=MOIS_NOMS), pd.DataFrame(index['montants'][lignes], columns=MOIS_NOMS)
+
+def calculer_totaux(grille, montants):
+    """
+    Met à jour les colonnes de totaux de la grille et calcule les totaux par mois
+    
+    Returns:
+        DataFrame des totaux par mois pour les participants affichés
+    """
+    existe = grille[MOIS_NOMS].notna().to_numpy()
+    payes = grille[MOIS_NOMS].fillna(False).to_numpy(dtype=bool)
+    montants = montants.to_numpy()
+    montants_payes = montants * payes
+    
+    grille['Payées'] = (pd.Series(payes.sum(axis=1)).astype(str) + "/"
+                        + pd.Series(existe.sum(axis=1)).astype(str))
+    grille['Payé (FCFA)'] = montants_payes.sum(axis=1)
+    grille['Reste (FCFA)'] = montants.sum(axis=1) - grille['Payé (FCFA)']
+    
+    return pd.DataFrame(
+        [montants.sum(axis=0), montants_payes.sum(axis=0), payes.sum(axis=0), existe.sum(axis=0)],
+        index=['Montant (FCFA)', 'Payé (FCFA)', 'Cotisations payées', 'Cotisations'],
+        columns=MOIS_NOMS
+    ).astype(int)
 
-def add_cotisation(participant_id, mois, annee, montant, paye=False, numero_terrain=None):
-    """Ajoute une nouvelle cotisation"""
+def enregistrer_statuts(changements):
+    """
+    Écrit les changements de statut du tableau annuel en une seule transaction
+    (exécuté par la file d'écriture)
+    
+    Args:
+        changements: Liste de (cotisation_id, paye)
+    
+    Returns:
+        Tuple (version avant, version après) des données, lues dans la même transaction
+    """
+    conn = get_connection()
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        date_paiement = datetime.now().strftime("%Y-%m-%d") if paye else None
-        
-        # Si numero_terrain est None (tous les terrains), on obtient le nombre de terrains
-        if numero_terrain is None:
-            cursor.execute("SELECT nombre_terrains FROM participants WHERE id = ?", (participant_id,))
-            nb_terrains = cursor.fetchone()[0]
-            
-            if nb_terrains == 0:
-                return False, "Ce participant n'a aucun terrain"
-            
-            # Montant par terrain
-            montant_par_terrain = montant / nb_terrains
-            
-            # Créer une cotisation pour chaque terrain
-            for i in range(1, nb_terrains + 1):
-                cursor.execute(
-                    "INSERT INTO cotisations (participant_id, mois, annee, montant, paye, date_paiement, numero_terrain) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                    (participant_id, mois, annee, montant_par_terrain, 1 if paye else 0, date_paiement, i)
-                )
-            message = f"Cotisation ajoutée avec succès ({nb_terrains} terrains, {montant_par_terrain:,.0f} FCFA chacun)".replace(',', ' ')
-        else:
-            # Créer une seule cotisation pour le terrain spécifique
-            cursor.execute(
-                "INSERT INTO cotisations (participant_id, mois, annee, montant, paye, date_paiement, numero_terrain) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (participant_id, mois, annee, montant, 1 if paye else 0, date_paiement, numero_terrain)
-            )
-            message = f"Cotisation ajoutée avec succès (Terrain n°{numero_terrain})"
-        
-        conn.commit()
-        
-        # Enregistrer dans l'historique
-        ajouter_historique(
-            'CREATE',
-            'cotisations',
-            participant_id,
-            f"Création cotisation(s) mois {mois}/{annee} - Montant: {montant} FCFA",
-            None,
-            {'mois': mois, 'annee': annee, 'montant': montant, 'paye': paye, 'numero_terrain': numero_terrain}
+        conn.execute("BEGIN IMMEDIATE")
+        version_avant = conn.execute("SELECT version FROM version_donnees WHERE id = 1").fetchone()[0]
+        date_paiement = datetime.now().strftime("%Y-%m-%d")
+        conn.executemany(
+            "UPDATE cotisations SET paye = ?, date_paiement = ? WHERE id = ?",
+            [(1 if paye else 0, date_paiement if paye else None, cotisation_id)
+             for cotisation_id, paye in changements]
         )
-        
-        conn.close()
-        return True, message
-    except sqlite3.IntegrityError:
-        return False, "Cette cotisation existe déjà pour ce terrain"
-    except Exception as e:
-        return False, f"Erreur: {str(e)}"
-
-def update_cotisation_status(cotisation_id, paye, montant_paye=None):
-    """Met à jour le statut de paiement d'une cotisation"""
-    try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        date_paiement = datetime.now().strftime("%Y-%m-%d") if paye else None
-        
-        # Si un montant est spécifié, on le met à jour
-        if montant_paye is not None:
-            cursor.execute(
-                "UPDATE cotisations SET paye = ?, date_paiement = ?, montant = ? WHERE id = ?",
-                (1 if paye else 0, date_paiement, montant_paye, cotisation_id)
-            )
-        else:
-            cursor.execute(
-                "UPDATE cotisations SET paye = ?, date_paiement = ? WHERE id = ?",
-                (1 if paye else 0, date_paiement, cotisation_id)
-            )
-        
+        ajouter_historique_batch([{
+            'type_action': 'UPDATE', 'table_concernee': 'cotisations', 'id_enregistrement': cotisation_id,
+            'details': f"Cotisation marquée comme {'payée' if paye else 'non payée'} (tableau annuel)",
+            'ancienne_valeur': {'paye': not paye},
+            'nouvelle_valeur': {'paye': paye}
+        } for cotisation_id, paye in changements], conn)
+        version_apres = conn.execute("SELECT version FROM version_donnees WHERE id = 1").fetchone()[0]
         conn.commit()
-        
-        # Enregistrer dans l'historique
-        statut_txt = "payée" if paye else "non payée"
-        montant_txt = f" - Montant: {montant_paye} FCFA" if montant_paye else ""
-        ajouter_historique(
-            'UPDATE',
-            'cotisations',
-            cotisation_id,
-            f"Cotisation marquée comme {statut_txt}{montant_txt}",
-            {'paye': not paye},
-            {'paye': paye, 'montant': montant_paye}
-        )
-        
+        return version_avant, version_apres
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         conn.close()
-        return True
-    except Exception as e:
-        return False
 
+# ============================================================================
+# GRILLE EN SESSION (MISES À JOUR OPTIMISTES)
+# ============================================================================
+# La grille affichée est gardée en session. Un clic modifie directement la
+# grille et ses totaux, puis l'écriture part dans la file d'écriture : la page
+# n'attend pas la base. Tant que la base ne contient que nos propres écritures
+# (versions connues), la grille n'est pas rechargée ; une écriture en échec
+# remet les cases concernées dans leur état d'origine.
+
+def charger_grille(cle, participants, annee):
+    """Construit la grille de la page depuis l'index de l'année et la garde en session"""
+    version = get_data_version()
+    grille, ids, montants = construire_grille(participants, get_index_annee(annee, version))
+    precedente = st.session_state.get('grille_cotis')
+    st.session_state.grille_cotis = {
+        'cle': cle,
+        'versions': {version},
+        # Change la clé de l'éditeur : les cases cochées à l'écran repartent de la grille
+        'generation': precedente['generation'] + 1 if precedente else 0,
+        'grille': grille,
+        'ids': ids,
+        'montants': montants,
+        'en_attente': [],
+    }
 
-def delete_cotisation(cotisation_id):
-    """Supprime une cotisation"""
-    try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        
-        # Récupérer les infos avant suppression
-        cursor.execute("SELECT participant_id, mois, annee, montant FROM cotisations WHERE id = ?", (cotisation_id,))
-        cotis_info = cursor.fetchone()
-        
-        cursor.execute("DELETE FROM cotisations WHERE id = ?", (cotisation_id,))
-        conn.commit()
-        
-        # Enregistrer dans l'historique
-        if cotis_info:
-            ajouter_historique(
-                'DELETE',
-                'cotisations',
-                cotisation_id,
-                f"Suppression cotisation {cotis_info[1]}/{cotis_info[2]} - Montant: {cotis_info[3]} FCFA",
-                {'participant_id': cotis_info[0], 'mois': cotis_info[1], 'annee': cotis_info[2], 'montant': cotis_info[3]},
-                None
-            )
-        
-        conn.close()
-        return True, "Cotisation supprimée avec succès"
-    except Exception as e:
-        return False, f"Erreur: {str(e)}"
+def reconcilier_ecritures(etat):
+    """
+    Prend en compte les écritures terminées
+    
+    Returns:
+        Liste des messages d'erreur des écritures en échec
+    """
+    erreurs = []
+    termines = [ecriture for ecriture in etat['en_attente'] if ecriture['future'].done()]
+    for ecriture in termines:
+        etat['en_attente'].remove(ecriture)
+        erreur = ecriture['future'].exception()
+        if erreur is None:
+            version_avant, version_apres = ecriture['future'].result()
+            # Une écriture d'un autre utilisateur intercalée laisse la version inconnue : rechargement
+            if version_avant in etat['versions']:
+                etat['versions'].add(version_apres)
+        else:
+            for ligne, mois, _, paye in ecriture['changements']:
+                etat['grille'].at[ligne, mois] = not paye
+            etat['generation'] += 1
+            erreurs.append(f"{len(ecriture['changements'])} modification(s) annulée(s) : {erreur}")
+    return erreurs
 
+def appliquer_modifications_grille(cle_editeur):
+    """Callback de l'éditeur : applique les cases modifiées à la grille et les envoie en écriture"""
+    etat = st.session_state.grille_cotis
+    grille, ids = etat['grille'], etat['ids']
+    changements, ignorees = [], 0
+    
+    for ligne, colonnes in st.session_state[cle_editeur]['edited_rows'].items():
+        ligne = int(ligne)
+        for mois, valeur in colonnes.items():
+            if mois not in MOIS_NOMS:
+                continue
+            if pd.isna(ids.at[ligne, mois]):
+                ignorees += bool(valeur)
+                continue
+            # L'éditeur conserve toutes les cases modifiées : seules celles qui diffèrent de la grille comptent
+            if grille.at[ligne, mois] != bool(valeur):
+                grille.at[ligne, mois] = bool(valeur)
+                changements.append((ligne, mois, int(ids.at[ligne, mois]), bool(valeur)))
+    
+    if ignorees:
+        etat['generation'] += 1
+        st.session_state.avertissement_grille = (
+            f"{ignorees} case(s) cochée(s) sur des mois sans cotisation ignorée(s). "
+            "Générez ou ajoutez d'abord la cotisation depuis la page Gestion des cotisations."
+        )
+    if changements:
+        future = soumettre(enregistrer_statuts, [(cid, paye) for _, _, cid, paye in changements])
+        etat['en_attente'].append({'future': future, 'changements': changements})
 
-def generer_cotisations_mensuelles(mois, annee):
-    """Génère les cotisations impayées pour tous les participants pour un mois donné (une par terrain)"""
-    try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        
-        # Récupérer tous les participants avec leur nombre de terrains
-        cursor.execute("SELECT id, nom, prenom, nombre_terrains FROM participants WHERE nombre_terrains > 0")
-        participants = cursor.fetchall()
-        
-        nb_ajoutes = 0
-        nb_existent = 0
-        
-        for participant_id, nom, prenom, nb_terrains in participants:
-            # Créer une cotisation pour chaque terrain
-            for numero_terrain in range(1, nb_terrains + 1):
-                # Vérifier si la cotisation existe déjà pour ce terrain
-                cursor.execute(
-                    "SELECT id FROM cotisations WHERE participant_id = ? AND mois = ? AND annee = ? AND numero_terrain = ?",
-                    (participant_id, mois, annee, numero_terrain)
-                )
-                
-                if cursor.fetchone() is None:
-                    # Créer la cotisation impayée pour ce terrain
-                    cursor.execute(
-                        "INSERT INTO cotisations (participant_id, mois, annee, montant, paye, numero_terrain) VALUES (?, ?, ?, ?, 0, ?)",
-                        (participant_id, mois, annee, COTISATION_PAR_TERRAIN, numero_terrain)
-                    )
-                    nb_ajoutes += 1
-                else:
-                    nb_existent += 1
-        
-        conn.commit()
-        conn.close()
-        
-        return True, f"✅ {nb_ajoutes} cotisation(s) créée(s). {nb_existent} existait(ent) déjà."
-    except Exception as e:
-        return False, f"Erreur: {str(e)}"
+@st.fragment(run_every="1s")
+def suivre_ecritures():
+    """Surveille les écritures en cours et rafraîchit la page quand elles sont terminées"""
+    en_attente = st.session_state.grille_cotis['en_attente']
+    if all(ecriture['future'].done() for ecriture in en_attente):
+        st.rerun()
+    st.caption(f"⏳ Enregistrement en cours ({len(en_attente)})...")
 
 
 # Configuration de la page
@@ -225,167 +302,97 @@ st.set_page_config(
 
 st.title("Liste des Cotisations")
 
-# Initialiser session_state pour le paiement en cours
-if 'paiement_cotisation_id' not in st.session_state:
-    st.session_state.paiement_cotisation_id = None
-if 'delete_cotisation_id' not in st.session_state:
-    st.session_state.delete_cotisation_id = None
-
 
-cotisations = get_all_cotisations()
+years = get_available_years()
 
-if cotisations.empty:
+if not years:
     st.info("Aucune cotisation enregistrée. Utilisez l'import Excel pour commencer.")
     st.stop()
     
 # Sélection de l'année et recherche
-col_year, col_search = st.columns([1, 2])
+col_year, col_search, col_taille = st.columns([1, 2, 1])
 
 with col_year:
-    years = sorted(cotisations['annee'].unique(), reverse=True)
-    selected_year = st.selectbox("Année", years, key="cotis_year")
+    selected_year = st.selectbox("Année", years, key="cotis_year",
+                                 on_change=reinitialiser_page, args=("page_cotis_year",))
 
 with col_search:
     search_cotis = st.text_input("🔍 Rechercher un participant", 
-                                placeholder="Nom du participant...",
-                                key="search_cotis_year")
+                                placeholder="Nom, prénom, téléphone...",
+                                key="search_cotis_year",
+                                on_change=reinitialiser_page, args=("page_cotis_year",))
 
-# Filtrer par année
-cotis_year = cotisations[cotisations['annee'] == selected_year]
+with col_taille:
+    taille_page = choisir_taille_page("taille_page_cotis_year", "page_cotis_year")
 
-# Filtrer par recherche si applicable
-if search_cotis:
-    mask = cotis_year['participant'].str.contains(search_cotis, case=False, na=False)
-    cotis_year = cotis_year[mask]
-    
-    if cotis_year.empty:
-        st.warning("Aucune cotisation ne correspond à votre recherche pour cette année")
-        st.stop()
+# Filtrer par année et par recherche en SQL
+nb_participants = count_participants_annee(selected_year, search_cotis)
+
+if nb_participants == 0:
+    st.warning("Aucune cotisation ne correspond à votre recherche pour cette année")
+    st.stop()
     
 st.divider()
 
 # Tableau annuel (participants x mois)
 st.subheader(f"Tableau des cotisations {selected_year}")
 
-mois_names = MOIS_NOMS
+# Indicateurs de l'année, calculés sur les masques de paiement de tous les participants
+masques = get_masques(selected_year, get_data_version())
+impayes = mois_impayes(masques)
+a_jour = par_participant(masques, annee_soldee(masques), np.logical_and)
+series = par_participant(masques, serie_en_cours(impayes, mois_de_reference(selected_year)), np.maximum)
 
-# Grouper par participant
-for participant_name in sorted(cotis_year['participant'].unique()):
-    cotis_participant = cotis_year[cotis_year['participant'] == participant_name]
-    
-    # Récupérer le nombre de terrains
-    nb_terrains = cotis_participant['nombre_terrains'].iloc[0]
-    
-    # Afficher le nom du participant
-    st.write(f"**{participant_name}** ({nb_terrains} terrain(s))")
-    
-    # Afficher par terrain
-    for terrain_num in range(1, nb_terrains + 1):
-        cotis_terrain = cotis_participant[cotis_participant['numero_terrain'] == terrain_num]
-        
-        # Si des cotisations existent pour ce terrain
-        if not cotis_terrain.empty:
-            st.write(f"  🏞️ Terrain n°{terrain_num}")
-            
-            cols = st.columns(12)
-            for mois_num in range(1, 13):
-                cotis_mois = cotis_terrain[cotis_terrain['mois'] == mois_num]
-                
-                with cols[mois_num - 1]:
-                    if not cotis_mois.empty:
-                        cotis_row = cotis_mois.iloc[0]
-                        paye = cotis_row['paye']
-                        cotis_id = cotis_row['id']
-                        montant = cotis_row['montant']
-                        
-                        # Bouton avec couleur selon statut
-                        if paye:
-                            montant_format = f"{montant:,.0f}".replace(',', ' ')
-                            button_label = f"✓\n{montant_format}"
-                            button_type = "primary"
-                        else:
-                            montant_format = f"{montant:,.0f}".replace(',', ' ')
-                            button_label = f"✗\n{montant_format}"
-                            button_type = "secondary"
-                        
-                        if st.button(button_label, key=f"cotis_{cotis_id}", 
-                                   type=button_type, use_container_width=True):
-                            # Toggle le statut
-                            update_cotisation_status(cotis_id, not paye)
-                            st.rerun()
-                    else:
-                        st.markdown(f"<p style='text-align: center; color: #888; font-size: 0.75em;'>{mois_names[mois_num - 1][:3]}</p>", unsafe_allow_html=True)
-    
-    # Ligne de total par mois pour ce participant
-    st.write(f"  💰 **Total**")
-    cols_total = st.columns(12)
-    for mois_num in range(1, 13):
-        # Calculer le total pour ce mois (tous terrains confondus)
-        cotis_mois_all = cotis_participant[cotis_participant['mois'] == mois_num]
-        
-        with cols_total[mois_num - 1]:
-            if not cotis_mois_all.empty:
-                total_montant = cotis_mois_all['montant'].sum()
-                total_paye = cotis_mois_all[cotis_mois_all['paye'] == 1]['montant'].sum()
-                nb_cotis = len(cotis_mois_all)
-                nb_payees = len(cotis_mois_all[cotis_mois_all['paye'] == 1])
-                
-                # Afficher le total avec indication du statut
-                total_format = f"{total_montant:,.0f}".replace(',', ' ')
-                if nb_payees == nb_cotis:
-                    # Tout est payé
-                    st.markdown(f"<div style='background-color: #d4edda; padding: 5px; border-radius: 5px; text-align: center;'>"
-                              f"<strong>{total_format}</strong><br/>"
-                              f"<small style='color: #155724;'>✓ {nb_cotis}/{nb_cotis}</small></div>", 
-                              unsafe_allow_html=True)
-                elif nb_payees == 0:
-                    # Rien n'est payé
-                    st.markdown(f"<div style='background-color: #f8d7da; padding: 5px; border-radius: 5px; text-align: center;'>"
-                              f"<strong>{total_format}</strong><br/>"
-                              f"<small style='color: #721c24;'>✗ 0/{nb_cotis}</small></div>", 
-                              unsafe_allow_html=True)
-                else:
-                    # Partiellement payé
-                    paye_format = f"{total_paye:,.0f}".replace(',', ' ')
-                    st.markdown(f"<div style='background-color: #fff3cd; padding: 5px; border-radius: 5px; text-align: center;'>"
-                              f"<strong>{total_format}</strong><br/>"
-                              f"<small style='color: #856404;'>⚠ {nb_payees}/{nb_cotis}<br/>{paye_format} payé</small></div>", 
-                              unsafe_allow_html=True)
-            else:
-                st.markdown(f"<p style='text-align: center; color: #888; font-size: 0.75em;'>-</p>", unsafe_allow_html=True)
-    
-    # Afficher aussi les cotisations sans numéro de terrain (anciennes)
-    cotis_sans_terrain = cotis_participant[cotis_participant['numero_terrain'].isna()]
-    if not cotis_sans_terrain.empty:
-        st.write(f"  📊 Cotisations globales (ancien format)")
-        
-        cols = st.columns(12)
-        for mois_num in range(1, 13):
-            cotis_mois = cotis_sans_terrain[cotis_sans_terrain['mois'] == mois_num]
-            
-            with cols[mois_num - 1]:
-                if not cotis_mois.empty:
-                    cotis_row = cotis_mois.iloc[0]
-                    paye = cotis_row['paye']
-                    cotis_id = cotis_row['id']
-                    montant = cotis_row['montant']
-                    
-                    # Bouton avec couleur selon statut
-                    if paye:
-                        montant_format = f"{montant:,.0f}".replace(',', ' ')
-                        button_label = f"✓\n{montant_format}"
-                        button_type = "primary"
-                    else:
-                        montant_format = f"{montant:,.0f}".replace(',', ' ')
-                        button_label = f"✗\n{montant_format}"
-                        button_type = "secondary"
-                    
-                    if st.button(button_label, key=f"cotis_{cotis_id}", 
-                               type=button_type, use_container_width=True):
-                        # Toggle le statut
-                        update_cotisation_status(cotis_id, not paye)
-                        st.rerun()
-                else:
-                    st.markdown(f"<p style='text-align: center; color: #888; font-size: 0.75em;'>{mois_names[mois_num - 1][:3]}</p>", unsafe_allow_html=True)
-    
-    st.divider()
+col_a_jour, col_retard, col_impayes = st.columns(3)
+col_a_jour.metric("✅ Participants à jour", int(a_jour.sum()))
+col_retard.metric(f"⚠️ En retard ({MOIS_RETARD_ALERTE} mois d'affilée ou plus)",
+                  int((series >= MOIS_RETARD_ALERTE).sum()))
+col_impayes.metric("📅 Mois impayés (tous terrains)", int(nb_mois(impayes).sum()))
+
+offset = choisir_page(nb_participants, taille_page, "page_cotis_year")
+
+
+# La grille de la page est gardée en session : elle n'est reconstruite que si
+# la page affichée change ou si la base a été modifiée par ailleurs
+cle_grille = (selected_year, search_cotis, taille_page, offset)
+etat = st.session_state.get('grille_cotis')
+erreurs = reconcilier_ecritures(etat) if etat else []
+if (etat is None or etat['cle'] != cle_grille
+        or (not etat['en_attente'] and get_data_version() not in etat['versions'])):
+    # Seuls les participants de la page visible sont chargés et affichés
+    participants_page = get_participants_annee(selected_year, search_cotis, taille_page, offset)
+    charger_grille(cle_grille, participants_page, selected_year)
+    etat = st.session_state.grille_cotis
+
+for erreur in erreurs:
+    st.error(f"❌ Échec de l'enregistrement, {erreur}")
+if st.session_state.get('avertissement_grille'):
+    st.warning(f"⚠️ {st.session_state.pop('avertissement_grille')}")
+
+totaux = calculer_totaux(etat['grille'], etat['montants'])
+
+st.caption("Cochez ou décochez les mois payés : chaque modification est enregistrée immédiatement. "
+           "Une case vide indique un mois sans cotisation.")
+
+cle_editeur = f"grille_cotis_{etat['generation']}"
+st.data_editor(
+    etat['grille'],
+    key=cle_editeur,
+    on_change=appliquer_modifications_grille,
+    args=(cle_editeur,),
+    hide_index=True,
+    use_container_width=True,
+    disabled=['Participant', 'Terrain'] + COLONNES_TOTAUX,
+    column_config={
+        **{nom: st.column_config.CheckboxColumn(nom, width="small") for nom in MOIS_NOMS},
+        'Payé (FCFA)': st.column_config.NumberColumn('Payé (FCFA)', format="%d"),
+        'Reste (FCFA)': st.column_config.NumberColumn('Reste (FCFA)', format="%d"),
+    }
+)
+
+if etat['en_attente']:
+    suivre_ecritures()
+
+# Totaux par mois (tous terrains confondus) des participants affichés
+st.write("💰 **Totaux par mois**")
+st.dataframe(totaux, use_container_width=True)
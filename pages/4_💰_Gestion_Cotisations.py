@@ -2,15 +2,27 @@
 Page Cotisations
 """
 
+import os
 import streamlit as st
-import sqlite3
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from database import DB_NAME
-from constants import MOIS_NOMS, COTISATION_MIN, COTISATION_PAR_TERRAIN
+from database import get_connection, get_data_version
+from constants import MOIS_NOMS, COTISATION_MIN, COTISATION_PAR_TERRAIN, MOIS_RETARD_ALERTE
 from auth import require_authentication, show_logout_button
 from generate_report_pdf import generer_rapport_participant
-from historique import ajouter_historique
+from rapports_lot import get_participants_rapports, lancer_rapports_zip
+from historique import ajouter_historique_batch
+from pagination import TAILLES_PAGE
+from allocation import apercu_allocation, allouer_paiement, libelle_cotisation, libelles_cotisations
+from formatage import format_fcfa, libelles_periodes, libelles_terrain
+from paiements import enregistrer_paiement, SOURCE_AJUSTEMENT
+from saisie import add_cotisation, ajouter_cotisations_terrains
+from recherche import compter_participants, filtre_recherche, selecteur_participant
+from generation import (generer_cotisations_mensuelles, generer_cotisations_periode,
+                        apercu_generation_periode, indice_mois, libelle_periode)
+from planificateur import get_derniere_execution
+from masques import get_masques, mois_impayes, serie_en_cours, par_participant, mois_de_reference
 
 # Vérifier l'authentification
 require_authentication()
@@ -22,198 +34,176 @@ show_logout_button()
 # REQUÊTES COTISATIONS
 # ============================================================================
 
-def get_all_participants():
-    """Récupère tous les participants"""
-    conn = sqlite3.connect(DB_NAME)
-    query = "SELECT id, nom, prenom, nombre_terrains FROM participants ORDER BY nom, prenom"
-    df = pd.read_sql_query(query, conn)
+def get_available_years():
+    """Récupère la liste des années disponibles dans les cotisations"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT annee FROM cotisations ORDER BY annee DESC")
+    years = [row[0] for row in cursor.fetchall()]
     conn.close()
-    return df
+    return years
+
+# Tris de la file des impayées : clause ORDER BY, condition de reprise (pagination
+# par clé) et colonne de tri. La reprise se fait après la dernière ligne affichée.
+TRIS_IMPAYEES = {
+    "Plus anciennes d'abord": ("c.mois ASC, c.id ASC", "(c.mois, c.id) > (?, ?)", 'mois'),
+    "Plus récentes d'abord": ("c.mois DESC, c.id DESC", "(c.mois, c.id) < (?, ?)", 'mois'),
+    "Montant décroissant": ("c.montant DESC, c.id DESC", "(c.montant, c.id) < (?, ?)", 'montant'),
+    "Montant croissant": ("c.montant ASC, c.id ASC", "(c.montant, c.id) > (?, ?)", 'montant'),
+}
+
+def _filtres_impayees(cursor, annee, search="", mois=None, participant_ids=None):
+    """Construit les conditions SQL de la file des cotisations impayées"""
+    conditions = ["p.supprime = 0", "c.annee = ?", "c.paye = 0"]
+    params = [int(annee)]
+    condition, params_recherche = filtre_recherche(search, cursor)
+    if condition:
+        conditions.append(condition)
+        params.extend(params_recherche)
+    if mois:
+        conditions.append("c.mois = ?")
+        params.append(int(mois))
+    if participant_ids is not None:
+        conditions.append(f"c.participant_id IN ({','.join('?' * len(participant_ids))})")
+        params.extend(int(pid) for pid in participant_ids)
+    return conditions, params
+
+def compter_cotisations_impayees(annee, search="", mois=None, participant_ids=None):
+    """
+    Compte les cotisations impayées correspondant aux filtres
+    
+    Returns:
+        Tuple (nombre, montant total)
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    conditions, params = _filtres_impayees(cursor, annee, search, mois, participant_ids)
+    cursor.execute(f"""
+        SELECT COUNT(*), COALESCE(SUM(c.montant), 0)
+        FROM cotisations c
+        JOIN participants p ON c.participant_id = p.id
+        WHERE {" AND ".join(conditions)}
+    """, params)
+    nombre, total = cursor.fetchone()
+    conn.close()
+    return nombre, total
 
-def get_all_cotisations():
-    """Récupère toutes les cotisations avec les informations des participants"""
-    conn = sqlite3.connect(DB_NAME)
-    query = """
+def get_page_impayees(annee, search="", mois=None, participant_ids=None,
+                      tri="Plus anciennes d'abord", apres=None, taille=25):
+    """
+    Récupère une page de la file des cotisations impayées (pagination par clé)
+    
+    Args:
+        annee: Année des cotisations
+        search: Recherche sur le participant (nom, prénom, téléphone, email)
+        mois: Mois à afficher (None = tous)
+        participant_ids: Participants à afficher (None = tous)
+        tri: Clé de TRIS_IMPAYEES
+        apres: Tuple (valeur de tri, id) de la dernière ligne de la page précédente
+        taille: Nombre de lignes de la page
+    
+    Returns:
+        DataFrame d'au plus taille + 1 lignes (la ligne en plus indique qu'il existe une page suivante)
+    """
+    conn = get_connection()
+    conditions, params = _filtres_impayees(conn.cursor(), annee, search, mois, participant_ids)
+    ordre, reprise, _ = TRIS_IMPAYEES[tri]
+    if apres is not None:
+        conditions.append(reprise)
+        params.extend(apres)
+    
+    query = f"""
         SELECT 
             c.id, 
             c.participant_id,
             p.nom || ' ' || p.prenom as participant,
-            p.nom,
-            p.prenom,
-            p.nombre_terrains,
             c.mois,
-            c.annee,
             c.montant,
-            c.paye,
-            c.date_paiement,
             c.numero_terrain
         FROM cotisations c
         JOIN participants p ON c.participant_id = p.id
-        ORDER BY c.annee DESC, c.mois DESC, p.nom, p.prenom, c.numero_terrain
+        WHERE {" AND ".join(conditions)}
+        ORDER BY {ordre}
+        LIMIT ?
     """
-    df = pd.read_sql_query(query, conn)
+    df = pd.read_sql_query(query, conn, params=params + [taille + 1])
     conn.close()
     return df
 
-def add_cotisation(participant_id, mois, annee, montant, paye=False, numero_terrain=None):
-    """Ajoute une nouvelle cotisation"""
+def marquer_cotisations_payees(paiements):
+    """
+    Marque plusieurs cotisations comme payées en une seule transaction
+    
+    Le montant dû n'est pas modifié : un montant versé différent est inscrit
+    au journal des paiements comme ajustement.
+    
+    Args:
+        paiements: Liste de (cotisation_id, montant payé)
+    """
+    conn = get_connection()
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        date_paiement = datetime.now().strftime("%Y-%m-%d") if paye else None
-        
-        # Si numero_terrain est None (tous les terrains), on obtient le nombre de terrains
-        if numero_terrain is None:
-            cursor.execute("SELECT nombre_terrains FROM participants WHERE id = ?", (participant_id,))
-            nb_terrains = cursor.fetchone()[0]
-            
-            if nb_terrains == 0:
-                return False, "Ce participant n'a aucun terrain"
-            
-            # Montant par terrain
-            montant_par_terrain = montant / nb_terrains
-            
-            # Créer une cotisation pour chaque terrain
-            for i in range(1, nb_terrains + 1):
-                cursor.execute(
-                    "INSERT INTO cotisations (participant_id, mois, annee, montant, paye, date_paiement, numero_terrain) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                    (participant_id, mois, annee, montant_par_terrain, 1 if paye else 0, date_paiement, i)
-                )
-            message = f"Cotisation ajoutée avec succès ({nb_terrains} terrains, {montant_par_terrain:,.0f} FCFA chacun)".replace(',', ' ')
-        else:
-            # Créer une seule cotisation pour le terrain spécifique
-            cursor.execute(
-                "INSERT INTO cotisations (participant_id, mois, annee, montant, paye, date_paiement, numero_terrain) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (participant_id, mois, annee, montant, 1 if paye else 0, date_paiement, numero_terrain)
-            )
-            message = f"Cotisation ajoutée avec succès (Terrain n°{numero_terrain})"
-        
-        conn.commit()
-        
-        # Enregistrer dans l'historique
-        ajouter_historique(
-            'CREATE',
-            'cotisations',
-            participant_id,
-            f"Création cotisation(s) mois {mois}/{annee} - Montant: {montant} FCFA",
-            None,
-            {'mois': mois, 'annee': annee, 'montant': montant, 'paye': paye, 'numero_terrain': numero_terrain}
+        conn.execute("BEGIN IMMEDIATE")
+        verses = dict(paiements)
+        placeholders = ','.join('?' * len(verses))
+        dus = conn.execute(
+            f"SELECT id, participant_id, montant FROM cotisations WHERE paye = 0 AND id IN ({placeholders})",
+            list(verses)
+        ).fetchall()
+        date_paiement = datetime.now().strftime("%Y-%m-%d")
+        conn.executemany(
+            "UPDATE cotisations SET paye = 1, date_paiement = ? WHERE id = ?",
+            [(date_paiement, cotisation_id) for cotisation_id, _, _ in dus]
         )
-        
-        conn.close()
-        return True, message
-    except sqlite3.IntegrityError:
-        return False, "Cette cotisation existe déjà pour ce terrain"
+        for cotisation_id, participant_id, montant_du in dus:
+            if verses[cotisation_id] != montant_du:
+                enregistrer_paiement(conn, participant_id, verses[cotisation_id] - montant_du,
+                                     SOURCE_AJUSTEMENT, cotisation_id, date_paiement)
+        ajouter_historique_batch([{
+            'type_action': 'UPDATE', 'table_concernee': 'cotisations', 'id_enregistrement': cotisation_id,
+            'details': f"Cotisation marquée comme payée - Montant: {verses[cotisation_id]} FCFA",
+            'ancienne_valeur': {'paye': False},
+            'nouvelle_valeur': {'paye': True, 'montant_du': montant_du, 'montant_paye': verses[cotisation_id]}
+        } for cotisation_id, _, montant_du in dus], conn)
+        conn.commit()
+        return True, f"{len(dus)} cotisation(s) marquée(s) comme payée(s)"
     except Exception as e:
+        conn.rollback()
         return False, f"Erreur: {str(e)}"
-
-def update_cotisation_status(cotisation_id, paye, montant_paye=None):
-    """Met à jour le statut de paiement d'une cotisation"""
-    try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        date_paiement = datetime.now().strftime("%Y-%m-%d") if paye else None
-        
-        # Si un montant est spécifié, on le met à jour
-        if montant_paye is not None:
-            cursor.execute(
-                "UPDATE cotisations SET paye = ?, date_paiement = ?, montant = ? WHERE id = ?",
-                (1 if paye else 0, date_paiement, montant_paye, cotisation_id)
-            )
-        else:
-            cursor.execute(
-                "UPDATE cotisations SET paye = ?, date_paiement = ? WHERE id = ?",
-                (1 if paye else 0, date_paiement, cotisation_id)
-            )
-        
-        conn.commit()
-        
-        # Enregistrer dans l'historique
-        statut_txt = "payée" if paye else "non payée"
-        montant_txt = f" - Montant: {montant_paye} FCFA" if montant_paye else ""
-        ajouter_historique(
-            'UPDATE',
-            'cotisations',
-            cotisation_id,
-            f"Cotisation marquée comme {statut_txt}{montant_txt}",
-            {'paye': not paye},
-            {'paye': paye, 'montant': montant_paye}
-        )
-        
+    finally:
         conn.close()
-        return True
-    except Exception as e:
-        return False
 
-
-def delete_cotisation(cotisation_id):
-    """Supprime une cotisation"""
+def supprimer_cotisations(cotisation_ids):
+    """Supprime plusieurs cotisations en une seule transaction"""
+    conn = get_connection()
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        
-        # Récupérer les infos avant suppression
-        cursor.execute("SELECT participant_id, mois, annee, montant FROM cotisations WHERE id = ?", (cotisation_id,))
-        cotis_info = cursor.fetchone()
-        
-        cursor.execute("DELETE FROM cotisations WHERE id = ?", (cotisation_id,))
+        placeholders = ','.join('?' * len(cotisation_ids))
+        supprimees = conn.execute(
+            f"SELECT id, participant_id, mois, annee, montant FROM cotisations WHERE id IN ({placeholders})",
+            cotisation_ids
+        ).fetchall()
+        conn.executemany("DELETE FROM cotisations WHERE id = ?", [(cid,) for cid in cotisation_ids])
+        ajouter_historique_batch([{
+            'type_action': 'DELETE', 'table_concernee': 'cotisations', 'id_enregistrement': cid,
+            'details': f"Suppression cotisation {mois}/{annee} - Montant: {montant} FCFA",
+            'ancienne_valeur': {'participant_id': participant_id, 'mois': mois, 'annee': annee, 'montant': montant}
+        } for cid, participant_id, mois, annee, montant in supprimees], conn)
         conn.commit()
-        
-        # Enregistrer dans l'historique
-        if cotis_info:
-            ajouter_historique(
-                'DELETE',
-                'cotisations',
-                cotisation_id,
-                f"Suppression cotisation {cotis_info[1]}/{cotis_info[2]} - Montant: {cotis_info[3]} FCFA",
-                {'participant_id': cotis_info[0], 'mois': cotis_info[1], 'annee': cotis_info[2], 'montant': cotis_info[3]},
-                None
-            )
-        
-        conn.close()
-        return True, "Cotisation supprimée avec succès"
+        return True, f"{len(supprimees)} cotisation(s) supprimée(s)"
     except Exception as e:
+        conn.rollback()
         return False, f"Erreur: {str(e)}"
+    finally:
+        conn.close()
 
 
-def generer_cotisations_mensuelles(mois, annee):
-    """Génère les cotisations impayées pour tous les participants pour un mois donné (une par terrain)"""
-    try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        
-        # Récupérer tous les participants avec leur nombre de terrains
-        cursor.execute("SELECT id, nom, prenom, nombre_terrains FROM participants WHERE nombre_terrains > 0")
-        participants = cursor.fetchall()
-        
-        nb_ajoutes = 0
-        nb_existent = 0
-        
-        for participant_id, nom, prenom, nb_terrains in participants:
-            # Créer une cotisation pour chaque terrain
-            for numero_terrain in range(1, nb_terrains + 1):
-                # Vérifier si la cotisation existe déjà pour ce terrain
-                cursor.execute(
-                    "SELECT id FROM cotisations WHERE participant_id = ? AND mois = ? AND annee = ? AND numero_terrain = ?",
-                    (participant_id, mois, annee, numero_terrain)
-                )
-                
-                if cursor.fetchone() is None:
-                    # Créer la cotisation impayée pour ce terrain
-                    cursor.execute(
-                        "INSERT INTO cotisations (participant_id, mois, annee, montant, paye, numero_terrain) VALUES (?, ?, ?, ?, 0, ?)",
-                        (participant_id, mois, annee, COTISATION_PAR_TERRAIN, numero_terrain)
-                    )
-                    nb_ajoutes += 1
-                else:
-                    nb_existent += 1
-        
-        conn.commit()
-        conn.close()
-        
-        return True, f"✅ {nb_ajoutes} cotisation(s) créée(s). {nb_existent} existait(ent) déjà."
-    except Exception as e:
-        return False, f"Erreur: {str(e)}"
+@st.fragment(run_every="1s")
+def suivre_rapports_lot():
+    """Affiche l'avancement de la génération en lot et rafraîchit la page à la fin"""
+    etat = st.session_state.rapports_lot
+    if etat['statut'] != 'en_cours':
+        st.rerun()
+    st.progress(etat['traites'] / max(etat['total'], 1),
+                text=f"⏳ {etat['traites']} / {etat['total']} rapport(s) générés...")
 
 
 # Configuration de la page
@@ -341,15 +331,24 @@ st.markdown("""
 st.title("💰 Gestion des Cotisations")
 
 # Initialiser session_state pour le paiement en cours
-if 'paiement_cotisation_id' not in st.session_state:
-    st.session_state.paiement_cotisation_id = None
-if 'delete_cotisation_id' not in st.session_state:
-    st.session_state.delete_cotisation_id = None
+if 'pile_impayees' not in st.session_state:
+    st.session_state.pile_impayees = [None]
+if 'version_file_impayees' not in st.session_state:
+    st.session_state.version_file_impayees = 0
+if 'rapports_lot' not in st.session_state:
+    st.session_state.rapports_lot = None
 
 # Génération automatique des cotisations mensuelles
 with st.expander("🔄 Générer les cotisations mensuelles automatiquement", expanded=False):
     st.write(f"**Génère des cotisations impayées pour tous les participants ayant des terrains.**")
-    st.write(f"Montant calculé : {COTISATION_PAR_TERRAIN:,.0f}".replace(',', ' ') + f" FCFA × nombre de terrains")
+    st.write(f"Montant calculé : {format_fcfa(COTISATION_PAR_TERRAIN)} × nombre de terrains")
+    
+    derniere = get_derniere_execution()
+    if derniere:
+        etats = {'termine': '✅ terminée', 'en_cours': '⏳ en cours', 'echec': '❌ en échec'}
+        st.caption(f"🗓️ Génération automatique en début de mois - dernier passage ({derniere['periode']}) "
+                   f"{etats.get(derniere['statut'], derniere['statut'])} le {derniere['date_debut']} : "
+                   f"{derniere['resultat'] or ''}")
     
     col1, col2, col3 = st.columns([2, 2, 1])
     with col1:
@@ -370,23 +369,81 @@ with st.expander("🔄 Générer les cotisations mensuelles automatiquement", ex
             else:
                 st.error(msg)
 
+# Génération sur une période (rattrapage de plusieurs mois)
+with st.expander("📅 Générer les cotisations d'une période", expanded=False):
+    st.write("**Crée en une seule fois les cotisations manquantes de plusieurs mois.** "
+             "Un aperçu indique d'abord ce qui sera créé.")
+    
+    col_debut_mois, col_debut_annee, col_fin_mois, col_fin_annee = st.columns(4)
+    with col_debut_mois:
+        periode_debut_mois = st.selectbox("Du mois", options=range(1, 13), index=0,
+                                          format_func=lambda m: MOIS_NOMS[m - 1], key="periode_debut_mois")
+    with col_debut_annee:
+        periode_debut_annee = st.number_input("Année de début", min_value=2025, max_value=2100,
+                                              value=datetime.now().year, step=1, key="periode_debut_annee")
+    with col_fin_mois:
+        periode_fin_mois = st.selectbox("Au mois", options=range(1, 13), index=datetime.now().month - 1,
+                                        format_func=lambda m: MOIS_NOMS[m - 1], key="periode_fin_mois")
+    with col_fin_annee:
+        periode_fin_annee = st.number_input("Année de fin", min_value=2025, max_value=2100,
+                                            value=datetime.now().year, step=1, key="periode_fin_annee")
+    
+    debut = (int(periode_debut_annee), periode_debut_mois)
+    fin = (int(periode_fin_annee), periode_fin_mois)
+    
+    if indice_mois(*debut) > indice_mois(*fin):
+        st.error("Le mois de début doit précéder le mois de fin")
+    elif st.button("🔍 Aperçu", key="bouton_apercu_periode"):
+        st.session_state.apercu_periode = (debut, fin)
+    
+    # L'aperçu reste affiché tant que la période n'est pas modifiée
+    if st.session_state.get('apercu_periode') == (debut, fin):
+        apercu = apercu_generation_periode(debut, fin)
+        if apercu.empty:
+            st.success(f"✅ Aucune cotisation manquante pour la période {libelle_periode(debut, fin)}")
+        else:
+            par_mois = apercu.groupby(['annee', 'mois']).agg(
+                participants=('participant_id', 'count'),
+                cotisations=('manquantes', 'sum')
+            ).reset_index()
+            par_mois.insert(0, 'Mois', libelles_periodes(par_mois['mois'], par_mois['annee']))
+            total = int(par_mois['cotisations'].sum())
+            
+            st.write(f"**{total} cotisation(s) manquante(s) sur {len(par_mois)} mois**")
+            st.dataframe(
+                par_mois[['Mois', 'participants', 'cotisations']].rename(
+                    columns={'participants': 'Participants', 'cotisations': 'Cotisations à créer'}),
+                hide_index=True, use_container_width=True
+            )
+            with st.expander("Détail par participant"):
+                detail = apercu.assign(Mois=libelles_periodes(apercu['mois'], apercu['annee']))
+                st.dataframe(
+                    detail[['Mois', 'participant', 'manquantes']].rename(
+                        columns={'participant': 'Participant', 'manquantes': 'Cotisations à créer'}),
+                    hide_index=True, use_container_width=True
+                )
+            
+            if st.button(f"✅ Créer les {total} cotisation(s)", type="primary", key="generer_periode"):
+                success, msg = generer_cotisations_periode(debut, fin)
+                if success:
+                    st.session_state.apercu_periode = None
+                    st.success(msg)
+                    st.rerun()
+                else:
+                    st.error(msg)
+
 # Formulaire d'ajout rapide pour plusieurs terrains avec montants différents
 with st.expander("➕➕ Ajouter des cotisations avec montants différents par terrain", expanded=False):
     st.info("💡 **Ajoutez rapidement plusieurs cotisations pour le même mois avec des montants différents par terrain**")
     
-    participants_df = get_all_participants()
-    
-    if participants_df.empty:
+    if compter_participants() == 0:
         st.warning("Aucun participant enregistré. Veuillez d'abord ajouter des participants.")
     else:
-        # Créer un dictionnaire pour le selectbox
-        participants_dict = {f"{row['nom']} {row['prenom']}": (row['id'], row['nombre_terrains']) 
-                           for _, row in participants_df.iterrows()}
-        
         col1, col2 = st.columns(2)
         with col1:
-            selected_participant_multi = st.selectbox("Participant *", options=list(participants_dict.keys()), key="multi_participant")
-            participant_id_multi, nb_terrains_multi = participants_dict[selected_participant_multi]
+            participant_multi = selecteur_participant("Participant *", key="multi_participant")
+            participant_id_multi = participant_multi['id'] if participant_multi else None
+            nb_terrains_multi = int(participant_multi['nombre_terrains']) if participant_multi else 0
         with col2:
             mois_dict = {nom: i+1 for i, nom in enumerate(MOIS_NOMS)}
             selected_mois_multi = st.selectbox("Mois *", options=list(mois_dict.keys()),
@@ -420,7 +477,7 @@ with st.expander("➕➕ Ajouter des cotisations avec montants différents par t
             
             # Afficher le total
             total_multi = sum(montants_terrains.values())
-            st.metric("💰 Total", f"{total_multi:,.0f}".replace(',', ' ') + " FCFA")
+            st.metric("💰 Total", format_fcfa(total_multi))
         else:
             st.warning("⚠️ Ce participant n'a aucun terrain")
             montants_terrains = {}
@@ -435,55 +492,37 @@ with st.expander("➕➕ Ajouter des cotisations avec montants différents par t
             else:
                 mois_num_multi = mois_dict[selected_mois_multi]
                 
-                # Ajouter une cotisation pour chaque terrain avec son montant
-                nb_ajoutees = 0
-                nb_erreurs = 0
-                erreurs_details = []
-                
-                for terrain_num, montant_val in montants_terrains.items():
-                    if montant_val > 0:  # Seulement si le montant est supérieur à 0
-                        success, msg = add_cotisation(
-                            participant_id_multi, 
-                            mois_num_multi, 
-                            annee_multi, 
-                            montant_val, 
-                            paye_multi, 
-                            terrain_num
-                        )
-                        if success:
-                            nb_ajoutees += 1
-                        else:
-                            nb_erreurs += 1
-                            erreurs_details.append(f"Terrain n°{terrain_num}: {msg}")
+                # Une seule transaction pour tous les terrains dont le montant est supérieur à 0
+                success, msg, conflits = ajouter_cotisations_terrains(
+                    participant_id_multi,
+                    mois_num_multi,
+                    annee_multi,
+                    [(terrain_num, montant_val) for terrain_num, montant_val in montants_terrains.items()
+                     if montant_val > 0],
+                    paye_multi
+                )
                 
                 # Afficher le résultat
-                if nb_ajoutees > 0:
-                    st.success(f"✅ {nb_ajoutees} cotisation(s) ajoutée(s) avec succès")
-                if nb_erreurs > 0:
-                    st.warning(f"⚠️ {nb_erreurs} erreur(s) :")
-                    for err in erreurs_details:
-                        st.write(f"  - {err}")
-                
-                if nb_ajoutees > 0:
-                    st.rerun()
+                if success and not conflits:
+                    st.success(f"✅ {msg}")
+                elif success:
+                    st.warning(f"⚠️ {msg}")
+                else:
+                    st.error(f"❌ {msg}")
 
 # Formulaire d'ajout de cotisation
 with st.expander("➕ Ajouter une cotisation", expanded=False):
-    participants_df = get_all_participants()
-    
-    if participants_df.empty:
+    if compter_participants() == 0:
         st.warning("Aucun participant enregistré. Veuillez d'abord ajouter des participants.")
     else:
+        # La sélection du participant est hors du formulaire pour mettre à jour la liste des terrains
+        participant_form = selecteur_participant("Participant *", key="form_cotisation_participant")
+        participant_id = participant_form['id'] if participant_form else None
+        nb_terrains = int(participant_form['nombre_terrains']) if participant_form else 0
+        
         with st.form("form_cotisation", clear_on_submit=True):
-            # Créer un dictionnaire pour le selectbox
-            participants_dict = {f"{row['nom']} {row['prenom']}": (row['id'], row['nombre_terrains']) 
-                               for _, row in participants_df.iterrows()}
-            
             col1, col2 = st.columns(2)
             with col1:
-                selected_participant = st.selectbox("Participant *", options=list(participants_dict.keys()))
-                participant_id, nb_terrains = participants_dict[selected_participant]
-                
                 # Sélection du terrain
                 if nb_terrains > 0:
                     terrains_options = ["Tous les terrains"] + [f"Terrain n°{i}" for i in range(1, nb_terrains + 1)]
@@ -502,7 +541,7 @@ with st.expander("➕ Ajouter une cotisation", expanded=False):
                 mois_dict = {nom: i+1 for i, nom in enumerate(MOIS_NOMS)}
                 selected_mois = st.selectbox("Mois *", options=list(mois_dict.keys()),
                                             index=datetime.now().month - 1)
-                montant = st.number_input(f"Montant (FCFA) * (min: {COTISATION_MIN:,.0f} FCFA)".replace(',', ' '), 
+                montant = st.number_input(f"Montant (FCFA) * (min: {format_fcfa(COTISATION_MIN)})", 
                                          min_value=float(COTISATION_MIN), value=1000.0, step=100.0, format="%.0f")
             
             paye = st.checkbox("Déjà payée", value=False)
@@ -528,11 +567,56 @@ with st.expander("➕ Ajouter une cotisation", expanded=False):
                     else:
                         st.error(msg)
 
+# Paiement groupé : une somme versée solde les cotisations impayées les plus anciennes
+with st.expander("💵 Enregistrer un paiement groupé (plusieurs mois)", expanded=False):
+    st.info("💡 **La somme versée solde les cotisations impayées de la plus ancienne à la plus récente, "
+            "tous terrains confondus. Le reliquat est gardé en avance.**")
+    
+    participant_paiement = selecteur_participant("Participant *", key="paiement_groupe_participant")
+    montant_groupe = st.number_input("Montant versé (FCFA) *", min_value=0.0, value=0.0, step=1000.0,
+                                     format="%.0f", key="paiement_groupe_montant")
+    
+    if participant_paiement and montant_groupe > 0:
+        soldees, reliquat, prochaine, avance = apercu_allocation(participant_paiement['id'], montant_groupe)
+        
+        if avance > 0:
+            st.caption(f"💰 Avance déjà versée par ce participant, ajoutée au montant : {format_fcfa(avance)}")
+        
+        if soldees.empty:
+            st.warning("⚠️ Le montant ne couvre pas la plus ancienne cotisation impayée")
+        else:
+            st.write(f"**{len(soldees)} cotisation(s) soldée(s)**")
+            st.dataframe(
+                pd.DataFrame({
+                    'Cotisation': libelles_cotisations(soldees),
+                    'Montant (FCFA)': soldees['montant'].to_numpy(),
+                }),
+                hide_index=True,
+                use_container_width=True,
+                height=min(400, 38 + 35 * len(soldees))
+            )
+        
+        if reliquat > 0:
+            if prochaine is not None:
+                suite = (f" (la cotisation suivante, {libelle_cotisation(prochaine)}, "
+                         f"est de {format_fcfa(prochaine['montant'])})")
+            else:
+                suite = " (plus aucune cotisation impayée)"
+            st.info(f"ℹ️ Reliquat gardé en avance pour le prochain paiement : {format_fcfa(reliquat)}{suite}")
+        
+        if st.button("✅ Enregistrer le paiement", type="primary", key="enregistrer_paiement_groupe"):
+            success, msg, _ = allouer_paiement(participant_paiement['id'], montant_groupe)
+            if success:
+                st.success(msg)
+                st.rerun()
+            else:
+                st.error(msg)
+
 st.divider()
 
-cotisations = get_all_cotisations()
+years = get_available_years()
 
-if cotisations.empty:
+if not years:
     st.info("Aucune cotisation enregistrée. Utilisez l'import Excel pour commencer.")
     st.stop()
     
@@ -540,109 +624,135 @@ if cotisations.empty:
 col_year, col_search = st.columns([1, 2])
 
 with col_year:
-    years = sorted(cotisations['annee'].unique(), reverse=True)
     selected_year = st.selectbox("Année", years, key="cotis_year")
 
 with col_search:
     search_cotis = st.text_input("🔍 Rechercher un participant", 
-                                placeholder="Nom du participant...",
+                                placeholder="Nom, prénom, téléphone...",
                                 key="search_cotis_year")
 
-# Filtrer par année
-cotis_year = cotisations[cotisations['annee'] == selected_year]
-
-# Filtrer par recherche si applicable
-if search_cotis:
-    mask = cotis_year['participant'].str.contains(search_cotis, case=False, na=False)
-    cotis_year = cotis_year[mask]
-    
-    if cotis_year.empty:
-        st.warning("Aucune cotisation ne correspond à votre recherche pour cette année")
-        st.stop()
+# Retards : participants dont les derniers mois échus sont impayés d'affilée
+masques = get_masques(selected_year, get_data_version())
+series = par_participant(masques, serie_en_cours(mois_impayes(masques), mois_de_reference(selected_year)),
+                         np.maximum)
+en_retard = series.index[series >= MOIS_RETARD_ALERTE]
 
 # Section pour marquer des cotisations comme payées
 st.subheader("💳 Marquer des cotisations comme payées")
 
-cotisations_impayees = cotis_year[cotis_year['paye'] == 0]
-
-if cotisations_impayees.empty:
+col_tri, col_mois, col_taille = st.columns([2, 1, 1])
+with col_tri:
+    tri_impayees = st.selectbox("Trier par", list(TRIS_IMPAYEES.keys()), key="tri_impayees")
+with col_mois:
+    mois_impayees = st.selectbox("Mois", [None] + list(range(1, 13)), key="mois_impayees",
+                                 format_func=lambda m: "Tous" if m is None else MOIS_NOMS[m - 1])
+with col_taille:
+    taille_impayees = st.selectbox("Par page", TAILLES_PAGE, key="taille_impayees")
+
+seulement_retard = st.checkbox(f"⚠️ Seulement les participants en retard ({MOIS_RETARD_ALERTE} mois impayés "
+                               f"d'affilée ou plus) : {len(en_retard)}", key="filtre_retard_cotis")
+participant_ids = en_retard.tolist() if seulement_retard else None
+
+# La file repart de la première page quand un filtre change
+filtres = (selected_year, search_cotis, tri_impayees, mois_impayees, taille_impayees, seulement_retard)
+if st.session_state.get('filtres_impayees') != filtres:
+    st.session_state.filtres_impayees = filtres
+    st.session_state.pile_impayees = [None]
+
+nb_impayees, total_impayees = compter_cotisations_impayees(selected_year, search_cotis, mois_impayees,
+                                                           participant_ids)
+
+if nb_impayees == 0 and (search_cotis or mois_impayees or seulement_retard):
+    st.warning("Aucune cotisation impayée ne correspond à vos filtres pour cette année")
+elif nb_impayees == 0:
     st.info("Aucune cotisation impayée pour cette année")
 else:
-    st.write(f"**{len(cotisations_impayees)} cotisation(s) impayée(s)**")
-    
-    # Conteneur avec scroll
-    with st.container(height=600):
-        for idx, row in cotisations_impayees.iterrows():
-                # Si ce n'est pas la cotisation en cours de paiement
-                if st.session_state.paiement_cotisation_id != row['id']:
-                    col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 1, 1])
-                    with col1:
-                        terrain_info = f" - Terrain n°{row['numero_terrain']}" if pd.notna(row['numero_terrain']) else " - Tous les terrains"
-                        st.write(f"**{row['participant']}**{terrain_info}")
-                    with col2:
-                        mois_nom = MOIS_NOMS[row['mois']-1]
-                        st.write(f"{mois_nom} {row['annee']}")
-                    with col3:
-                        st.write(f"{row['montant']:,.0f}".replace(',', ' ') + " FCFA")
-                    with col4:
-                        if st.button("✅ Payé", key=f"pay_{row['id']}", type="primary"):
-                            st.session_state.paiement_cotisation_id = row['id']
-                            st.rerun()
-                    with col5:
-                        if st.button("🗑️", key=f"del_cotis_{row['id']}", help="Supprimer"):
-                            st.session_state.delete_cotisation_id = row['id']
-                            st.rerun()
-                    
-                    # Confirmation de suppression
-                    if st.session_state.delete_cotisation_id == row['id']:
-                        st.warning(f"⚠️ **Confirmer la suppression de cette cotisation ?**")
-                        terrain_info = f" - Terrain n°{row['numero_terrain']}" if pd.notna(row['numero_terrain']) else " - Tous les terrains"
-                        st.write(f"{row['participant']}{terrain_info} - {mois_nom} {row['annee']} - {row['montant']:,.0f}".replace(',', ' ') + " FCFA")
-                        col_confirm, col_cancel = st.columns(2)
-                        with col_confirm:
-                            if st.button("✅ Confirmer la suppression", key=f"confirm_del_cotis_{row['id']}", type="primary"):
-                                success, msg = delete_cotisation(row['id'])
-                                if success:
-                                    st.success(msg)
-                                    st.session_state.delete_cotisation_id = None
-                                    st.rerun()
-                                else:
-                                    st.error(msg)
-                        with col_cancel:
-                            if st.button("❌ Annuler", key=f"cancel_del_cotis_{row['id']}"):
-                                st.session_state.delete_cotisation_id = None
-                                st.rerun()
+    st.write(f"**{nb_impayees} cotisation(s) impayée(s)** - {format_fcfa(total_impayees)}")
+    
+    # Seule la page visible est chargée : reprise après la dernière ligne de la page précédente
+    pile = st.session_state.pile_impayees
+    page_impayees = get_page_impayees(selected_year, search_cotis, mois_impayees, participant_ids,
+                                      tri_impayees, pile[-1], taille_impayees)
+    page_suivante = len(page_impayees) > taille_impayees
+    page_impayees = page_impayees.head(taille_impayees)
+    
+    tout_selectionner = st.checkbox("Sélectionner toute la page", key="tout_selectionner_impayees")
+    tableau = pd.DataFrame({
+        'Sélection': tout_selectionner,
+        'Participant': page_impayees['participant'],
+        'Terrain': libelles_terrain(page_impayees['numero_terrain'], tous="Tous les terrains"),
+        'Mois': libelles_periodes(page_impayees['mois'], selected_year),
+        'Montant prévu': page_impayees['montant'],
+        'Montant payé': page_impayees['montant'],
+    })
+    tableau.index = page_impayees['id']
+    
+    selection = st.data_editor(
+        tableau,
+        key=f"file_impayees_{st.session_state.version_file_impayees}_{len(pile)}_{tout_selectionner}",
+        hide_index=True,
+        use_container_width=True,
+        disabled=['Participant', 'Terrain', 'Mois', 'Montant prévu'],
+        column_config={
+            'Sélection': st.column_config.CheckboxColumn('Sélection', width="small"),
+            'Montant prévu': st.column_config.NumberColumn('Montant prévu (FCFA)', format="%d"),
+            'Montant payé': st.column_config.NumberColumn('Montant payé (FCFA)', min_value=float(COTISATION_MIN),
+                                                          step=100.0, format="%d", required=True),
+        }
+    )
+    selectionnees = selection[selection['Sélection']]
+    
+    col_precedente, col_position, col_suivante = st.columns([1, 2, 1])
+    with col_precedente:
+        if st.button("⬅️ Précédente", disabled=len(pile) == 1, use_container_width=True):
+            pile.pop()
+            st.rerun()
+    with col_position:
+        debut = (len(pile) - 1) * taille_impayees
+        st.caption(f"Éléments {debut + 1} à {debut + len(page_impayees)} sur {nb_impayees}")
+    with col_suivante:
+        if st.button("Suivante ➡️", disabled=not page_suivante, use_container_width=True):
+            derniere = page_impayees.iloc[-1]
+            pile.append((derniere[TRIS_IMPAYEES[tri_impayees][2]].item(), int(derniere['id'])))
+            st.rerun()
+    
+    col_payer, col_supprimer = st.columns(2)
+    with col_payer:
+        if st.button(f"✅ Marquer la sélection comme payée ({len(selectionnees)})", type="primary",
+                     disabled=selectionnees.empty, use_container_width=True):
+            success, msg = marquer_cotisations_payees(
+                [(int(cid), float(montant)) for cid, montant in selectionnees['Montant payé'].items()]
+            )
+            if success:
+                st.success(msg)
+                st.session_state.version_file_impayees += 1
+                st.rerun()
+            else:
+                st.error(msg)
+    with col_supprimer:
+        if st.button(f"🗑️ Supprimer la sélection ({len(selectionnees)})", disabled=selectionnees.empty,
+                     use_container_width=True):
+            st.session_state.suppression_impayees = selectionnees.index.tolist()
+    
+    # Confirmation de suppression
+    a_supprimer = [cid for cid in st.session_state.get('suppression_impayees') or [] if cid in selectionnees.index]
+    if a_supprimer:
+        st.warning(f"⚠️ **Confirmer la suppression de {len(a_supprimer)} cotisation(s) ?**")
+        col_confirm, col_cancel = st.columns(2)
+        with col_confirm:
+            if st.button("✅ Confirmer la suppression", type="primary"):
+                success, msg = supprimer_cotisations([int(cid) for cid in a_supprimer])
+                if success:
+                    st.success(msg)
+                    st.session_state.suppression_impayees = None
+                    st.session_state.version_file_impayees += 1
+                    st.rerun()
                 else:
-                    # Afficher le formulaire de saisie du montant
-                    terrain_info = f" - Terrain n°{row['numero_terrain']}" if pd.notna(row['numero_terrain']) else " - Tous les terrains"
-                    st.info(f"💰 **Enregistrer le paiement de {row['participant']}**{terrain_info}")
-                    mois_nom = MOIS_NOMS[row['mois']-1]
-                    st.write(f"📅 {mois_nom} {row['annee']} - Montant prévu : {row['montant']:,.0f}".replace(',', ' ') + " FCFA")
-                    
-                    col_montant, col_confirm, col_cancel = st.columns([2, 1, 1])
-                    with col_montant:
-                        montant_paye = st.number_input(
-                            "Montant payé (FCFA)", 
-                            min_value=float(COTISATION_MIN), 
-                            value=float(row['montant']),
-                            step=100.0, 
-                            format="%.0f",
-                            key=f"montant_paye_{row['id']}"
-                        )
-                    with col_confirm:
-                        st.write("")  # Espacement
-                        if st.button("✅ Confirmer", key=f"confirm_pay_{row['id']}", type="primary"):
-                            if update_cotisation_status(row['id'], True, montant_paye):
-                                st.success("Cotisation marquée comme payée")
-                                st.session_state.paiement_cotisation_id = None
-                                st.rerun()
-                    with col_cancel:
-                        st.write("")  # Espacement
-                        if st.button("❌ Annuler", key=f"cancel_pay_{row['id']}"):
-                            st.session_state.paiement_cotisation_id = None
-                            st.rerun()
-                    
-                    st.divider()
+                    st.error(msg)
+        with col_cancel:
+            if st.button("❌ Annuler"):
+                st.session_state.suppression_impayees = None
+                st.rerun()
 
 st.divider()
 
@@ -651,23 +761,14 @@ st.subheader(f"Générer le Rapport des cotisations ")
 
 # Section pour générer des rapports PDF
 with st.expander("📄 Générer un rapport PDF pour un participant", expanded=False):
-    participants_df = get_all_participants()
-    if not participants_df.empty:
-        participants_dict = {f"{row['nom']} {row['prenom']}": row['id'] 
-                           for _, row in participants_df.iterrows()}
+    if compter_participants() > 0:
+        participant_pdf = selecteur_participant("Sélectionner un participant", key="participant_pdf")
         
-        selected_participant_pdf = st.selectbox(
-            "Sélectionner un participant", 
-            options=list(participants_dict.keys()),
-            key="participant_pdf"
-        )
-        
-        if st.button("📥 Générer et télécharger le rapport PDF", type="primary"):
-            participant_id = participants_dict[selected_participant_pdf]
-            pdf_buffer = generer_rapport_participant(participant_id)
+        if participant_pdf and st.button("📥 Générer et télécharger le rapport PDF", type="primary"):
+            pdf_buffer = generer_rapport_participant(participant_pdf['id'])
             
             if pdf_buffer:
-                nom_fichier = selected_participant_pdf.replace(' ', '_')
+                nom_fichier = f"{participant_pdf['nom']}_{participant_pdf['prenom']}".replace(' ', '_')
                 st.download_button(
                     label="📥 Télécharger le PDF",
                     data=pdf_buffer,
@@ -680,3 +781,37 @@ with st.expander("📄 Générer un rapport PDF pour un participant", expanded=F
                 st.error("❌ Erreur lors de la génération du rapport")
     else:
         st.info("Aucun participant disponible")
+
+# Génération des rapports de tous les participants (processus en parallèle, archive ZIP)
+with st.expander("📦 Générer les rapports PDF de tous les participants", expanded=False):
+    etat_lot = st.session_state.rapports_lot
+    
+    if etat_lot and etat_lot['statut'] == 'en_cours':
+        suivre_rapports_lot()
+    else:
+        if etat_lot and etat_lot['statut'] == 'termine':
+            st.success(f"✅ {etat_lot['total'] - len(etat_lot['erreurs'])} rapport(s) générés")
+            if etat_lot['erreurs']:
+                st.warning("⚠️ Rapport(s) non générés : " + ", ".join(
+                    f"{p['nom']} {p['prenom']}" for p in etat_lot['erreurs']))
+            if os.path.exists(etat_lot['chemin']):
+                with open(etat_lot['chemin'], 'rb') as archive:
+                    st.download_button(
+                        label="📥 Télécharger l'archive ZIP",
+                        data=archive,
+                        file_name=os.path.basename(etat_lot['chemin']),
+                        mime="application/zip",
+                        key="download_zip_rapports"
+                    )
+            else:
+                st.info("ℹ️ L'archive a expiré : relancez la génération pour la télécharger")
+        elif etat_lot and etat_lot['statut'] == 'echec':
+            st.error(f"❌ {etat_lot['message']}")
+        
+        participants_lot = get_participants_rapports()
+        st.caption(f"{len(participants_lot)} participant(s) - les rapports sont générés en parallèle "
+                   f"sur {os.cpu_count() or 1} cœur(s)")
+        if st.button("📦 Générer tous les rapports", type="primary", disabled=not participants_lot,
+                     key="generer_rapports_lot"):
+            st.session_state.rapports_lot = lancer_rapports_zip(participants_lot)
+            st.rerun()
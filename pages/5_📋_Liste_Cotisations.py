@@ -2,12 +2,17 @@
 Page Liste et Visualisation des Cotisations
 """
 
+import csv
+import io
 import streamlit as st
-import sqlite3
 import pandas as pd
-from database import DB_NAME
-from constants import MOIS_NOMS
+from database import get_connection
+from formatage import format_fcfa, format_montants, libelles_mois, libelles_statut, libelles_terrain
 from auth import require_authentication, show_logout_button
+from recherche import compter_participants, selecteur_participant, rechercher_participants
+from pagination import TAILLES_PAGE, choisir_taille_page, choisir_page, reinitialiser_page
+from vues import (PAGE_LISTE_COTISATIONS, barre_vues, get_resultat, prechauffer_vues,
+                  suivre_rafraichissement)
 
 # Configuration de la page
 st.set_page_config(
@@ -26,79 +31,204 @@ show_logout_button()
 # REQUÊTES
 # ============================================================================
 
-def get_cotisations_detaillees(annee=None, statut=None, participant_id=None):
-    """Récupère les cotisations avec filtres"""
-    conn = sqlite3.connect(DB_NAME)
-    
-    query = """
-        SELECT 
-            c.id,
-            p.nom,
-            p.prenom,
-            p.nombre_terrains,
-            c.mois,
-            c.annee,
-            c.montant,
-            c.paye,
-            c.date_paiement,
-            c.numero_terrain
-        FROM cotisations c
-        JOIN participants p ON c.participant_id = p.id
-        WHERE 1=1
-    """
-    
+# Taille des lots lus dans le curseur pendant l'export CSV
+TAILLE_LOT_EXPORT = 5000
+
+COLONNES_EXPORT = ['Nom', 'Prénom', 'Nb Terrains', 'Terrain', 'Année', 'Mois', 'Montant', 'Statut', 'Date paiement']
+
+SELECT_COTISATIONS = """
+    SELECT 
+        c.id,
+        p.nom,
+        p.prenom,
+        p.nombre_terrains,
+        c.mois,
+        c.annee,
+        c.montant,
+        c.paye,
+        c.date_paiement,
+        c.numero_terrain
+    FROM cotisations c
+    JOIN participants p ON c.participant_id = p.id
+"""
+
+# Tris proposés pour la liste (l'id départage les égalités pour une pagination stable).
+# Les tris Participant, Montant et Date de paiement suivent exactement un index
+# (voir database.py) : la page est lue dans l'ordre de l'index, sans tri temporaire.
+# SQLite classe les NULL en premier : en ordre décroissant, les impayées sans date
+# de paiement arrivent en dernier.
+TRIS_COTISATIONS = {
+    "Période (plus récente d'abord)": "c.annee DESC, c.mois DESC, p.nom, p.prenom, c.numero_terrain, c.id",
+    "Période (plus ancienne d'abord)": "c.annee, c.mois, p.nom, p.prenom, c.numero_terrain, c.id",
+    "Participant": "p.nom, p.prenom, c.annee DESC, c.mois DESC, c.numero_terrain, c.id",
+    "Montant (plus élevé d'abord)": "c.montant DESC, c.id DESC",
+    "Montant (plus faible d'abord)": "c.montant, c.id",
+    "Date de paiement (plus récente d'abord)": "c.date_paiement DESC, c.id DESC",
+}
+TRI_DEFAUT = next(iter(TRIS_COTISATIONS))
+
+def _filtres_cotisations(annee=None, statut=None, participant_id=None):
+    """Construit la clause WHERE des filtres de la page"""
+    conditions = ["p.supprime = 0"]
     params = []
     
     if annee:
-        query += " AND c.annee = ?"
+        # Sans statistiques (pas d'ANALYZE), SQLite suppose qu'une année ne compte que
+        # quelques lignes et préfère la trier ; une année regroupe en réalité une
+        # large part de la table, autant suivre l'index du tri choisi
+        conditions.append("likelihood(c.annee = ?, 0.5)")
         params.append(annee)
     
     if statut == "Payées":
-        query += " AND c.paye = 1"
+        conditions.append("c.paye = 1")
     elif statut == "Impayées":
-        query += " AND c.paye = 0"
+        conditions.append("c.paye = 0")
     
     if participant_id:
-        query += " AND p.id = ?"
+        conditions.append("p.id = ?")
         params.append(participant_id)
     
-    query += " ORDER BY c.annee DESC, c.mois DESC, p.nom, p.prenom, c.numero_terrain"
+    return " WHERE " + " AND ".join(conditions), params
+
+def get_cotisations_detaillees(annee=None, statut=None, participant_id=None,
+                               tri="Période (plus récente d'abord)", limit=None, offset=0):
+    """
+    Récupère les cotisations avec filtres, triées et paginées côté serveur
     
+    Args:
+        annee, statut, participant_id: Filtres de la page
+        tri: Clé de TRIS_COTISATIONS
+        limit: Nombre maximum de lignes (None = toutes)
+        offset: Décalage pour la pagination
+    """
+    conn = get_connection()
+    where, params = _filtres_cotisations(annee, statut, participant_id)
+    query = SELECT_COTISATIONS + where + " ORDER BY " + TRIS_COTISATIONS[tri]
+    if limit is not None:
+        query += " LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
     df = pd.read_sql_query(query, conn, params=params)
     conn.close()
     return df
 
 
-def get_all_participants_with_id():
-    """Récupère tous les participants avec leur ID"""
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT id, nom, prenom FROM participants ORDER BY nom, prenom", conn)
-    conn.close()
-    return df
+def _lot_export(lignes):
+    """Formate un lot de lignes du curseur (colonnes de SELECT_COTISATIONS) pour l'export CSV, colonne par colonne"""
+    _, noms, prenoms, nombres_terrains, mois, annees, montants, payes, dates, terrains = zip(*lignes)
+    return zip(noms, prenoms, nombres_terrains, libelles_terrain(terrains), annees, libelles_mois(mois),
+               format_montants(montants), libelles_statut(payes), (date or "" for date in dates))
 
 
-def get_stats_cotisations(df):
-    """Calcule les statistiques sur les cotisations"""
-    if df.empty:
-        return None
+def exporter_cotisations_csv(annee=None, statut=None, participant_id=None,
+                             tri="Période (plus récente d'abord)", taille_lot=TAILLE_LOT_EXPORT):
+    """
+    Génère le CSV des cotisations filtrées
+    
+    Les lignes sont lues dans le curseur par lots et écrites au fur et à mesure
+    dans un tampon en mémoire : ni DataFrame ni liste complète des lignes lues.
+    Le CSV final reste entièrement en mémoire : st.download_button n'accepte
+    que des données déjà chargées (bytes, str ou fichier lu en entier) et les
+    conserve côté serveur jusqu'au téléchargement, un fichier sur disque ne
+    réduirait donc pas la mémoire utilisée.
+    
+    Returns:
+        Contenu du CSV encodé en UTF-8 (bytes)
+    """
+    tampon = io.BytesIO()
+    texte = io.TextIOWrapper(tampon, encoding='utf-8', newline='')
+    writer = csv.writer(texte, lineterminator='\n')
+    writer.writerow(COLONNES_EXPORT)
+    
+    conn = get_connection()
+    try:
+        where, params = _filtres_cotisations(annee, statut, participant_id)
+        cursor = conn.execute(SELECT_COTISATIONS + where + " ORDER BY " + TRIS_COTISATIONS[tri], params)
+        while True:
+            lignes = cursor.fetchmany(taille_lot)
+            if not lignes:
+                break
+            writer.writerows(_lot_export(lignes))
+    finally:
+        conn.close()
+    
+    texte.flush()
+    texte.detach()
+    return tampon.getvalue()
+
+
+def preparer_affichage(cotisations):
+    """Met en forme les cotisations (colonnes de SELECT_COTISATIONS) pour le tableau de la page"""
+    df_display = cotisations.copy()
+    df_display['Mois'] = libelles_mois(df_display['mois'])
+    df_display['Statut'] = libelles_statut(df_display['paye'])
+    df_display['Montant'] = format_montants(df_display['montant'])
+    df_display['Terrain'] = libelles_terrain(df_display['numero_terrain'])
+    
+    df_display = df_display[['nom', 'prenom', 'nombre_terrains', 'Terrain', 'annee', 'Mois', 'Montant', 'Statut', 'date_paiement']]
+    df_display.columns = COLONNES_EXPORT
+    return df_display
+
+
+def get_stats_cotisations(annee=None, statut=None, participant_id=None):
+    """Calcule les statistiques sur les cotisations filtrées en une requête d'agrégation"""
+    conn = get_connection()
+    where, params = _filtres_cotisations(annee, statut, participant_id)
+    total_cotisations, nb_payees, montant_total, montant_paye = conn.execute(f"""
+        SELECT COUNT(*),
+               COALESCE(SUM(c.paye), 0),
+               COALESCE(SUM(c.montant), 0),
+               COALESCE(SUM(CASE WHEN c.paye = 1 THEN c.montant ELSE 0 END), 0)
+        FROM cotisations c
+        JOIN participants p ON c.participant_id = p.id
+        {where}
+    """, params).fetchone()
+    conn.close()
     
-    total_cotisations = len(df)
-    nb_payees = len(df[df['paye'] == 1])
-    nb_impayees = len(df[df['paye'] == 0])
-    montant_total = df['montant'].sum()
-    montant_paye = df[df['paye'] == 1]['montant'].sum()
-    montant_impaye = df[df['paye'] == 0]['montant'].sum()
+    if total_cotisations == 0:
+        return None
     
     return {
         'total_cotisations': total_cotisations,
         'nb_payees': nb_payees,
-        'nb_impayees': nb_impayees,
+        'nb_impayees': total_cotisations - nb_payees,
         'montant_total': montant_total,
         'montant_paye': montant_paye,
-        'montant_impaye': montant_impaye
+        'montant_impaye': montant_total - montant_paye
     }
 
 
+def calculer_vue(filtres):
+    """Statistiques d'une vue enregistrée (None si aucune cotisation)"""
+    return get_stats_cotisations(filtres['annee'], filtres['statut'], filtres['participant_id'])
+
+
+def calculer_page_vue(filtres, offset, taille_page):
+    """Page de la liste d'une vue enregistrée, lue côté serveur et mise en forme"""
+    cotisations = get_cotisations_detaillees(filtres['annee'], filtres['statut'], filtres['participant_id'],
+                                             filtres['tri'], limit=taille_page, offset=offset)
+    return preparer_affichage(cotisations)
+
+
+def appliquer_vue(filtres):
+    """Remet les filtres d'une vue dans les widgets de la page (callback du bouton Ouvrir)"""
+    st.session_state.liste_annee = filtres['annee'] or "Toutes"
+    st.session_state.liste_statut = filtres['statut'] or "Toutes"
+    st.session_state.tri_cotisations = filtres['tri']
+    
+    # Le participant est recherché par son nom pour figurer parmi les choix du sélecteur
+    participant = pd.DataFrame()
+    if filtres['participant_id']:
+        participant = rechercher_participants(conditions=["p.id = ?"], params=[filtres['participant_id']],
+                                              colonnes="p.id, p.nom, p.prenom")
+    if participant.empty:
+        st.session_state.liste_participant = None
+        st.session_state.liste_participant_recherche = ""
+    else:
+        st.session_state.liste_participant = int(participant['id'].iloc[0])
+        st.session_state.liste_participant_recherche = f"{participant['nom'].iloc[0]} {participant['prenom'].iloc[0]}"
+    reinitialiser_page("page_cotisations")
+
+
 # ============================================================================
 # INTERFACE
 # ============================================================================
@@ -112,34 +242,28 @@ col1, col2, col3 = st.columns(3)
 
 with col1:
     # Filtre par année
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT DISTINCT annee FROM cotisations ORDER BY annee DESC")
     years = [row[0] for row in cursor.fetchall()]
     conn.close()
     
     year_options = ["Toutes"] + years
-    selected_year = st.selectbox("Année", year_options)
+    # Une vue peut désigner une année qui n'a plus de cotisations
+    if st.session_state.get('liste_annee', "Toutes") not in year_options:
+        st.session_state.liste_annee = "Toutes"
+    selected_year = st.selectbox("Année", year_options, key="liste_annee")
 
 with col2:
     # Filtre par statut
     statut_options = ["Toutes", "Payées", "Impayées"]
-    selected_statut = st.selectbox("Statut", statut_options)
+    selected_statut = st.selectbox("Statut", statut_options, key="liste_statut")
 
 with col3:
     # Filtre par participant
-    participants = get_all_participants_with_id()
-    if not participants.empty:
-        participant_options = ["Tous"] + [f"{row['nom']} {row['prenom']}" for _, row in participants.iterrows()]
-        selected_participant = st.selectbox("Participant", participant_options)
-        
-        # Récupérer l'ID du participant sélectionné
-        participant_id = None
-        if selected_participant != "Tous":
-            for _, row in participants.iterrows():
-                if f"{row['nom']} {row['prenom']}" == selected_participant:
-                    participant_id = row['id']
-                    break
+    if compter_participants() > 0:
+        participant = selecteur_participant("Participant", key="liste_participant", option_tous="Tous")
+        participant_id = participant['id'] if participant else None
     else:
         st.warning("Aucun participant")
         participant_id = None
@@ -150,13 +274,32 @@ st.divider()
 annee_filter = None if selected_year == "Toutes" else selected_year
 statut_filter = None if selected_statut == "Toutes" else selected_statut
 
-cotisations = get_cotisations_detaillees(annee_filter, statut_filter, participant_id)
+# Le tri est affiché avec la liste, plus bas, mais fait partie des filtres d'une vue
+if st.session_state.get('tri_cotisations', TRI_DEFAUT) not in TRIS_COTISATIONS:
+    st.session_state.tri_cotisations = TRI_DEFAUT
+filtres_vue = {'annee': annee_filter, 'statut': statut_filter, 'participant_id': participant_id,
+               'tri': st.session_state.get('tri_cotisations', TRI_DEFAUT)}
+
+vues, vue_active = barre_vues(PAGE_LISTE_COTISATIONS, filtres_vue, appliquer_vue, key="vues_liste")
+# Les vues enregistrées (statistiques et première page) sont recalculées en arrière-plan
+# dès que les données changent
+prechauffer_vues(PAGE_LISTE_COTISATIONS, vues, calculer_vue)
+taille_premiere_page = st.session_state.get('taille_page_cotisations', TAILLES_PAGE[0])
+prechauffer_vues(PAGE_LISTE_COTISATIONS, vues, lambda filtres: calculer_page_vue(filtres, 0, taille_premiere_page),
+                 partie=(0, taille_premiere_page))
+
+# Une vue enregistrée est servie depuis ses statistiques et ses pages en mémoire
+vue_a_jour = True
+zone_rafraichissement = st.container()
+if vue_active:
+    stats, vue_a_jour = get_resultat(PAGE_LISTE_COTISATIONS, filtres_vue, lambda: calculer_vue(filtres_vue))
+else:
+    stats = get_stats_cotisations(annee_filter, statut_filter, participant_id)
 
-if cotisations.empty:
+if stats is None:
     st.info("Aucune cotisation trouvée avec ces filtres")
 else:
     # Statistiques
-    stats = get_stats_cotisations(cotisations)
     
     st.subheader("📊 Statistiques")
     col1, col2, col3, col4 = st.columns(4)
@@ -171,35 +314,49 @@ else:
                  delta=f"{(stats['nb_impayees']/stats['total_cotisations']*100):.0f}%",
                  delta_color="inverse")
     with col4:
-        st.metric("Montant total", f"{stats['montant_total']:,.0f}".replace(',', ' ') + " FCFA")
+        st.metric("Montant total", format_fcfa(stats['montant_total']))
     
     col5, col6 = st.columns(2)
     with col5:
-        st.metric("💰 Montant encaissé", f"{stats['montant_paye']:,.0f}".replace(',', ' ') + " FCFA")
+        st.metric("💰 Montant encaissé", format_fcfa(stats['montant_paye']))
     with col6:
-        st.metric("⏳ Montant impayé", f"{stats['montant_impaye']:,.0f}".replace(',', ' ') + " FCFA")
+        st.metric("⏳ Montant impayé", format_fcfa(stats['montant_impaye']))
     
     st.divider()
     
     # Liste des cotisations
     st.subheader("📝 Liste détaillée")
     
-    # Préparer le dataframe pour l'affichage
-    df_display = cotisations.copy()
-    df_display['Mois'] = df_display['mois'].apply(lambda x: MOIS_NOMS[x-1] if 1 <= x <= 12 else str(x))
-    df_display['Statut'] = df_display['paye'].apply(lambda x: "✅ Payée" if x == 1 else "⏳ Impayée")
-    df_display['Montant'] = df_display['montant'].apply(lambda x: f"{x:,.0f}".replace(',', ' ') + " FCFA")
-    df_display['Terrain'] = df_display['numero_terrain'].apply(lambda x: f"n°{int(x)}" if pd.notna(x) else "Tous")
+    col_tri, col_taille = st.columns([3, 1])
+    with col_tri:
+        tri = st.selectbox("Trier par", list(TRIS_COTISATIONS.keys()), key="tri_cotisations",
+                           on_change=reinitialiser_page, args=("page_cotisations",))
+    with col_taille:
+        taille_page = choisir_taille_page("taille_page_cotisations", "page_cotisations")
     
-    # Colonnes à afficher
-    df_display = df_display[['nom', 'prenom', 'nombre_terrains', 'Terrain', 'annee', 'Mois', 'Montant', 'Statut', 'date_paiement']]
-    df_display.columns = ['Nom', 'Prénom', 'Nb Terrains', 'Terrain', 'Année', 'Mois', 'Montant', 'Statut', 'Date paiement']
+    # Retour à la première page quand un filtre change
+    filtres = (annee_filter, statut_filter, participant_id)
+    if st.session_state.get('filtres_liste_cotisations') != filtres:
+        st.session_state.filtres_liste_cotisations = filtres
+        reinitialiser_page("page_cotisations")
+    
+    offset = choisir_page(stats['total_cotisations'], taille_page, "page_cotisations")
+    
+    if vue_active:
+        df_display, page_a_jour = get_resultat(PAGE_LISTE_COTISATIONS, filtres_vue,
+                                               lambda: calculer_page_vue(filtres_vue, offset, taille_page),
+                                               partie=(offset, taille_page))
+        vue_a_jour = vue_a_jour and page_a_jour
+    else:
+        cotisations = get_cotisations_detaillees(annee_filter, statut_filter, participant_id,
+                                                 tri, limit=taille_page, offset=offset)
+        df_display = preparer_affichage(cotisations)
     
     # Afficher le tableau avec alternance de couleurs
     st.dataframe(
         df_display,
         use_container_width=True,
-        height=500,
+        height=min(500, 38 + 35 * len(df_display)),
         hide_index=True
     )
     
@@ -207,11 +364,15 @@ else:
     st.divider()
     col_export1, col_export2 = st.columns([1, 3])
     with col_export1:
-        csv = df_display.to_csv(index=False).encode('utf-8')
+        # Le fichier n'est généré que lorsque l'utilisateur clique sur le bouton
         st.download_button(
             label="📥 Télécharger en CSV",
-            data=csv,
+            data=lambda: exporter_cotisations_csv(annee_filter, statut_filter, participant_id, tri),
             file_name=f"cotisations_{selected_year if selected_year != 'Toutes' else 'toutes'}.csv",
             mime="text/csv",
             use_container_width=True
         )
+
+if not vue_a_jour:
+    with zone_rafraichissement:
+        suivre_rafraichissement(PAGE_LISTE_COTISATIONS, filtres_vue)
@@ -3,16 +3,18 @@ Page Export Excel
 """
 
 import streamlit as st
-import sqlite3
 import pandas as pd
+import numpy as np
 import io
-from datetime import datetime
+from datetime import date, datetime
 from dateutil.relativedelta import relativedelta
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
-from database import DB_NAME, init_database
-from constants import MOIS_NOMS
+from database import init_database, get_connection
+from formatage import format_fcfa, format_montants, libelles_periodes
 from auth import require_authentication, show_logout_button
+from recherche import compter_participants, selecteur_participants_multiple, rechercher_participants
+from vues import PAGE_EXPORT_EXCEL, barre_vues, get_resultat, prechauffer_vues, suivre_rafraichissement
 
 # Configuration de la page
 st.set_page_config(
@@ -36,7 +38,7 @@ show_logout_button()
 
 def get_available_years():
     """Récupère la liste des années disponibles dans les cotisations"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT DISTINCT annee FROM cotisations ORDER BY annee DESC")
     years = [row[0] for row in cursor.fetchall()]
@@ -68,17 +70,17 @@ def generate_cotisations_report(start_date=None, end_date=None, participant_ids=
         temp_date = temp_date + relativedelta(months=1)
     
     # Récupérer les participants
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     
     if participant_ids and len(participant_ids) > 0:
         # Filtrer par participants sélectionnés
         placeholders = ','.join('?' * len(participant_ids))
-        query = f"SELECT id, nom, prenom, nombre_terrains FROM participants WHERE id IN ({placeholders}) ORDER BY nom, prenom"
+        query = f"SELECT id, nom, prenom, nombre_terrains FROM participants WHERE supprime = 0 AND id IN ({placeholders}) ORDER BY nom, prenom"
         participants = pd.read_sql_query(query, conn, params=participant_ids)
     else:
         # Tous les participants
         participants = pd.read_sql_query(
-            "SELECT id, nom, prenom, nombre_terrains FROM participants ORDER BY nom, prenom", 
+            "SELECT id, nom, prenom, nombre_terrains FROM participants WHERE supprime = 0 ORDER BY nom, prenom", 
             conn
         )
     
@@ -86,41 +88,84 @@ def generate_cotisations_report(start_date=None, end_date=None, participant_ids=
         conn.close()
         return None
     
-    # Créer le dataframe de base
-    result = participants.copy()
-    
-    # Ajouter une colonne pour chaque mois
-    for year, month in months:
-        col_name = f"{MOIS_NOMS[month-1]} {year}"
-        
-        # Récupérer les cotisations pour ce mois (somme par participant si plusieurs terrains)
+    # Montants payés de toute la période en une requête (somme par participant et par mois,
+    # plusieurs terrains confondus), puis pivot : chaque somme est placée à sa ligne
+    # (participant) et à sa colonne (mois). Le nombre de requêtes ne dépend pas de la période.
+    montants = np.full((len(participants), len(months)), np.nan)
+    if months:
+        (annee_debut, mois_debut), (annee_fin, mois_fin) = months[0], months[-1]
         query = """
-            SELECT participant_id, SUM(montant) as montant 
-            FROM cotisations 
-            WHERE annee = ? AND mois = ? AND paye = 1
-            GROUP BY participant_id
+            SELECT participant_id, annee, mois, SUM(montant) as montant
+            FROM cotisations
+            WHERE paye = 1 AND (annee, mois) >= (?, ?) AND (annee, mois) <= (?, ?)
         """
-        cotis = pd.read_sql_query(query, conn, params=(year, month))
+        params = [annee_debut, mois_debut, annee_fin, mois_fin]
+        if participant_ids and len(participant_ids) > 0:
+            query += f" AND participant_id IN ({placeholders})"
+            params.extend(participant_ids)
+        query += " GROUP BY participant_id, annee, mois"
+        cotis = pd.read_sql_query(query, conn, params=params)
         
-        # Fusionner avec le résultat
-        if not cotis.empty:
-            cotis.columns = ['id', col_name]
-            result = result.merge(cotis, on='id', how='left')
-        else:
-            result[col_name] = None
+        lignes = pd.Index(participants['id']).get_indexer(cotis['participant_id'])
+        periodes = cotis['annee'].to_numpy(dtype=np.int64) * 12 + cotis['mois'].to_numpy(dtype=np.int64)
+        colonnes = periodes - (annee_debut * 12 + mois_debut)
+        connus = lignes >= 0
+        montants[lignes[connus], colonnes[connus]] = cotis['montant'].to_numpy(dtype=float)[connus]
+    conn.close()
     
-    # Calculer le total par participant
-    month_cols = [f"{MOIS_NOMS[m-1]} {y}" for y, m in months]
-    result['TOTAL PAYÉ'] = result[month_cols].sum(axis=1)
+    month_cols = list(libelles_periodes([m for _, m in months], [y for y, _ in months]))
+    result = pd.concat([
+        participants[['nom', 'prenom', 'nombre_terrains']],
+        pd.DataFrame(montants, columns=month_cols, index=participants.index),
+    ], axis=1)
     
-    # Réorganiser les colonnes
-    final_cols = ['nom', 'prenom', 'nombre_terrains'] + month_cols + ['TOTAL PAYÉ']
-    result = result[final_cols]
+    # Calculer le total par participant
+    result['TOTAL PAYÉ'] = np.nansum(montants, axis=1)
     
-    conn.close()
     return result, months
 
 
+def preparer_apercu(df, months):
+    """Met en forme le rapport pour l'aperçu (montants en FCFA, '-' pour les mois non payés)"""
+    df_display = df.copy()
+    month_cols = list(libelles_periodes([m for _, m in months], [y for y, _ in months]))
+    
+    for col in month_cols + ['TOTAL PAYÉ']:
+        df_display[col] = format_montants(df_display[col].where(df_display[col] > 0))
+    return df_display
+
+
+def calculer_vue(filtres):
+    """
+    Résultat d'une vue enregistrée : rapport de la période et son aperçu mis en forme
+    
+    Returns:
+        Tuple (df, months, aperçu), ou None si aucun participant
+    """
+    result = generate_cotisations_report(datetime.fromisoformat(filtres['debut']),
+                                         datetime.fromisoformat(filtres['fin']),
+                                         filtres['participant_ids'])
+    if result is None:
+        return None
+    df, months = result
+    return df, months, preparer_apercu(df, months)
+
+
+def appliquer_vue(filtres):
+    """Remet les filtres d'une vue dans les widgets de la page (callback du bouton Ouvrir)"""
+    st.session_state.export_date_debut = date.fromisoformat(filtres['debut'])
+    st.session_state.export_date_fin = date.fromisoformat(filtres['fin'])
+    participant_ids = filtres['participant_ids'] or []
+    if participant_ids:
+        # Les participants supprimés depuis l'enregistrement de la vue sont retirés
+        placeholders = ','.join('?' * len(participant_ids))
+        existants = rechercher_participants(conditions=[f"p.id IN ({placeholders})"], params=participant_ids,
+                                            colonnes="p.id")
+        participant_ids = [pid for pid in participant_ids if pid in set(existants['id'].astype(int))]
+    st.session_state.export_tous_participants = not participant_ids
+    st.session_state.export_selected_participants = participant_ids
+
+
 def export_to_excel(df, months):
     """Exporte le dataframe vers Excel avec mise en forme"""
     output = io.BytesIO()
@@ -191,13 +236,13 @@ def export_cotisations_to_excel_pivot(start_date=None, end_date=None, participan
         participant_ids: list - Liste des IDs de participants
         only_paid: bool - Exporter uniquement les cotisations payées
     """
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
 
     query = """
         SELECT p.nom, p.prenom, p.nombre_terrains, c.annee, c.mois, c.montant, c.paye
         FROM cotisations c
         JOIN participants p ON p.id = c.participant_id
-        WHERE 1=1
+        WHERE p.supprime = 0
     """
 
     params = []
@@ -309,6 +354,11 @@ st.title("📤 Export Excel")
 
 st.subheader("📋 Rapport des cotisations avec filtres")
 
+# Valeurs initiales des filtres, en session pour qu'une vue enregistrée puisse les remplacer
+st.session_state.setdefault('export_date_debut', date(2025, 8, 1))
+st.session_state.setdefault('export_date_fin', date.today())
+st.session_state.setdefault('export_tous_participants', True)
+
 # Filtres
 with st.expander("🔍 Filtres d'export", expanded=True):
     col1, col2 = st.columns(2)
@@ -317,7 +367,6 @@ with st.expander("🔍 Filtres d'export", expanded=True):
         st.write("**📅 Période**")
         date_debut = st.date_input(
             "Date de début",
-            value=datetime(2025, 8, 1),
             min_value=datetime(2020, 1, 1),
             max_value=datetime.now(),
             format="DD/MM/YYYY",
@@ -328,7 +377,6 @@ with st.expander("🔍 Filtres d'export", expanded=True):
         st.write("**📅 Fin**")
         date_fin = st.date_input(
             "Date de fin",
-            value=datetime.now(),
             min_value=datetime(2020, 1, 1),
             max_value=datetime(2100, 12, 31),
             format="DD/MM/YYYY",
@@ -339,30 +387,18 @@ with st.expander("🔍 Filtres d'export", expanded=True):
     
     # Sélection des participants
     st.write("**👥 Participants**")
-    conn_temp = sqlite3.connect(DB_NAME)
-    all_participants = pd.read_sql_query(
-        "SELECT id, nom, prenom FROM participants ORDER BY nom, prenom",
-        conn_temp
-    )
-    conn_temp.close()
-    
-    if not all_participants.empty:
-        participants_dict = {f"{row['nom']} {row['prenom']}": row['id'] 
-                           for _, row in all_participants.iterrows()}
-        
+    if compter_participants() > 0:
         tous_participants = st.checkbox(
             "Tous les participants",
-            value=True,
             key="export_tous_participants"
         )
         
         if not tous_participants:
-            selected_participants = st.multiselect(
+            selected_participants = selecteur_participants_multiple(
                 "Sélectionner les participants",
-                options=list(participants_dict.keys()),
                 key="export_selected_participants"
             )
-            participant_ids_filter = [participants_dict[name] for name in selected_participants] if selected_participants else None
+            participant_ids_filter = selected_participants if selected_participants else None
         else:
             participant_ids_filter = None
             selected_participants = None
@@ -384,27 +420,31 @@ if start_datetime > end_datetime:
 st.info(f"📊 Export de **{start_datetime.strftime('%B %Y')}** à **{end_datetime.strftime('%B %Y')}** • "
         f"Participants : **{'Tous' if participant_ids_filter is None else f'{len(selected_participants)} sélectionné(s)'}**")
 
+filtres_vue = {'debut': date_debut.isoformat(), 'fin': date_fin.isoformat(),
+               'participant_ids': sorted(int(pid) for pid in participant_ids_filter) if participant_ids_filter else None}
+vues, vue_active = barre_vues(PAGE_EXPORT_EXCEL, filtres_vue, appliquer_vue, key="vues_export")
+# Les vues enregistrées sont recalculées en arrière-plan dès que les données changent
+prechauffer_vues(PAGE_EXPORT_EXCEL, vues, calculer_vue)
+
 st.divider()
 
-# Générer le rapport
-with st.spinner("Génération du rapport..."):
-    result = generate_cotisations_report(start_datetime, end_datetime, participant_ids_filter)
+# Générer le rapport (une vue enregistrée est servie depuis son résultat en mémoire)
+if vue_active:
+    result, vue_a_jour = get_resultat(PAGE_EXPORT_EXCEL, filtres_vue, lambda: calculer_vue(filtres_vue))
+    if not vue_a_jour:
+        suivre_rafraichissement(PAGE_EXPORT_EXCEL, filtres_vue)
+else:
+    with st.spinner("Génération du rapport..."):
+        result = generate_cotisations_report(start_datetime, end_datetime, participant_ids_filter)
+    if result is not None:
+        result = (*result, preparer_apercu(*result))
 
 if result is not None:
-    df, months = result
+    df, months, df_display = result
     
     # Afficher un aperçu du tableau
     st.write(f"**Aperçu du rapport** ({len(df)} participants, {len(months)} mois)")
     
-    # Formater l'affichage pour remplacer les valeurs numériques
-    df_display = df.copy()
-    month_cols = [f"{MOIS_NOMS[m-1]} {y}" for y, m in months]
-    
-    for col in month_cols + ['TOTAL PAYÉ']:
-        df_display[col] = df_display[col].apply(
-            lambda x: f"{x:,.0f}".replace(',', ' ') + " FCFA" if pd.notna(x) and x > 0 else "-"
-        )
-    
     st.dataframe(df_display, use_container_width=True, height=400)
     
     # Statistiques rapides
@@ -413,11 +453,11 @@ if result is not None:
         st.metric("Participants", len(df))
     with col2:
         total_general = df['TOTAL PAYÉ'].sum()
-        st.metric("Total général", f"{total_general:,.0f}".replace(',', ' ') + " FCFA")
+        st.metric("Total général", format_fcfa(total_general))
     with col3:
         # Formatter la période selon les dates sélectionnées
-        period_start = f"{MOIS_NOMS[start_datetime.month-1]} {start_datetime.year}"
-        period_end = f"{MOIS_NOMS[end_datetime.month-1]} {end_datetime.year}"
+        period_start, period_end = libelles_periodes([start_datetime.month, end_datetime.month],
+                                                     [start_datetime.year, end_datetime.year])
         st.metric("Période", f"{period_start} - {period_end}")
     
     st.divider()
@@ -6,8 +6,9 @@ import streamlit as st
 import sqlite3
 import pandas as pd
 from datetime import datetime
-from database import DB_NAME, init_database
+from database import init_database, get_connection
 from constants import COTISATION_MIN
+from formatage import format_fcfa
 from auth import require_authentication, show_logout_button
 
 # Configuration de la page
@@ -32,8 +33,8 @@ show_logout_button()
 
 def get_all_participants():
     """Récupère tous les participants"""
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT * FROM participants ORDER BY nom, prenom", conn)
+    conn = get_connection()
+    df = pd.read_sql_query("SELECT * FROM participants WHERE supprime = 0 ORDER BY nom, prenom", conn)
     conn.close()
     return df
 
@@ -41,7 +42,7 @@ def add_participant(nom, prenom, nombre_terrains=0, conn=None):
     """Ajoute un nouveau participant"""
     should_close = False
     if conn is None:
-        conn = sqlite3.connect(DB_NAME)
+        conn = get_connection()
         should_close = True
     
     try:
@@ -84,12 +85,12 @@ def import_cotisations_from_excel_pivot(df, auto_mark_paid=False):
     current = 0
 
     # Utiliser une transaction pour garantir l'intégrité
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
 
     try:
         # Charger tous les participants dans un dict pour éviter les requêtes répétées
-        cursor.execute("SELECT id, nom, prenom, nombre_terrains FROM participants")
+        cursor.execute("SELECT id, nom, prenom, nombre_terrains FROM participants WHERE supprime = 0")
         participants_cache = {}
         for pid, nom, prenom, nb_terrains in cursor.fetchall():
             participants_cache[f"{nom}|{prenom}"] = {'id': pid, 'nombre_terrains': nb_terrains}
@@ -117,7 +118,7 @@ def import_cotisations_from_excel_pivot(df, auto_mark_paid=False):
                     participants_cache[key] = {'id': participant_id, 'nombre_terrains': nombre_terrains}
                 except sqlite3.IntegrityError:
                     # Le participant existe déjà, le récupérer
-                    cursor.execute("SELECT id, nombre_terrains FROM participants WHERE nom = ? AND prenom = ?", (nom, prenom))
+                    cursor.execute("SELECT id, nombre_terrains FROM participants WHERE nom = ? AND prenom = ? AND supprime = 0", (nom, prenom))
                     result = cursor.fetchone()
                     if result:
                         participants_cache[key] = {'id': result[0], 'nombre_terrains': result[1]}
@@ -263,15 +264,15 @@ st.divider()
 
 st.subheader("📋 Format attendu")
 
-st.markdown("""
+st.markdown(f"""
 Le fichier Excel doit avoir le format suivant :
 - **Colonne 1** : `nom` - Nom du participant
 - **Colonne 2** : `prenom` - Prénom du participant
 - **Colonne 3** (optionnelle) : `nombre_terrains` - Nombre de terrains
 - **Colonnes suivantes** : Format `ANNEE-MOIS` (ex: `2025-08`, `2025-09`, etc.)
 
-Les montants doivent être supérieurs ou égaux à **{:,}** FCFA.
-""".format(COTISATION_MIN).replace(',', ' '))
+Les montants doivent être supérieurs ou égaux à **{format_fcfa(COTISATION_MIN)}**.
+""")
 
 st.info("💡 Les participants n'existant pas seront créés automatiquement lors de l'import.")
 
@@ -3,14 +3,17 @@ Page Relances WhatsApp - Génération de messages personnalisés
 """
 
 import streamlit as st
-import sqlite3
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import urllib.parse
-from database import DB_NAME, init_database
-from constants import MOIS_NOMS
+from database import init_database, get_connection, get_data_version
+from constants import MOIS_RETARD_ALERTE
 from auth import require_authentication, show_logout_button
 from historique import ajouter_historique
+from formatage import format_fcfa, format_montants, libelles_periodes, libelles_terrain
+from recherche import selecteur_participant
+from masques import get_masques, mois_impayes, serie_en_cours, par_participant, mois_de_reference
 
 # Configuration de la page
 st.set_page_config(
@@ -34,7 +37,7 @@ show_logout_button()
 
 def get_participants_impayees():
     """Récupère les participants avec des cotisations impayées"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     
     df = pd.read_sql_query("""
         SELECT 
@@ -48,7 +51,7 @@ def get_participants_impayees():
             GROUP_CONCAT(DISTINCT c.annee || '-' || c.mois) as periodes
         FROM participants p
         JOIN cotisations c ON p.id = c.participant_id
-        WHERE c.paye = 0 AND p.telephone IS NOT NULL AND p.telephone != ''
+        WHERE c.paye = 0 AND p.supprime = 0 AND p.telephone IS NOT NULL AND p.telephone != ''
         GROUP BY p.id
         ORDER BY montant_total DESC
     """, conn)
@@ -58,17 +61,18 @@ def get_participants_impayees():
 
 def get_details_impayees(participant_id):
     """Récupère le détail des cotisations impayées pour un participant"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     
     df = pd.read_sql_query("""
         SELECT 
-            mois,
-            annee,
-            montant,
-            numero_terrain
-        FROM cotisations
-        WHERE participant_id = ? AND paye = 0
-        ORDER BY annee, mois, numero_terrain
+            c.mois,
+            c.annee,
+            c.montant,
+            c.numero_terrain
+        FROM cotisations c
+        JOIN participants p ON p.id = c.participant_id
+        WHERE c.participant_id = ? AND c.paye = 0 AND p.supprime = 0
+        ORDER BY c.annee, c.mois, c.numero_terrain
     """, conn, params=(participant_id,))
     
     conn.close()
@@ -81,13 +85,14 @@ def generer_message_whatsapp(nom, prenom, details_impayees, montant_total):
     message += "🏞️ **Rappel Cotisations MEDD**\n\n"
     message += f"Nous vous rappelons que vous avez {len(details_impayees)} cotisation(s) en attente de paiement:\n\n"
     
-    # Grouper par mois
-    for _, row in details_impayees.iterrows():
-        mois_nom = MOIS_NOMS[int(row['mois']) - 1]
-        terrain_info = f" (Terrain n°{int(row['numero_terrain'])})" if pd.notna(row['numero_terrain']) else ""
-        message += f"• {mois_nom} {int(row['annee'])}{terrain_info}: {row['montant']:,.0f} FCFA\n".replace(',', ' ')
+    # Une ligne par cotisation, construite colonne par colonne
+    periodes = np.asarray(libelles_periodes(details_impayees['mois'], details_impayees['annee']), dtype=object)
+    terrains = np.asarray(libelles_terrain(details_impayees['numero_terrain'], tous=""), dtype=object)
+    terrains = np.where(terrains == "", "", " (Terrain " + terrains + ")")
+    montants = np.asarray(format_montants(details_impayees['montant']), dtype=object)
+    message += "".join("• " + periodes + terrains + ": " + montants + "\n")
     
-    message += f"\n💰 **Total à payer: {montant_total:,.0f} FCFA**\n\n".replace(',', ' ')
+    message += f"\n💰 **Total à payer: {format_fcfa(montant_total)}**\n\n"
     message += "Merci de régulariser votre situation dans les meilleurs délais.\n\n"
     message += "Pour toute question, n'hésitez pas à nous contacter.\n\n"
     message += "Cordialement,\n"
@@ -127,6 +132,27 @@ if participants_impayees.empty:
     st.success("🎉 **Aucune cotisation impayée !** Tous les participants sont à jour.")
     st.stop()
 
+# Ciblage par retard : mois impayés d'affilée jusqu'au mois courant, calculés
+# sur les masques de paiement de l'année
+annee_courante = datetime.now().year
+masques = get_masques(annee_courante, get_data_version())
+series = par_participant(masques, serie_en_cours(mois_impayes(masques), mois_de_reference(annee_courante)),
+                         np.maximum)
+participants_impayees['retard'] = participants_impayees['id'].map(series).fillna(0).astype(int)
+participants_impayees['montant_affiche'] = format_montants(participants_impayees['montant_total'])
+
+retard_min = st.number_input(
+    f"Relancer à partir de combien de mois impayés d'affilée ({annee_courante}) ?",
+    min_value=0, max_value=12, value=0, step=1,
+    help=f"0 = tous les participants ayant un impayé. À partir de {MOIS_RETARD_ALERTE} mois, "
+         "le participant est considéré en retard."
+)
+if retard_min:
+    participants_impayees = participants_impayees[participants_impayees['retard'] >= retard_min]
+    if participants_impayees.empty:
+        st.info(f"Aucun participant n'a {retard_min} mois impayés d'affilée ou plus")
+        st.stop()
+
 # Afficher le nombre total de participants à relancer
 st.metric(
     "👥 Participants à relancer", 
@@ -150,17 +176,19 @@ mode_selection = st.radio(
 )
 
 if mode_selection == "Un participant":
-    # Sélection unique
-    participants_dict = {f"{row['nom']} {row['prenom']} ({row['montant_total']:,.0f} FCFA)".replace(',', ' '): row 
-                        for _, row in participants_impayees.iterrows()}
-    
-    selected = st.selectbox(
+    # Sélection unique parmi les participants à relancer
+    selected = selecteur_participant(
         "Sélectionner un participant",
-        options=list(participants_dict.keys())
+        key="relance_participant",
+        conditions=[
+            "EXISTS (SELECT 1 FROM cotisations c WHERE c.participant_id = p.id AND c.paye = 0)",
+            "p.telephone IS NOT NULL AND p.telephone != ''"
+        ] + ([f"p.id IN ({','.join('?' * len(participants_impayees))})"] if retard_min else []),
+        params=[int(pid) for pid in participants_impayees['id']] if retard_min else None
     )
     
     if selected:
-        participant = participants_dict[selected]
+        participant = participants_impayees[participants_impayees['id'] == selected['id']].iloc[0]
         
         # Afficher les détails
         col1, col2 = st.columns(2)
@@ -168,8 +196,9 @@ if mode_selection == "Un participant":
             st.write(f"**Nom:** {participant['nom']} {participant['prenom']}")
             st.write(f"**Téléphone:** {participant['telephone']}")
             st.write(f"**Nombre d'impayées:** {int(participant['nb_impayees'])}")
+            st.write(f"**Mois impayés d'affilée:** {int(participant['retard'])}")
         with col2:
-            st.write(f"**Montant total:** {participant['montant_total']:,.0f} FCFA".replace(',', ' '))
+            st.write(f"**Montant total:** {participant['montant_affiche']}")
         
         st.divider()
         
@@ -227,7 +256,7 @@ elif mode_selection == "Sélection multiple":
                 selected_participants.append(row)
         
         with col_info:
-            st.write(f"**{row['nom']} {row['prenom']}** - {row['telephone']} - {row['nb_impayees']} impayée(s) - {row['montant_total']:,.0f} FCFA".replace(',', ' '))
+            st.write(f"**{row['nom']} {row['prenom']}** - {row['telephone']} - {row['nb_impayees']} impayée(s) - {row['retard']} mois d'affilée - {row['montant_affiche']}")
     
     if selected_participants:
         st.divider()
@@ -276,7 +305,7 @@ else:  # Tous les participants
             )
             lien_whatsapp = generer_lien_whatsapp(participant['telephone'], message)
             
-            with st.expander(f"📱 {participant['nom']} {participant['prenom']} - {participant['montant_total']:,.0f} FCFA".replace(',', ' ')):
+            with st.expander(f"📱 {participant['nom']} {participant['prenom']} - {participant['montant_affiche']}"):
                 col_msg, col_btn = st.columns([3, 1])
                 
                 with col_msg:
@@ -308,7 +337,7 @@ st.divider()
 
 st.subheader("📋 Historique des relances récentes")
 
-conn = sqlite3.connect(DB_NAME)
+conn = get_connection()
 historique_df = pd.read_sql_query("""
     SELECT 
         h.date_action,
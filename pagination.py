@@ -0,0 +1,52 @@
+"""
+Composants de pagination côté serveur pour les listes
+"""
+
+import math
+import streamlit as st
+
+# Tailles de page proposées dans les sélecteurs
+TAILLES_PAGE = [25, 50, 100, 200]
+
+
+def choisir_taille_page(key, page_key, label="Par page"):
+    """Affiche le sélecteur du nombre d'éléments par page (revient à la page 1 au changement)"""
+    return st.selectbox(label, TAILLES_PAGE, key=key, on_change=reinitialiser_page, args=(page_key,))
+
+
+def reinitialiser_page(key):
+    """Revient à la première page (à appeler quand un filtre change)"""
+    st.session_state[key] = 1
+
+
+def choisir_page(total, taille_page, key, disabled=False):
+    """
+    Affiche le sélecteur de page et retourne l'offset SQL correspondant
+
+    Args:
+        total: Nombre total d'éléments correspondant aux filtres
+        taille_page: Nombre d'éléments par page
+        key: Clé du sélecteur de page dans st.session_state
+        disabled: Bloque le changement de page (modifications en attente par exemple)
+
+    Returns:
+        Offset à utiliser dans la clause LIMIT/OFFSET
+    """
+    nb_pages = max(1, math.ceil(total / taille_page))
+
+    # Ramener la page courante dans les bornes si le total a diminué
+    if st.session_state.get(key, 1) > nb_pages:
+        st.session_state[key] = nb_pages
+
+    col_info, col_page = st.columns([3, 1])
+    with col_page:
+        page = st.number_input("Page", min_value=1, max_value=nb_pages, step=1, key=key,
+                               disabled=disabled)
+
+    offset = (page - 1) * taille_page
+    with col_info:
+        if total > 0:
+            st.caption(f"Éléments {offset + 1} à {min(offset + taille_page, total)} sur {total} "
+                       f"• Page {page}/{nb_pages}")
+
+    return offset
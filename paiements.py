@@ -0,0 +1,123 @@
+"""
+Journal des paiements et soldes des participants
+Le journal (table paiements) enregistre chaque somme versée, en ajout seul :
+une erreur se corrige par une écriture inverse, jamais en modifiant une ligne.
+Les écritures liées au marquage des cotisations sont ajoutées par triggers
+(voir database.py) ; ce module ajoute celles que le statut d'une cotisation ne
+suffit pas à décrire : écart entre montant dû et montant versé, avance.
+
+Les soldes (dû, payé, avance) de chaque participant sont tenus à jour à chaque
+écriture : les lire revient à lire une ligne.
+"""
+
+import pandas as pd
+from datetime import datetime
+from database import get_connection
+
+# Origine des écritures du journal
+SOURCE_COTISATION = 'cotisation'    # cotisation marquée payée (trigger)
+SOURCE_AJUSTEMENT = 'ajustement'    # écart entre le montant versé et le montant dû
+SOURCE_ANNULATION = 'annulation'    # cotisation démarquée ou supprimée (trigger)
+SOURCE_AVANCE = 'avance'            # somme versée d'avance, ou avance utilisée (négative)
+SOURCE_REPRISE = 'reprise'          # cotisations payées avant la création du journal
+
+LIBELLES_SOURCES = {
+    SOURCE_COTISATION: "Cotisation",
+    SOURCE_AJUSTEMENT: "Ajustement",
+    SOURCE_ANNULATION: "Annulation",
+    SOURCE_AVANCE: "Avance",
+    SOURCE_REPRISE: "Reprise",
+}
+
+SOLDE_VIDE = {'total_du': 0.0, 'total_paye': 0.0, 'avance': 0.0, 'reste': 0.0,
+              'nb_paiements': 0, 'dernier_paiement': None}
+
+
+def enregistrer_paiement(conn, participant_id, montant, source, cotisation_id=None, date_paiement=None):
+    """
+    Ajoute une écriture au journal, dans la transaction de l'appelant
+
+    Args:
+        conn: Connexion SQLite (l'appelant valide ou annule)
+        participant_id: ID du participant
+        montant: Somme versée (négative pour une correction)
+        source: Origine de l'écriture (SOURCE_*)
+        cotisation_id: Cotisation concernée (None pour une avance)
+        date_paiement: Date du versement (par défaut aujourd'hui)
+    """
+    conn.execute(
+        "INSERT INTO paiements (participant_id, cotisation_id, montant, date_paiement, source) VALUES (?, ?, ?, ?, ?)",
+        (participant_id, cotisation_id, montant, date_paiement or datetime.now().strftime("%Y-%m-%d"), source)
+    )
+
+
+def _solde(row):
+    """Dictionnaire de solde à partir d'une ligne (total_du, total_paye, avance, nb, dernier)"""
+    if row is None:
+        return dict(SOLDE_VIDE)
+    total_du, total_paye, avance, nb_paiements, dernier_paiement = row
+    return {
+        'total_du': total_du or 0.0,
+        'total_paye': total_paye or 0.0,
+        'avance': avance or 0.0,
+        'reste': (total_du or 0.0) - (total_paye or 0.0),
+        'nb_paiements': nb_paiements or 0,
+        'dernier_paiement': dernier_paiement,
+    }
+
+
+def get_solde(participant_id, conn=None):
+    """
+    Solde d'un participant
+
+    Returns:
+        Dictionnaire total_du, total_paye, avance, reste (dû - payé),
+        nb_paiements, dernier_paiement
+    """
+    connexion = conn or get_connection()
+    row = connexion.execute("""
+        SELECT total_du, total_paye, avance, nb_paiements, dernier_paiement
+        FROM soldes_participants WHERE participant_id = ?
+    """, (int(participant_id),)).fetchone()
+    if conn is None:
+        connexion.close()
+    return _solde(row)
+
+
+def get_soldes_totaux(conn=None):
+    """Somme des soldes de tous les participants actifs (même format que get_solde)"""
+    connexion = conn or get_connection()
+    row = connexion.execute("""
+        SELECT SUM(s.total_du), SUM(s.total_paye), SUM(s.avance), SUM(s.nb_paiements), MAX(s.dernier_paiement)
+        FROM soldes_participants s
+        JOIN participants p ON p.id = s.participant_id
+        WHERE p.supprime = 0
+    """).fetchone()
+    if conn is None:
+        connexion.close()
+    return _solde(row)
+
+
+def get_paiements(participant_id, limit=None):
+    """
+    Relevé des paiements d'un participant, du plus récent au plus ancien
+
+    Returns:
+        DataFrame (id, date_paiement, montant, source, cotisation_id, mois, annee, numero_terrain)
+    """
+    conn = get_connection()
+    query = """
+        SELECT pa.id, pa.date_paiement, pa.montant, pa.source, pa.cotisation_id,
+               c.mois, c.annee, c.numero_terrain
+        FROM paiements pa
+        LEFT JOIN cotisations c ON c.id = pa.cotisation_id
+        WHERE pa.participant_id = ?
+        ORDER BY pa.date_paiement DESC, pa.id DESC
+    """
+    params = [int(participant_id)]
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    df = pd.read_sql_query(query, conn, params=params)
+    conn.close()
+    return df
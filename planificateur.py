@@ -0,0 +1,142 @@
+"""
+Planificateur de la génération mensuelle des cotisations
+Au début de chaque mois, les cotisations du mois sont générées sans
+intervention. Chaque passage est enregistré dans la table taches_planifiees
+(une ligne par mois) : une génération déjà terminée n'est jamais refaite, une
+génération en échec est retentée au passage suivant. Un verrou de fichier
+garantit qu'un seul processus exécute la tâche quand plusieurs instances de
+l'application tournent sur la même base.
+
+Le planificateur tourne dans un thread de l'application (démarré une seule
+fois par processus depuis l'accueil). Il peut aussi être lancé par cron :
+    python planificateur.py
+"""
+
+import threading
+import time
+from datetime import datetime
+from database import DB_NAME, get_connection
+from generation import inserer_cotisations_mois
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Nom de la tâche dans la table taches_planifiees
+TACHE_GENERATION = "generation_mensuelle"
+
+# Intervalle entre deux vérifications du thread (secondes)
+INTERVALLE_VERIFICATION = 3600
+
+FICHIER_VERROU = f"{DB_NAME}.planificateur.lock"
+
+
+def _verrouiller(fichier):
+    """Prend le verrou exclusif du fichier sans attendre ; False s'il est déjà pris"""
+    try:
+        if fcntl:
+            fcntl.flock(fichier.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fichier.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def executer_generation_mensuelle(maintenant=None):
+    """
+    Génère les cotisations du mois courant si ce n'est pas déjà fait
+
+    Args:
+        maintenant: Date de référence (par défaut la date du jour)
+
+    Returns:
+        Tuple (statut, message) : statut parmi 'termine', 'deja_fait',
+        'verrouille' (un autre processus s'en charge) et 'echec'
+    """
+    maintenant = maintenant or datetime.now()
+    periode = maintenant.strftime("%Y-%m")
+
+    with open(FICHIER_VERROU, "a") as verrou:
+        if not _verrouiller(verrou):
+            return 'verrouille', "Génération déjà en cours dans un autre processus"
+
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT statut FROM taches_planifiees WHERE nom = ? AND periode = ?",
+                           (TACHE_GENERATION, periode))
+            tache = cursor.fetchone()
+            if tache and tache[0] == 'termine':
+                return 'deja_fait', f"Cotisations de {periode} déjà générées"
+
+            # Sous le verrou, une tâche 'en_cours' ne peut venir que d'un processus interrompu : on la reprend
+            debut = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            cursor.execute("""
+                INSERT INTO taches_planifiees (nom, periode, statut, date_debut)
+                VALUES (?, ?, 'en_cours', ?)
+                ON CONFLICT (nom, periode) DO UPDATE
+                SET statut = 'en_cours', date_debut = excluded.date_debut, date_fin = NULL, resultat = NULL
+            """, (TACHE_GENERATION, periode, debut))
+            conn.commit()
+
+            try:
+                # La génération et la fin de tâche sont validées ensemble
+                nb_ajoutes, nb_existent = inserer_cotisations_mois(cursor, maintenant.month, maintenant.year)
+                statut, message = 'termine', f"{nb_ajoutes} cotisation(s) créée(s), {nb_existent} existante(s)"
+            except Exception as e:
+                conn.rollback()
+                statut, message = 'echec', f"Erreur: {str(e)}"
+
+            cursor.execute("""
+                UPDATE taches_planifiees SET statut = ?, date_fin = ?, resultat = ?
+                WHERE nom = ? AND periode = ?
+            """, (statut, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), message, TACHE_GENERATION, periode))
+            conn.commit()
+            return statut, message
+        finally:
+            conn.close()
+
+
+def get_derniere_execution():
+    """Retourne la dernière exécution de la génération mensuelle (dict) ou None"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT periode, statut, date_debut, date_fin, resultat FROM taches_planifiees
+        WHERE nom = ? ORDER BY periode DESC LIMIT 1
+    """, (TACHE_GENERATION,))
+    ligne = cursor.fetchone()
+    conn.close()
+    if ligne is None:
+        return None
+    return dict(zip(['periode', 'statut', 'date_debut', 'date_fin', 'resultat'], ligne))
+
+
+def _boucle_planificateur(intervalle):
+    """Boucle du thread : vérifie régulièrement que le mois courant est généré"""
+    while True:
+        try:
+            statut, message = executer_generation_mensuelle()
+            if statut in ('termine', 'echec'):
+                print(f"Génération mensuelle automatique ({statut}): {message}")
+        except Exception as e:
+            print(f"Erreur du planificateur: {e}")
+        time.sleep(intervalle)
+
+
+def demarrer_planificateur(intervalle=INTERVALLE_VERIFICATION):
+    """Démarre le thread du planificateur et le retourne"""
+    thread = threading.Thread(target=_boucle_planificateur, args=(intervalle,),
+                              name="planificateur-cotisations", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    from database import init_database
+    init_database()
+    statut, message = executer_generation_mensuelle()
+    print(f"🗓️  Génération mensuelle ({statut}): {message}")
@@ -0,0 +1,117 @@
+"""
+Purge en arrière-plan des participants supprimés
+La suppression d'un participant est logique (colonne supprime) : il disparaît
+immédiatement de l'application. Ses cotisations et ses paiements sont ensuite
+effacés par petits lots, chacun dans une transaction courte, pour que les autres
+écritures n'attendent jamais la fin d'une grosse suppression.
+"""
+
+import threading
+import time
+from database import get_connection
+
+# Nombre de lignes supprimées par transaction
+TAILLE_LOT = 500
+
+# Pause entre deux lots pour laisser passer les autres écritures (secondes)
+PAUSE_ENTRE_LOTS = 0.05
+
+_demande = threading.Event()
+_verrou = threading.Lock()
+
+
+def _supprimer_par_lots(conn, requete, taille_lot, pause):
+    """
+    Exécute une suppression limitée à taille_lot lignes jusqu'à épuisement,
+    en validant chaque lot dans sa propre transaction
+
+    Returns:
+        Nombre total de lignes supprimées
+    """
+    cursor = conn.cursor()
+    total = 0
+    while True:
+        cursor.execute(requete, (taille_lot,))
+        supprimees = cursor.rowcount
+        conn.commit()
+        total += supprimees
+
+        if supprimees < taille_lot:
+            return total
+        time.sleep(pause)
+
+
+def purger_participants_supprimes(taille_lot=TAILLE_LOT, pause=PAUSE_ENTRE_LOTS):
+    """
+    Efface les données des participants marqués comme supprimés
+
+    Returns:
+        Tuple (nombre de cotisations supprimées, nombre d'écritures du journal des
+        paiements supprimées, nombre de participants supprimés)
+    """
+    conn = get_connection()
+
+    try:
+        nb_cotisations = _supprimer_par_lots(conn, """
+            DELETE FROM cotisations WHERE id IN (
+                SELECT c.id FROM cotisations c
+                JOIN participants p ON p.id = c.participant_id
+                WHERE p.supprime = 1
+                LIMIT ?
+            )
+        """, taille_lot, pause)
+
+        # Le journal des paiements n'accepte de suppression que pour un participant supprimé
+        nb_paiements = _supprimer_par_lots(conn, """
+            DELETE FROM paiements WHERE id IN (
+                SELECT pa.id FROM paiements pa
+                JOIN participants p ON p.id = pa.participant_id
+                WHERE p.supprime = 1
+                LIMIT ?
+            )
+        """, taille_lot, pause)
+
+        # Il ne reste que la ligne de solde de chaque participant, supprimée en cascade
+        cursor = conn.cursor()
+        cursor.execute("""
+            DELETE FROM participants
+            WHERE supprime = 1
+              AND NOT EXISTS (SELECT 1 FROM cotisations c WHERE c.participant_id = participants.id)
+              AND NOT EXISTS (SELECT 1 FROM paiements pa WHERE pa.participant_id = participants.id)
+        """)
+        nb_participants = cursor.rowcount
+        conn.commit()
+    finally:
+        conn.close()
+
+    return nb_cotisations, nb_paiements, nb_participants
+
+
+def _executer_purges():
+    """Boucle du thread de purge : recommence tant que de nouvelles demandes arrivent"""
+    try:
+        while _demande.is_set():
+            _demande.clear()
+            try:
+                purger_participants_supprimes()
+            except Exception as e:
+                print(f"Erreur lors de la purge des participants supprimés: {e}")
+    finally:
+        _verrou.release()
+
+    # Une demande arrivée pendant la libération du verrou relance la purge
+    if _demande.is_set():
+        lancer_purge()
+
+
+def lancer_purge():
+    """Demande une purge en arrière-plan (un seul thread de purge à la fois)"""
+    _demande.set()
+    if _verrou.acquire(blocking=False):
+        threading.Thread(target=_executer_purges, name="purge-participants", daemon=True).start()
+
+
+if __name__ == "__main__":
+    cotisations, paiements, participants = purger_participants_supprimes()
+    print(f"🗑️  {participants} participant(s), {cotisations} cotisation(s) et "
+          f"{paiements} paiement(s) purgé(s)")
@@ -0,0 +1,180 @@
+"""
+Génération en lot des rapports PDF
+Chaque rapport demande plusieurs centaines de millisecondes (graphiques
+matplotlib) : les rapports de tous les participants sont répartis sur un pool
+de processus, un par cœur, chacun avec sa propre connexion en lecture seule.
+Les PDF sont écrits dans une archive ZIP sur disque au fur et à mesure qu'ils
+arrivent, sans jamais être tous gardés en mémoire. Les archives anciennes sont
+supprimées à chaque nouvelle génération.
+"""
+
+import os
+import threading
+import time
+import zipfile
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from database import get_connection
+from generate_report_pdf import generer_rapport_participant
+
+# Dossier des archives générées
+DOSSIER_RAPPORTS = "rapports"
+
+# Durée de conservation des archives (secondes) : assez longue pour qu'une archive
+# encore affichée dans une autre session reste téléchargeable
+DUREE_CONSERVATION_ARCHIVES = 24 * 3600
+
+# Nombre de rapports soumis à l'avance par processus (les PDF en attente d'écriture
+# sont les seuls gardés en mémoire)
+EN_VOL_PAR_PROCESSUS = 2
+
+# Connexion du processus de travail (une par processus, ouverte à son démarrage)
+_connexion = None
+
+
+def _initialiser_processus():
+    """Ouvre la connexion en lecture seule du processus de travail"""
+    global _connexion
+    _connexion = get_connection()
+    _connexion.execute("PRAGMA query_only = ON")
+
+
+def _generer_rapport(participant_id):
+    """Génère un rapport dans un processus de travail (octets du PDF, ou None)"""
+    buffer = generer_rapport_participant(participant_id, _connexion)
+    return buffer.getvalue() if buffer else None
+
+
+def nom_fichier_rapport(participant):
+    """Nom du fichier PDF d'un participant (l'ID évite les doublons d'homonymes)"""
+    nom = f"{participant['nom']}_{participant['prenom']}".replace(' ', '_').replace('/', '_')
+    return f"rapport_{nom}_{participant['id']}.pdf"
+
+
+def get_participants_rapports():
+    """Participants pour lesquels un rapport est généré (tous les participants actifs)"""
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT id, nom, prenom FROM participants WHERE supprime = 0 ORDER BY nom, prenom"
+    ).fetchall()
+    conn.close()
+    return [{'id': row[0], 'nom': row[1], 'prenom': row[2]} for row in rows]
+
+
+def generer_rapports_zip(participants, chemin, nb_processus=None, progression=None):
+    """
+    Génère les rapports PDF de plusieurs participants dans une archive ZIP
+
+    Args:
+        participants: Liste de dictionnaires (id, nom, prenom)
+        chemin: Chemin de l'archive ZIP à créer
+        nb_processus: Nombre de processus (par défaut un par cœur)
+        progression: Fonction appelée après chaque rapport avec (nombre traité, total)
+
+    Returns:
+        Liste des participants dont le rapport n'a pas pu être généré
+    """
+    nb_processus = nb_processus or os.cpu_count() or 1
+    erreurs = []
+    # Écriture dans un fichier temporaire : l'archive n'apparaît que complète
+    temporaire = f"{chemin}.partiel"
+
+    # « spawn » : l'application Streamlit a déjà des threads, qu'un fork recopierait mal
+    with ProcessPoolExecutor(max_workers=nb_processus,
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_initialiser_processus) as executeur, \
+            zipfile.ZipFile(temporaire, 'w', zipfile.ZIP_DEFLATED) as archive:
+        # Au plus EN_VOL_PAR_PROCESSUS rapports soumis par processus : un PDF terminé
+        # est libéré dès son écriture dans l'archive, avant que d'autres soient soumis
+        a_soumettre = iter(participants)
+        futures = {}
+        traites = 0
+        while True:
+            for participant in a_soumettre:
+                futures[executeur.submit(_generer_rapport, participant['id'])] = participant
+                if len(futures) >= EN_VOL_PAR_PROCESSUS * nb_processus:
+                    break
+            if not futures:
+                break
+
+            terminees, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in terminees:
+                participant = futures.pop(future)
+                try:
+                    pdf = future.result()
+                except Exception as e:
+                    print(f"Erreur lors du rapport du participant {participant['id']}: {e}")
+                    pdf = None
+                if pdf:
+                    archive.writestr(nom_fichier_rapport(participant), pdf)
+                else:
+                    erreurs.append(participant)
+                traites += 1
+                if progression:
+                    progression(traites, len(participants))
+
+    os.replace(temporaire, chemin)
+    return erreurs
+
+
+def purger_archives(duree=DUREE_CONSERVATION_ARCHIVES):
+    """
+    Supprime les archives (et les archives partielles abandonnées) plus anciennes
+    que la durée de conservation
+
+    Returns:
+        Nombre de fichiers supprimés
+    """
+    limite = time.time() - duree
+    supprimes = 0
+    for nom in os.listdir(DOSSIER_RAPPORTS):
+        if not (nom.startswith("rapports_") and nom.endswith((".zip", ".zip.partiel"))):
+            continue
+        chemin = os.path.join(DOSSIER_RAPPORTS, nom)
+        try:
+            if os.path.getmtime(chemin) < limite:
+                os.remove(chemin)
+                supprimes += 1
+        except OSError:
+            # Fichier supprimé entre-temps par une autre session
+            pass
+    return supprimes
+
+
+def lancer_rapports_zip(participants, nb_processus=None):
+    """
+    Lance la génération en lot dans un thread, pour ne pas bloquer l'interface
+
+    Returns:
+        Dictionnaire d'état mis à jour pendant la génération : total, traites,
+        statut ('en_cours', 'termine' ou 'echec'), chemin, erreurs, message
+    """
+    os.makedirs(DOSSIER_RAPPORTS, exist_ok=True)
+    purger_archives()
+    chemin = os.path.join(DOSSIER_RAPPORTS, f"rapports_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip")
+    etat = {'total': len(participants), 'traites': 0, 'statut': 'en_cours',
+            'chemin': chemin, 'erreurs': [], 'message': None}
+
+    def progression(traites, total):
+        etat['traites'] = traites
+
+    def executer():
+        try:
+            etat['erreurs'] = generer_rapports_zip(participants, chemin, nb_processus, progression)
+            etat['statut'] = 'termine'
+        except Exception as e:
+            etat['message'] = f"Erreur: {str(e)}"
+            etat['statut'] = 'echec'
+
+    threading.Thread(target=executer, name="rapports-lot", daemon=True).start()
+    return etat
+
+
+if __name__ == "__main__":
+    import sys
+    debut = time.perf_counter()
+    destination = sys.argv[1] if len(sys.argv) > 1 else "rapports.zip"
+    en_erreur = generer_rapports_zip(get_participants_rapports(), destination)
+    print(f"📄 Rapports écrits dans {destination} en {time.perf_counter() - debut:.1f}s "
+          f"({len(en_erreur)} erreur(s))")
@@ -0,0 +1,188 @@
+"""
+Recherche de participants partagée par toutes les pages
+La recherche porte sur le nom, le prénom, le téléphone et l'email. Elle est
+insensible à la casse et aux accents ("Helene" trouve "Hélène") et chaque mot
+saisi est traité comme un préfixe.
+"""
+
+import pandas as pd
+import streamlit as st
+from database import get_connection
+
+# Nombre maximal de participants proposés dans un sélecteur
+LIMITE_SELECTEUR = 100
+
+
+def _fts_disponible(cursor):
+    """Indique si l'index FTS5 des participants existe"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'participants_fts'")
+    return cursor.fetchone() is not None
+
+
+def construire_requete_fts(terme):
+    """
+    Transforme la saisie de l'utilisateur en requête FTS5 par préfixes
+
+    Exemple : 'hel dup' -> '"hel"* "dup"*' (tous les mots doivent correspondre)
+    """
+    mots = [mot.replace('"', '') for mot in terme.split()]
+    return ' '.join(f'"{mot}"*' for mot in mots if mot)
+
+
+def filtre_recherche(terme, cursor, alias="p"):
+    """
+    Construit la condition SQL de recherche sur la table participants
+
+    Args:
+        terme: Texte saisi par l'utilisateur
+        cursor: Curseur ouvert sur la base (pour détecter l'index FTS5)
+        alias: Alias de la table participants dans la requête
+
+    Returns:
+        Tuple (condition, paramètres) ; condition vide si pas de recherche
+    """
+    terme = (terme or "").strip()
+    requete_fts = construire_requete_fts(terme)
+    if not requete_fts:
+        return "", []
+
+    if _fts_disponible(cursor):
+        return (f"{alias}.id IN (SELECT rowid FROM participants_fts WHERE participants_fts MATCH ?)",
+                [requete_fts])
+
+    motif = f"%{terme}%"
+    return (f"({alias}.nom LIKE ? OR {alias}.prenom LIKE ? OR {alias}.telephone LIKE ? OR {alias}.email LIKE ?)",
+            [motif, motif, motif, motif])
+
+
+def _clause_where(terme, cursor, conditions=None, params=None):
+    """Assemble la recherche et les conditions supplémentaires en clause WHERE"""
+    clauses = ["p.supprime = 0"] + list(conditions or [])
+    valeurs = list(params or [])
+    condition, params_recherche = filtre_recherche(terme, cursor)
+    if condition:
+        clauses.append(condition)
+        valeurs.extend(params_recherche)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return where, valeurs
+
+
+def compter_participants(terme="", conditions=None, params=None):
+    """
+    Compte les participants correspondant à la recherche
+
+    Args:
+        terme: Texte recherché (vide = tous)
+        conditions: Conditions SQL supplémentaires sur l'alias p
+        params: Paramètres des conditions supplémentaires
+    
+    Les participants supprimés (en attente de purge) sont toujours exclus.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    where, valeurs = _clause_where(terme, cursor, conditions, params)
+    cursor.execute("SELECT COUNT(*) FROM participants p" + where, valeurs)
+    total = cursor.fetchone()[0]
+    conn.close()
+    return total
+
+
+def rechercher_participants(terme="", conditions=None, params=None, limit=None, offset=0,
+                            colonnes="p.*", jointures="", tri="p.nom, p.prenom"):
+    """
+    Recherche les participants, triés par nom et prénom par défaut
+
+    Args:
+        terme: Texte recherché (vide = tous)
+        conditions: Conditions SQL supplémentaires sur l'alias p
+        params: Paramètres des conditions supplémentaires
+        limit: Nombre maximum de résultats (None = tous)
+        offset: Décalage pour la pagination
+        colonnes: Colonnes SELECT à retourner
+        jointures: Jointures SQL ajoutées après la table participants
+        tri: Clause ORDER BY
+
+    Returns:
+        DataFrame des participants trouvés
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    where, valeurs = _clause_where(terme, cursor, conditions, params)
+    query = f"SELECT {colonnes} FROM participants p {jointures}{where} ORDER BY {tri}"
+    if limit is not None:
+        query += " LIMIT ? OFFSET ?"
+        valeurs.extend([limit, offset])
+    df = pd.read_sql_query(query, conn, params=valeurs)
+    conn.close()
+    return df
+
+
+def _libelle(participant):
+    """Libellé d'un participant dans les sélecteurs"""
+    return f"{participant['nom']} {participant['prenom']}"
+
+
+def selecteur_participant(label, key, conditions=None, params=None, option_tous=None):
+    """
+    Affiche un champ de recherche et un sélecteur de participant
+
+    Args:
+        label: Libellé du sélecteur
+        key: Clé du sélecteur dans st.session_state
+        conditions: Conditions SQL limitant les participants proposés
+        params: Paramètres des conditions
+        option_tous: Libellé d'une option "tous" en tête de liste (optionnel)
+
+    Returns:
+        Dictionnaire du participant sélectionné (id, nom, prenom, nombre_terrains),
+        ou None si aucun participant ou si l'option "tous" est choisie
+    """
+    terme = st.text_input(f"🔍 {label} - rechercher", key=f"{key}_recherche",
+                          placeholder="Nom, prénom, téléphone...")
+    resultats = rechercher_participants(terme, conditions, params, limit=LIMITE_SELECTEUR,
+                                        colonnes="p.id, p.nom, p.prenom, p.nombre_terrains")
+    participants = {int(row['id']): row for row in resultats.to_dict('records')}
+
+    options = ([None] if option_tous else []) + list(participants.keys())
+    if not options:
+        st.warning("Aucun participant ne correspond à votre recherche")
+        return None
+
+    selected_id = st.selectbox(
+        label,
+        options=options,
+        format_func=lambda pid: option_tous if pid is None else _libelle(participants[pid]),
+        key=key,
+        help=f"Les {LIMITE_SELECTEUR} premiers résultats de la recherche sont proposés"
+    )
+    return participants.get(selected_id)
+
+
+def selecteur_participants_multiple(label, key):
+    """
+    Affiche un champ de recherche et une sélection multiple de participants
+    Les participants déjà sélectionnés restent proposés quand la recherche change.
+
+    Returns:
+        Liste des IDs des participants sélectionnés
+    """
+    terme = st.text_input(f"🔍 {label} - rechercher", key=f"{key}_recherche",
+                          placeholder="Nom, prénom, téléphone...")
+    deja_selectionnes = [int(pid) for pid in st.session_state.get(key, [])]
+
+    colonnes = "p.id, p.nom, p.prenom"
+    resultats = rechercher_participants(terme, limit=LIMITE_SELECTEUR, colonnes=colonnes)
+    if deja_selectionnes:
+        placeholders = ','.join('?' * len(deja_selectionnes))
+        selection = rechercher_participants(conditions=[f"p.id IN ({placeholders})"],
+                                            params=deja_selectionnes, colonnes=colonnes)
+        resultats = pd.concat([selection, resultats]).drop_duplicates('id')
+
+    participants = {int(row['id']): row for row in resultats.to_dict('records')}
+
+    return st.multiselect(
+        label,
+        options=list(participants.keys()),
+        format_func=lambda pid: _libelle(participants[pid]),
+        key=key
+    )
@@ -0,0 +1,122 @@
+"""
+Saisie des cotisations
+Les cotisations d'un participant pour un mois sont ajoutées en une seule
+transaction, quel que soit le nombre de terrains : une requête préparée
+exécutée pour tous les terrains (executemany) et une seule entrée d'historique.
+Un terrain qui a déjà sa cotisation pour le mois n'interrompt pas la saisie :
+il est ignoré (ON CONFLICT DO NOTHING) et signalé dans le résultat.
+"""
+
+from datetime import datetime
+from database import get_connection
+from historique import ajouter_historique_batch
+from formatage import format_fcfa
+
+INSERT_COTISATION_TERRAIN = """
+    INSERT INTO cotisations (participant_id, mois, annee, montant, paye, date_paiement, numero_terrain)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT DO NOTHING
+"""
+
+
+def _libelle_terrains(terrains):
+    """Libellé d'une liste de numéros de terrain"""
+    return ", ".join(f"n°{terrain}" for terrain in terrains)
+
+
+def ajouter_cotisations_terrains(participant_id, mois, annee, montants, paye=False):
+    """
+    Ajoute les cotisations d'un mois pour plusieurs terrains d'un participant
+
+    Args:
+        participant_id: ID du participant
+        mois: Mois (1 à 12)
+        annee: Année
+        montants: Liste de (numéro de terrain, montant)
+        paye: Cotisations déjà payées
+
+    Returns:
+        Tuple (succès, message, terrains en conflit) ; les terrains en conflit
+        ont déjà une cotisation pour ce mois et n'ont pas été modifiés
+    """
+    # Un terrain saisi deux fois ne compte qu'une fois (dernier montant saisi)
+    montants = dict((int(terrain), float(montant)) for terrain, montant in montants)
+    if not montants:
+        return False, "Aucun montant saisi", []
+
+    date_paiement = datetime.now().strftime("%Y-%m-%d") if paye else None
+    conn = get_connection()
+    try:
+        # Verrou d'écriture dès le début : les conflits lus ici sont exactement
+        # les lignes que l'insertion va ignorer
+        conn.execute("BEGIN IMMEDIATE")
+        placeholders = ','.join('?' * len(montants))
+        conflits = sorted(row[0] for row in conn.execute(f"""
+            SELECT numero_terrain FROM cotisations
+            WHERE participant_id = ? AND mois = ? AND annee = ? AND numero_terrain IN ({placeholders})
+        """, [participant_id, mois, annee, *montants]))
+
+        curseur = conn.executemany(INSERT_COTISATION_TERRAIN, [
+            (participant_id, mois, annee, montant, 1 if paye else 0, date_paiement, terrain)
+            for terrain, montant in montants.items()
+        ])
+        ajoutees = {terrain: montant for terrain, montant in montants.items() if terrain not in conflits}
+        if curseur.rowcount != len(ajoutees):
+            raise RuntimeError("Le nombre de cotisations créées ne correspond pas aux conflits détectés")
+
+        if ajoutees:
+            ajouter_historique_batch([{
+                'type_action': 'CREATE',
+                'table_concernee': 'cotisations',
+                'id_enregistrement': participant_id,
+                'details': f"Création cotisation(s) mois {mois}/{annee} - "
+                           f"Terrain(s) {_libelle_terrains(ajoutees)} - Montant: {sum(ajoutees.values()):.0f} FCFA",
+                'nouvelle_valeur': {'mois': mois, 'annee': annee, 'paye': paye,
+                                    'montants': ajoutees, 'conflits': conflits}
+            }], conn)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        return False, f"Erreur: {str(e)}", []
+    finally:
+        conn.close()
+
+    if not ajoutees:
+        return False, f"Cette cotisation existe déjà pour le(s) terrain(s) {_libelle_terrains(conflits)}", conflits
+    message = f"{len(ajoutees)} cotisation(s) ajoutée(s) (terrain(s) {_libelle_terrains(ajoutees)})"
+    if conflits:
+        message += f" - déjà existante(s) : terrain(s) {_libelle_terrains(conflits)}"
+    return True, message, conflits
+
+
+def add_cotisation(participant_id, mois, annee, montant, paye=False, numero_terrain=None):
+    """
+    Ajoute une nouvelle cotisation
+
+    Sans numéro de terrain, le montant est réparti à parts égales sur tous les
+    terrains du participant.
+    """
+    if numero_terrain is not None:
+        success, message, _ = ajouter_cotisations_terrains(participant_id, mois, annee,
+                                                           [(numero_terrain, montant)], paye)
+        if success:
+            message = f"Cotisation ajoutée avec succès (Terrain n°{numero_terrain})"
+        return success, message
+
+    conn = get_connection()
+    try:
+        row = conn.execute("SELECT nombre_terrains FROM participants WHERE id = ?", (participant_id,)).fetchone()
+    finally:
+        conn.close()
+    nb_terrains = row[0] if row else 0
+    if not nb_terrains:
+        return False, "Ce participant n'a aucun terrain"
+
+    montant_par_terrain = montant / nb_terrains
+    success, message, conflits = ajouter_cotisations_terrains(
+        participant_id, mois, annee,
+        [(terrain, montant_par_terrain) for terrain in range(1, nb_terrains + 1)], paye
+    )
+    if success and not conflits:
+        message = f"Cotisation ajoutée avec succès ({nb_terrains} terrains, {format_fcfa(montant_par_terrain)} chacun)"
+    return success, message
@@ -0,0 +1,93 @@
+"""
+Réconciliation des cotisations par terrain
+Quand le nombre de terrains d'un participant change, ce module calcule et
+applique le minimum d'insertions et de suppressions de cotisations, sans
+régénérer toute la table.
+"""
+
+from datetime import datetime
+from constants import COTISATION_PAR_TERRAIN
+from generation import CTE_PERIODES, dernier_mois_genere, indice_mois
+
+
+def reconcilier_terrains(cursor, participant_id, ancien_nb, nouveau_nb, depuis=None):
+    """
+    Aligne les cotisations d'un participant sur son nouveau nombre de terrains
+
+    S'exécute sur le curseur fourni, dans la transaction de l'appelant (qui
+    valide ou annule l'ensemble avec la mise à jour du participant).
+
+    - Terrains ajoutés : une cotisation impayée est créée pour chaque nouveau
+      terrain et chaque mois de `depuis` au dernier mois généré (voir generation.py).
+    - Terrains retirés : les cotisations impayées des terrains retirés sont
+      supprimées à partir de `depuis` ; les mois antérieurs restent dus et les
+      cotisations déjà payées sont conservées.
+
+    Args:
+        cursor: Curseur SQLite de la transaction en cours
+        participant_id: ID du participant
+        ancien_nb: Nombre de terrains avant modification
+        nouveau_nb: Nombre de terrains après modification
+        depuis: Tuple (annee, mois) à partir duquel créer ou supprimer
+            (par défaut le mois courant)
+
+    Returns:
+        Dictionnaire {'ajoutees', 'supprimees', 'payees_conservees'}
+    """
+    resultat = {'ajoutees': 0, 'supprimees': 0, 'payees_conservees': 0}
+    ancien_nb = int(ancien_nb or 0)
+    nouveau_nb = int(nouveau_nb or 0)
+
+    if depuis is None:
+        maintenant = datetime.now()
+        depuis = (maintenant.year, maintenant.month)
+    debut = indice_mois(*depuis)
+
+    if nouveau_nb > ancien_nb:
+        fin = dernier_mois_genere(cursor)
+
+        # Nouveaux terrains x mois de la période générée, comme pour la génération par période
+        if fin is not None and fin >= debut:
+            cursor.execute(f"""
+                INSERT INTO cotisations (participant_id, mois, annee, montant, paye, numero_terrain)
+                {CTE_PERIODES},
+                terrains(numero) AS (
+                    SELECT ? + 1
+                    UNION ALL
+                    SELECT numero + 1 FROM terrains WHERE numero < ?
+                )
+                SELECT ?, periodes.indice % 12 + 1, periodes.indice / 12, ?, 0, terrains.numero
+                FROM periodes CROSS JOIN terrains
+                WHERE 1
+                ON CONFLICT DO NOTHING
+            """, (debut, fin, ancien_nb, nouveau_nb, participant_id, COTISATION_PAR_TERRAIN))
+            resultat['ajoutees'] = cursor.rowcount
+
+    elif nouveau_nb < ancien_nb:
+        cursor.execute("""
+            DELETE FROM cotisations
+            WHERE participant_id = ? AND numero_terrain > ? AND paye = 0
+              AND annee * 12 + mois - 1 >= ?
+        """, (participant_id, nouveau_nb, debut))
+        resultat['supprimees'] = cursor.rowcount
+
+        cursor.execute("""
+            SELECT COUNT(*) FROM cotisations
+            WHERE participant_id = ? AND numero_terrain > ? AND paye = 1
+              AND annee * 12 + mois - 1 >= ?
+        """, (participant_id, nouveau_nb, debut))
+        resultat['payees_conservees'] = cursor.fetchone()[0]
+
+    return resultat
+
+
+def message_reconciliation(resultat):
+    """Formate le résultat d'une réconciliation pour l'affichage"""
+    morceaux = []
+    if resultat['ajoutees']:
+        morceaux.append(f"{resultat['ajoutees']} cotisation(s) créée(s)")
+    if resultat['supprimees']:
+        morceaux.append(f"{resultat['supprimees']} cotisation(s) impayée(s) supprimée(s)")
+    if resultat['payees_conservees']:
+        morceaux.append(f"{resultat['payees_conservees']} cotisation(s) payée(s) conservée(s)")
+    return ", ".join(morceaux)
@@ -0,0 +1,282 @@
+"""
+Vues enregistrées
+Une vue est une combinaison de filtres nommée, enregistrée en base (table
+vues_enregistrees) pour une page : l'ouvrir remet les filtres de la page en
+place. Les résultats d'une vue sont gardés en mémoire par version des données,
+pour tout le processus, par partie : ses statistiques d'un côté, chaque page
+de la liste affichée (décalage et taille, pour le tri de la vue) de l'autre,
+jamais la liste complète. Rouvrir une vue ou revenir sur une page déjà vue
+sans que la base ait changé ne fait aucune requête. Quand les données
+changent, l'ancien résultat reste affiché pendant qu'un thread le recalcule.
+"""
+
+import json
+import threading
+import streamlit as st
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from database import get_connection, get_data_version
+
+# Pages proposant des vues enregistrées
+PAGE_LISTE_COTISATIONS = 'liste_cotisations'
+PAGE_EXPORT_EXCEL = 'export_excel'
+
+# Nombre maximal de résultats (statistiques ou pages) gardés en mémoire,
+# les moins récemment utilisés sortent en premier
+TAILLE_MAX_RESULTATS = 64
+
+_resultats = OrderedDict()
+_rafraichissements = {}
+_verrou = threading.Lock()
+_executeur = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vues")
+
+
+# ============================================================================
+# VUES EN BASE
+# ============================================================================
+
+def get_vues(page):
+    """
+    Vues enregistrées d'une page, par ordre alphabétique
+
+    Returns:
+        Liste de dictionnaires (id, nom, filtres)
+    """
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT id, nom, filtres FROM vues_enregistrees WHERE page = ? ORDER BY nom COLLATE NOCASE",
+        (page,)
+    ).fetchall()
+    conn.close()
+    return [{'id': row[0], 'nom': row[1], 'filtres': json.loads(row[2])} for row in rows]
+
+
+def enregistrer_vue(page, nom, filtres):
+    """
+    Enregistre les filtres courants d'une page sous un nom (remplace la vue du même nom)
+
+    Args:
+        page: Page de la vue (PAGE_*)
+        nom: Nom de la vue
+        filtres: Dictionnaire des filtres, sérialisable en JSON
+
+    Returns:
+        Tuple (succès, message)
+    """
+    nom = (nom or "").strip()
+    if not nom:
+        return False, "Donnez un nom à la vue"
+
+    conn = get_connection()
+    try:
+        existe = conn.execute("SELECT 1 FROM vues_enregistrees WHERE page = ? AND nom = ?",
+                              (page, nom)).fetchone() is not None
+        conn.execute("""
+            INSERT INTO vues_enregistrees (page, nom, filtres) VALUES (?, ?, ?)
+            ON CONFLICT (page, nom) DO UPDATE
+            SET filtres = excluded.filtres, date_modification = ?
+        """, (page, nom, json.dumps(filtres, sort_keys=True), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        return False, f"Erreur: {str(e)}"
+    finally:
+        conn.close()
+    return True, f"Vue « {nom} » {'mise à jour' if existe else 'enregistrée'}"
+
+
+def supprimer_vue(vue_id):
+    """
+    Supprime une vue enregistrée
+
+    Returns:
+        Tuple (succès, message)
+    """
+    conn = get_connection()
+    try:
+        conn.execute("DELETE FROM vues_enregistrees WHERE id = ?", (int(vue_id),))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        return False, f"Erreur: {str(e)}"
+    finally:
+        conn.close()
+    return True, "Vue supprimée"
+
+
+# ============================================================================
+# RÉSULTATS EN MÉMOIRE
+# ============================================================================
+
+def _cle(page, filtres, partie=None):
+    """Clé d'un résultat : page, filtres (l'ordre des filtres n'y change rien) et partie du résultat"""
+    return page, json.dumps(filtres, sort_keys=True, default=str), partie
+
+
+def _memoriser(cle, version, resultat):
+    """Garde un résultat calculé à une version des données"""
+    with _verrou:
+        precedent = _resultats.get(cle)
+        # Un calcul plus ancien terminé après un plus récent ne le remplace pas
+        if precedent is None or precedent['version'] <= version:
+            _resultats[cle] = {'version': version, 'resultat': resultat}
+        _resultats.move_to_end(cle)
+        while len(_resultats) > TAILLE_MAX_RESULTATS:
+            _resultats.popitem(last=False)
+
+
+def _calculer(cle, calculer):
+    """Calcule un résultat et le garde, avec la version lue avant le calcul"""
+    version = get_data_version()
+    _memoriser(cle, version, calculer())
+
+
+def _rafraichir(cle, calculer):
+    """Lance le recalcul d'un résultat en arrière-plan (une seule fois à la fois par clé)"""
+    with _verrou:
+        en_cours = _rafraichissements.get(cle)
+        if en_cours is not None and not en_cours.done():
+            return
+        for terminee in [c for c, tache in _rafraichissements.items() if tache.done()]:
+            del _rafraichissements[terminee]
+        _rafraichissements[cle] = _executeur.submit(_calculer, cle, calculer)
+
+
+def get_resultat(page, filtres, calculer, partie=None):
+    """
+    Résultat des filtres d'une page, calculé une fois par version des données
+
+    Un résultat gardé d'une version précédente est retourné tel quel pendant
+    que le nouveau est calculé en arrière-plan.
+
+    Args:
+        page: Page des filtres (PAGE_*)
+        filtres: Dictionnaire des filtres
+        calculer: Fonction sans argument calculant le résultat (appelée hors du
+                  thread de la page lors d'un rafraîchissement)
+        partie: Partie du résultat gardée séparément (ex : (décalage, taille)
+                d'une page de liste) ; None pour le résultat principal
+
+    Returns:
+        Tuple (résultat, à jour) ; à jour vaut False pendant un rafraîchissement
+    """
+    cle = _cle(page, filtres, partie)
+    version = get_data_version()
+    with _verrou:
+        entree = _resultats.get(cle)
+        if entree is not None:
+            _resultats.move_to_end(cle)
+        en_cours = _rafraichissements.get(cle)
+
+    if entree is None and en_cours is not None and not en_cours.done():
+        # Calcul déjà lancé en arrière-plan (vue tout juste enregistrée) : on l'attend
+        en_cours.exception()
+        with _verrou:
+            entree = _resultats.get(cle)
+
+    if entree is None:
+        resultat = calculer()
+        _memoriser(cle, version, resultat)
+        return resultat, True
+    if entree['version'] != version:
+        _rafraichir(cle, calculer)
+        return entree['resultat'], False
+    return entree['resultat'], True
+
+
+def rafraichissement_en_cours(page, filtres):
+    """Indique si une partie du résultat des filtres est en cours de recalcul"""
+    page_filtres = _cle(page, filtres)[:2]
+    with _verrou:
+        taches = [tache for cle, tache in _rafraichissements.items() if cle[:2] == page_filtres]
+    return any(not tache.done() for tache in taches)
+
+
+def prechauffer_vues(page, vues, calculer, partie=None):
+    """
+    Calcule en arrière-plan le résultat des vues absentes ou périmées
+
+    Ouvrir ensuite l'une de ces vues ne fait aucune requête.
+
+    Args:
+        page: Page des vues
+        vues: Vues enregistrées (get_vues)
+        calculer: Fonction prenant les filtres d'une vue et calculant son résultat
+        partie: Partie du résultat à calculer (voir get_resultat)
+    """
+    version = get_data_version()
+    for vue in vues:
+        cle = _cle(page, vue['filtres'], partie)
+        with _verrou:
+            entree = _resultats.get(cle)
+        if entree is None or entree['version'] != version:
+            _rafraichir(cle, lambda filtres=vue['filtres']: calculer(filtres))
+
+
+# ============================================================================
+# AFFICHAGE
+# ============================================================================
+
+def barre_vues(page, filtres, appliquer, key):
+    """
+    Affiche les vues enregistrées d'une page : ouverture, suppression et
+    enregistrement des filtres courants
+
+    Args:
+        page: Page des vues (PAGE_*)
+        filtres: Filtres actuellement appliqués sur la page
+        appliquer: Fonction prenant les filtres d'une vue et les remettant dans les
+                   widgets de la page (appelée en callback, avant leur affichage)
+        key: Préfixe des clés des widgets
+
+    Returns:
+        Tuple (vues enregistrées, vue correspondant aux filtres courants ou None)
+    """
+    vues = get_vues(page)
+    cle_filtres = _cle(page, filtres)
+    active = next((vue for vue in vues if _cle(page, vue['filtres']) == cle_filtres), None)
+
+    titre = f"⭐ Vues enregistrées : {active['nom']}" if active else "⭐ Vues enregistrées"
+    with st.expander(titre):
+        if vues:
+            par_id = {vue['id']: vue for vue in vues}
+            col_vue, col_ouvrir, col_supprimer = st.columns([3, 1, 1])
+            with col_vue:
+                vue_id = st.selectbox("Vue", list(par_id.keys()), format_func=lambda vid: par_id[vid]['nom'],
+                                      key=f"{key}_choix")
+            with col_ouvrir:
+                st.button("📂 Ouvrir", key=f"{key}_ouvrir", on_click=appliquer,
+                          args=(par_id[vue_id]['filtres'],), use_container_width=True)
+            with col_supprimer:
+                if st.button("🗑️ Supprimer", key=f"{key}_supprimer", use_container_width=True):
+                    success, msg = supprimer_vue(vue_id)
+                    if success:
+                        st.success(msg)
+                        st.rerun()
+                    else:
+                        st.error(msg)
+        else:
+            st.caption("Aucune vue enregistrée : enregistrez les filtres actuels pour les retrouver en un clic.")
+
+        col_nom, col_enregistrer = st.columns([3, 2])
+        with col_nom:
+            nom = st.text_input("Nom de la vue", key=f"{key}_nom", placeholder="Ex : Impayées 2026")
+        with col_enregistrer:
+            if st.button("💾 Enregistrer les filtres actuels", key=f"{key}_enregistrer", use_container_width=True):
+                success, msg = enregistrer_vue(page, nom, filtres)
+                if success:
+                    st.success(msg)
+                    st.rerun()
+                else:
+                    st.error(msg)
+
+    return vues, active
+
+
+@st.fragment(run_every="1s")
+def suivre_rafraichissement(page, filtres):
+    """Signale le recalcul d'une vue et rafraîchit la page quand il est terminé"""
+    if not rafraichissement_en_cours(page, filtres):
+        st.rerun()
+    st.caption("🔄 Les données ont changé : la vue est en cours de mise à jour...")